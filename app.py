@@ -1,16 +1,33 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import re, io
+import numpy as np
+import re, io, tempfile, time
 from datetime import datetime
-from motifs import (
-    all_motifs,
-    find_gquadruplex, find_relaxed_gquadruplex, find_bulged_gquadruplex, find_gtriplex,
-    find_bipartite_gquadruplex, find_multimeric_gquadruplex,
-    find_imotif, find_hotspots
-)
-from utils import parse_fasta, wrap
+from cache import ResultCache, sequence_key
+from export import DEFAULT_RECORD, FORMATS, HAVE_ARROW, excel_fits, export_hits
+from hitstore import HitIndex, parse_region
+from motifmap import draw_motif_map, plotly_motif_map
+from tracks import DEFAULT_BIN, compute_tracks, covered_bases, write_bedgraph
+from incremental import IncrementalAnalysis
+from jobs import ScanJob
+from profiling import ScanReport
+from motifs import find_hotspots
+from utils import parse_fasta, open_shared_store, wrap, RecordView
+
+# Records longer than this stay memory-mapped instead of being copied into the session
+TEXT_EDIT_LIMIT = 1_000_000
+# Seconds between status checks of a running background scan
+JOB_POLL_SECONDS = 0.5
+# Tracks plotted on the Visualization page, with their axis labels
+TRACK_PLOTS = [
+    ('coverage', 'Motif coverage'),
+    ('density', 'Motifs per bin'),
+    ('gc', 'GC fraction'),
+    ('g4hunter', 'G4Hunter'),
+]
+# Bases shown by default in the zoomable region view
+REGION_VIEW_DEFAULT = 10_000
+# Downloads larger than this are spooled to disk while they are written
+EXPORT_SPOOL_BYTES = 64 * 2**20
 
 EXAMPLE_FASTA = ">Example\nATCGATCGATCGAAAATTTTATTTAAATTTAAATTTGGGTTAGGGTTAGGGTTAGGGCCCCCTCCCCCTCCCCCTCCCC\nATCGATCGCGCGCGCGATCGCACACACACAGCTGCTGCTGCTTGGGAAAGGGGAAGGGTTAGGGAAAGGGGTTT\nGGGTTTAGGGGGGAGGGGCTGCTGCTGCATGCGGGAAGGGAGGGTAGAGGGTCCGGTAGGAACCCCTAACCCCTAA\nGAAAGAAGAAGAAGAAGAAGAAAGGAAGGAAGGAGGAGGAGGAGGAGGAGGAGGAGGAGGAGGAGGAGGAGGG"
 
@@ -20,7 +37,7 @@ st.set_page_config(page_title="Non-B DNA Motif Finder (Non-overlapping)", layout
 if 'seq' not in st.session_state:
     st.session_state['seq'] = ""
 if 'df' not in st.session_state:
-    st.session_state['df'] = pd.DataFrame()
+    st.session_state['df'] = None
 if 'motif_results' not in st.session_state:
     st.session_state['motif_results'] = []
 if 'analysis_status' not in st.session_state:
@@ -43,13 +60,83 @@ page = st.sidebar.radio("Go to", PAGES)
 
 st.title("Non-B DNA Motif Finder (Non-overlapping Detection)")
 
-def collect_all_motifs(seq, status_callback=None, stop_flag=None):
-    """Collect all motifs using non-overlapping detection"""
-    if status_callback:
-        status_callback("Scanning for non-B DNA motifs using non-overlapping regex patterns...")
-    if stop_flag and stop_flag():
-        return []
-    return all_motifs(seq)
+@st.cache_resource
+def get_result_cache():
+    """One ResultCache per server process, shared by all sessions"""
+    return ResultCache()
+
+def finish_analysis(seq, results, complete=True, report=None):
+    """Store analysis results in the session and show their summary.
+
+    Partial results of a stopped scan are kept but not used for incremental
+    re-analysis.
+    """
+    st.session_state['motif_results'] = results
+    st.session_state['df'] = results.to_dataframe(sequences=True)
+    # The analysed sequence: the one being edited may already differ
+    st.session_state['results_seq'] = seq
+    st.session_state['results_length'] = len(seq)
+    st.session_state['results_name'] = st.session_state.get('analysis_name')
+    st.session_state['partial_results'] = not complete
+    st.session_state['scan_report'] = report
+    if complete and isinstance(seq, str):
+        analysis = st.session_state.get('analysis')
+        if analysis is None or analysis.hits is not results:
+            st.session_state['analysis'] = IncrementalAnalysis(seq, results)
+    else:
+        st.session_state.pop('analysis', None)
+
+    if not results:
+        st.warning("⚠️ No motifs found in the provided sequence.")
+        return
+    st.success(f"✅ Found {len(results)} non-overlapping motifs in sequence of {len(seq)} nucleotides")
+
+    # Quick summary
+    df = st.session_state['df']
+    motif_counts = df['Class'].value_counts()
+    st.subheader("Quick Summary")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Motifs", len(results))
+    with col2:
+        st.metric("Motif Types", len(df['Subtype'].unique()))
+    with col3:
+        st.metric("Sequence Coverage", f"{(covered_bases(results)['All']/len(seq)*100):.1f}%")
+
+    st.write("**Motif Class Distribution:**")
+    for motif_class, count in motif_counts.items():
+        st.write(f"- {motif_class}: {count}")
+
+    if report is not None:
+        with st.expander("Finder timings"):
+            st.dataframe(report, use_container_width=True)
+
+def region_bounds(text):
+    """1-based (start, end) of a Results region filter, checked against the analysed record's name"""
+    record, start, end = parse_region(text)
+    if end is None:
+        raise ValueError(f"{text.strip()!r} is not a region: give 1-based positions such as 1,000-2,000")
+    name = st.session_state.get('results_name')
+    if record and record != name:
+        raise ValueError(f"Region {text.strip()!r} is on record {record!r}, but the results are for "
+                         + (f"record {name!r}" if name else "an unnamed sequence"))
+    return start, end
+
+def motif_tracks(bin_size):
+    """Coverage, density, GC and G4Hunter tracks of the current results and the sequence they were found in"""
+    cached = st.session_state.get('tracks')
+    if cached is None or cached[0] is not st.session_state['motif_results'] or cached[1] != bin_size:
+        cached = st.session_state['tracks'] = (st.session_state['motif_results'], bin_size,
+                                               compute_tracks(st.session_state['results_seq'],
+                                                              st.session_state['motif_results'], bin_size))
+    return cached[2]
+
+def hit_index():
+    """Coordinate index of the current results, built once per analysis"""
+    index = st.session_state.get('hit_index')
+    if index is None or index.hits is not st.session_state['motif_results']:
+        index = st.session_state['hit_index'] = HitIndex(st.session_state['motif_results'])
+    return index
 
 if page == "Home":
     st.markdown("""
@@ -107,8 +194,23 @@ elif page == "Upload & Analyze":
     fasta_file = st.file_uploader("Upload FASTA file", type=["fa", "fasta", "txt"])
     if fasta_file:
         try:
-            seq = parse_fasta(fasta_file.read().decode("utf-8"))
-            st.session_state['seq'] = seq
+            # Hash and map each upload once: the page reruns on every widget change and job poll
+            upload = st.session_state.get('upload')
+            if upload is None or upload[0] != fasta_file.file_id:
+                upload = st.session_state['upload'] = (fasta_file.file_id, open_shared_store(fasta_file.getvalue()))
+            store = upload[1]
+            if len(store) > 1:
+                # Analyze one record at a time so no motif spans a contig boundary
+                record = st.selectbox("Select FASTA record", range(len(store)),
+                                      format_func=lambda i: f"{store[i].name or f'Record {i + 1}'} ({len(store[i])} nt)")
+                seq = store[record]
+            else:
+                seq = store[0] if len(store) else ""
+            if st.session_state.get('scan_job') is None:
+                st.session_state['seq_name'] = seq.name if isinstance(seq, RecordView) else None
+                if len(seq) <= TEXT_EDIT_LIMIT:
+                    seq = str(seq)
+                st.session_state['seq'] = seq
             st.success(f"FASTA loaded successfully! Sequence length: {len(seq)} nucleotides")
         except Exception as e:
             st.error(f"Error loading FASTA file: {str(e)}")
@@ -116,17 +218,23 @@ elif page == "Upload & Analyze":
     # Example sequence button
     if st.button("Use Example Sequence"):
         st.session_state['seq'] = parse_fasta(EXAMPLE_FASTA)
+        st.session_state['seq_name'] = "Example"
         st.success(f"Example sequence loaded! Length: {len(st.session_state['seq'])} nucleotides")
 
-    # Text area for sequence input
-    seq_input = st.text_area("Paste Sequence (FASTA or Raw)", 
-                            value=st.session_state.get('seq', ''), 
-                            height=150,
-                            help="Enter DNA sequence in FASTA format or as raw nucleotides (A, T, G, C)")
+    # Text area for sequence input; large memory-mapped records are not editable
+    seq_input = None
+    if isinstance(st.session_state.get('seq', ''), str):
+        seq_input = st.text_area("Paste Sequence (FASTA or Raw)", 
+                                value=st.session_state.get('seq', ''), 
+                                height=150,
+                                help="Enter DNA sequence in FASTA format or as raw nucleotides (A, T, G, C)")
     
     if seq_input:
         try:
             processed_seq = parse_fasta(seq_input)
+            if processed_seq != st.session_state.get('seq'):
+                # An edited or pasted sequence no longer is the named record it was loaded as
+                st.session_state['seq_name'] = None
             st.session_state['seq'] = processed_seq
             st.info(f"Sequence processed. Length: {len(processed_seq)} nucleotides")
         except Exception as e:
@@ -145,67 +253,60 @@ elif page == "Upload & Analyze":
         seq = st.session_state.get('seq', '')
         if not seq:
             st.error("Please input a DNA sequence first.")
-        elif not re.match("^[ATGC]+$", seq.upper()):
+        elif not (seq.is_dna() if isinstance(seq, RecordView) else re.match("^[ATGC]+$", seq.upper())):
             st.error("Please input a valid DNA sequence containing only A, T, G, C nucleotides.")
+        elif st.session_state.get('scan_job') is not None:
+            st.warning("An analysis is already running; stop it or wait for it to finish.")
         else:
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            with st.spinner("Running non-overlapping motif analysis..."):
-                try:
-                    # Update progress
-                    progress_bar.progress(20)
-                    status_text.text("Initializing motif detection...")
-                    
-                    # Run motif analysis
-                    results = collect_all_motifs(seq.upper())
-                    progress_bar.progress(80)
-                    status_text.text("Processing results...")
-                    
-                    # Store results
-                    st.session_state['motif_results'] = results
-                    st.session_state['df'] = pd.DataFrame(results)
-                    st.session_state['hotspot_params'] = {
-                        'window': hotspot_window,
-                        'min_count': min_motif_count
-                    }
-                    
-                    progress_bar.progress(100)
-                    status_text.text("Analysis complete!")
-                    
-                    if results:
-                        st.success(f"✅ Found {len(results)} non-overlapping motifs in sequence of {len(seq)} nucleotides")
-                        
-                        # Quick summary
-                        df = pd.DataFrame(results)
-                        motif_counts = df['Class'].value_counts()
-                        st.subheader("Quick Summary")
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.metric("Total Motifs", len(results))
-                        with col2:
-                            st.metric("Motif Types", len(df['Subtype'].unique()))
-                        with col3:
-                            st.metric("Sequence Coverage", f"{(df['Length'].sum()/len(seq)*100):.1f}%")
-                        
-                        st.write("**Motif Class Distribution:**")
-                        for motif_class, count in motif_counts.items():
-                            st.write(f"- {motif_class}: {count}")
-                            
-                    else:
-                        st.warning("⚠️ No motifs found in the provided sequence.")
-                        
-                except Exception as e:
-                    st.error(f"Error during analysis: {str(e)}")
-                finally:
-                    progress_bar.empty()
-                    status_text.empty()
+            if not isinstance(seq, RecordView):
+                seq = seq.upper()
+            st.session_state['seq_key'] = sequence_key(seq)
+            st.session_state['analysis_name'] = st.session_state.get('seq_name')
+            st.session_state['hotspot_params'] = {
+                'window': hotspot_window,
+                'min_count': min_motif_count
+            }
+            results = get_result_cache().lookup(seq, st.session_state['seq_key'])
+            analysis = st.session_state.get('analysis')
+            if results is None and isinstance(seq, str) and analysis is not None:
+                # An edit of the text area only rescans around the changed bases
+                results = analysis.update(seq)
+            if results is None:
+                # Full scans run in a background job that the page polls below
+                st.session_state['stop_analysis'] = False
+                st.session_state['scan_job'] = ScanJob(seq, report=ScanReport()).start()
+            else:
+                finish_analysis(seq, results)
+
+    job = st.session_state.get('scan_job')
+    if job is not None:
+        if job.running:
+            st.progress(job.fraction, text=f"Scanning for non-B DNA motifs: {job.settled:,} of {job.length:,}"
+                                           f" nucleotides ({job.elapsed:.0f}s)")
+            if st.button("⏹ Stop analysis"):
+                st.session_state['stop_analysis'] = True
+            if st.session_state['stop_analysis']:
+                job.cancel()
+            time.sleep(JOB_POLL_SECONDS)
+            st.rerun()
+        else:
+            del st.session_state['scan_job']
+            if job.status == "failed":
+                st.error(f"Error during analysis: {str(job.error)}")
+            else:
+                if job.status == "cancelled":
+                    st.warning(f"Analysis stopped after {job.settled:,} of {job.length:,} nucleotides;"
+                               " showing the motifs found up to there.")
+                else:
+                    get_result_cache().store_motifs(st.session_state['seq_key'], job.result, job.length)
+                report = job.report.to_dataframe() if job.report.scans else None
+                finish_analysis(job.seq, job.result, complete=job.status == "done", report=report)
 
 elif page == "Results":
     st.markdown("<h2 style='color:#1A5276;'>Detected Motifs (Non-overlapping)</h2>", unsafe_allow_html=True)
-    df = st.session_state.get('df', pd.DataFrame())
+    df = st.session_state.get('df')
     
-    if df.empty:
+    if df is None or df.empty:
         st.info("No results available. Please run analysis first.")
     else:
         # Display summary statistics
@@ -217,8 +318,9 @@ elif page == "Results":
         with col3:
             st.metric("Avg Length", f"{df['Length'].mean():.1f} bp")
         with col4:
-            seq_len = len(st.session_state.get('seq', ''))
-            coverage = (df['Length'].sum() / seq_len * 100) if seq_len > 0 else 0
+            seq_len = st.session_state['results_length']
+            covered = covered_bases(st.session_state['motif_results'])['All']
+            coverage = (covered / seq_len * 100) if seq_len > 0 else 0
             st.metric("Coverage", f"{coverage:.1f}%")
 
         # Filter options
@@ -233,10 +335,21 @@ elif page == "Results":
                                              options=sorted(df['Subtype'].unique()),
                                              default=sorted(df['Subtype'].unique()))
 
+        region = st.text_input("Filter by Region", placeholder="e.g. 1,000-2,000",
+                               help="Show motifs overlapping these 1-based positions")
+
         # Apply filters
-        filtered_df = df[
-            (df['Class'].isin(selected_classes)) & 
-            (df['Subtype'].isin(selected_subtypes))
+        filtered_df = df
+        if region.strip():
+            try:
+                start, end = region_bounds(region)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                filtered_df = df.iloc[hit_index().rows(start, end)]
+        filtered_df = filtered_df[
+            (filtered_df['Class'].isin(selected_classes)) & 
+            (filtered_df['Subtype'].isin(selected_subtypes))
         ]
 
         # Display filtered results
@@ -251,6 +364,7 @@ elif page == "Results":
         counts = filtered_df['Subtype'].value_counts()
         
         if len(counts) > 0:
+            import matplotlib.pyplot as plt
             fig, ax = plt.subplots(figsize=(10, 6))
             counts.plot(kind='bar', ax=ax, color='skyblue')
             ax.set_xlabel("Motif Type")
@@ -266,27 +380,36 @@ elif page == "Results":
         st.subheader("Hotspot Regions")
         params = st.session_state.get('hotspot_params', {'window': 100, 'min_count': 3})
         
-        if st.session_state.get('seq'):
-            hotspots = find_hotspots(
-                st.session_state['seq'], 
-                st.session_state['motif_results'], 
-                window=params['window'], 
-                min_count=params['min_count']
-            )
+        merge_hotspots = st.checkbox("Merge overlapping hotspot windows into regions", value=False)
+        
+        if st.session_state.get('seq_key'):
+            if st.session_state.get('analysis') is not None:
+                hotspots = st.session_state['analysis'].hotspots(
+                    window=params['window'], min_count=params['min_count'], merge=merge_hotspots)
+            elif st.session_state.get('partial_results'):
+                hotspots = find_hotspots(st.session_state['results_length'], st.session_state['motif_results'],
+                                         window=params['window'], min_count=params['min_count'],
+                                         merge=merge_hotspots)
+            else:
+                hotspots = get_result_cache().hotspots(
+                    st.session_state['seq_key'],
+                    window=params['window'], 
+                    min_count=params['min_count'],
+                    merge=merge_hotspots
+                )
             
             if hotspots:
                 st.success(f"Found {len(hotspots)} hotspot regions")
-                hotspot_df = pd.DataFrame(hotspots)
-                st.dataframe(hotspot_df, use_container_width=True)
+                st.dataframe(hotspots, use_container_width=True)
             else:
                 st.info(f"No hotspot regions found with ≥{params['min_count']} motifs in {params['window']} bp windows.")
 
 elif page == "Visualization":
     st.markdown("<h2 style='color:#1A5276;'>Motif Visualization</h2>", unsafe_allow_html=True)
-    df = st.session_state.get('df', pd.DataFrame())
-    seq = st.session_state.get('seq', '')
+    df = st.session_state.get('df')
+    seq = st.session_state.get('results_seq', '')
     
-    if df.empty:
+    if df is None or df.empty:
         st.info("No motifs to visualize. Please run analysis first.")
     else:
         # Visualization options
@@ -301,35 +424,17 @@ elif page == "Visualization":
 
         # Filter data for visualization
         viz_df = df[df['Class'].isin(viz_classes)] if viz_classes else df
+        results = st.session_state['motif_results']
+        viz_mask = df['Class'].isin(viz_classes).to_numpy() if viz_classes else np.ones(len(df), dtype=bool)
 
         if not viz_df.empty:
-            # Create motif map
-            motif_types = sorted(viz_df['Subtype'].unique())
-            color_palette = sns.color_palette('husl', n_colors=len(motif_types))
-            color_map = {typ: color_palette[i] for i, typ in enumerate(motif_types)}
-            y_map = {typ: i+1 for i, typ in enumerate(motif_types)}
-
-            fig, ax = plt.subplots(figsize=(12, max(len(motif_types)*0.8, 4)))
-            
-            # Plot motifs
-            for _, motif in viz_df.iterrows():
-                motif_type = motif['Subtype']
-                y = y_map[motif_type]
-                color = color_map[motif_type]
-                ax.barh(y, motif['End'] - motif['Start'] + 1, 
-                       left=motif['Start'], height=0.6, 
-                       color=color, alpha=0.8, edgecolor='black', linewidth=0.5)
-                
-                # Add motif label if bar is wide enough
-                if motif['Length'] > len(seq) * 0.05:  # Only label if >5% of sequence
-                    ax.text(motif['Start'] + motif['Length']/2, y, 
-                           f"{motif['Length']}bp", 
-                           ha='center', va='center', fontsize=8, fontweight='bold')
+            import matplotlib.pyplot as plt
+            # Create motif map: one collection of bars, or per-pixel density tracks for long sequences
+            viz_hits = results.take(viz_mask)
+            fig, ax = plt.subplots(figsize=(12, max(len(viz_df['Subtype'].unique())*0.8, 4)))
+            draw_motif_map(ax, viz_hits, 1, len(seq))
 
             # Formatting
-            ax.set_yticks(list(y_map.values()))
-            ax.set_yticklabels(list(y_map.keys()))
-            ax.set_xlim(0, len(seq))
             ax.set_xlabel('Position on Sequence (bp)')
             ax.set_title(f'Non-overlapping Motif Map (Sequence length: {len(seq)} bp)')
             
@@ -343,6 +448,17 @@ elif page == "Visualization":
             
             plt.tight_layout()
             st.pyplot(fig)
+            plt.close(fig)
+
+            # Zoomable region: only the hits overlapping the chosen window are sent to the browser
+            st.subheader("Explore a Region")
+            region_start, region_end = st.slider(
+                "Region (bp)", min_value=1, max_value=max(len(seq), 2),
+                value=(1, min(len(seq), REGION_VIEW_DEFAULT)), step=1)
+            rows = hit_index().rows(region_start, region_end)
+            region_hits = results.take(rows[viz_mask[rows]])
+            st.plotly_chart(plotly_motif_map(region_hits, region_start, region_end), use_container_width=True)
+            st.caption(f"{len(region_hits)} motifs overlap {region_start:,}-{region_end:,}")
 
             # Summary statistics
             st.subheader("Visualization Summary")
@@ -350,61 +466,89 @@ elif page == "Visualization":
             with col1:
                 st.metric("Motifs Shown", len(viz_df))
             with col2:
-                total_coverage = viz_df['Length'].sum()
+                total_coverage = covered_bases(viz_hits)['All']
                 st.metric("Total Coverage", f"{total_coverage} bp")
             with col3:
                 coverage_percent = (total_coverage / len(seq) * 100) if len(seq) > 0 else 0
                 st.metric("Coverage %", f"{coverage_percent:.1f}%")
 
+            # Binned tracks of all motifs and the sequence, built in one pass
+            st.subheader("Density Tracks")
+            bin_size = int(st.number_input("Bin size (bp)", min_value=10, step=10,
+                                           value=max(10, min(DEFAULT_BIN, len(seq) // 50 // 10 * 10))))
+            tracks = motif_tracks(bin_size)
+            fig, axes = plt.subplots(len(TRACK_PLOTS), 1, figsize=(12, 2 * len(TRACK_PLOTS)), sharex=True)
+            edges = np.minimum(np.arange(len(tracks['coverage']) + 1) * bin_size, len(seq))
+            for ax, (track, label) in zip(axes, TRACK_PLOTS):
+                ax.stairs(tracks[track], edges, fill=True, color='steelblue')
+                ax.set_ylabel(label)
+            axes[-1].set_xlabel('Position (bp)')
+            plt.tight_layout()
+            st.pyplot(fig)
+            plt.close(fig)
+
+            def bedgraph():
+                out = io.StringIO()
+                record = st.session_state.get('results_name') or DEFAULT_RECORD
+                for track, values in tracks.items():
+                    write_bedgraph(out, record, values, bin_size, track, len(seq))
+                return out.getvalue()
+
+            st.download_button("📈 Download tracks (bedGraph)", data=bedgraph,
+                               file_name=f"non_b_dna_tracks_{bin_size}bp.bedgraph", mime="text/plain")
+
         else:
             st.info("No motifs selected for visualization.")
 
 elif page == "Download":
     st.markdown("<h2 style='color:#1A5276;'>Download Results</h2>", unsafe_allow_html=True)
-    df = st.session_state.get('df', pd.DataFrame())
+    hits = st.session_state.get('motif_results')
     
-    if df.empty:
+    if not hits:
         st.info("No results to download. Please run analysis first.")
     else:
-        st.write(f"**Available data:** {len(df)} motifs detected using non-overlapping algorithm")
+        st.write(f"**Available data:** {len(hits)} motifs detected using non-overlapping algorithm")
         
-        # Prepare download data
-        download_df = df.copy()
-        download_df['Analysis_Method'] = 'Non-overlapping'
-        download_df['Analysis_Date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # CSV download
-        csv = download_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📄 Download CSV",
-            data=csv,
-            file_name=f"non_overlapping_motifs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        # Files are only written when a button is clicked, streamed in chunks to a spooled temporary file
+        constants = {
+            'Analysis_Method': 'Non-overlapping',
+            'Analysis_Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-        # Excel download
-        excel_buffer = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-            download_df.to_excel(writer, sheet_name='Motifs', index=False)
-            
-            # Add summary sheet
-            summary_data = {
-                'Metric': ['Total Motifs', 'Unique Types', 'Average Length', 'Total Coverage'],
-                'Value': [
-                    len(df),
-                    len(df['Subtype'].unique()),
-                    f"{df['Length'].mean():.1f} bp",
-                    f"{df['Length'].sum()} bp"
-                ]
-            }
-            pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-            
-        st.download_button(
-            label="📊 Download Excel",
-            data=excel_buffer.getvalue(),
-            file_name=f"non_overlapping_motifs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        def exported(fmt):
+            def build():
+                out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+                export_hits(hits, out, fmt, constants=constants)
+                out.seek(0)
+                return out
+            return build
+
+        downloads = [
+            ("📄 Download CSV", "csv", "text/csv"),
+            ("🗜️ Download CSV (gzip)", "csv.gz", "application/gzip"),
+        ]
+        if HAVE_ARROW:
+            downloads += [
+                ("🧱 Download Parquet", "parquet", "application/vnd.apache.parquet"),
+                ("🏹 Download Arrow", "arrow", "application/vnd.apache.arrow.file"),
+            ]
+        if excel_fits(len(hits)):
+            downloads.append(("📊 Download Excel", "xlsx",
+                              "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"))
+        else:
+            st.info(f"Excel export is not offered for {len(hits):,} motifs; use CSV or Parquet instead.")
+        downloads += [
+            ("🧬 Download BED", "bed", "text/plain"),
+            ("🧬 Download GFF3", "gff3", "text/plain"),
+        ]
+        for label, fmt, mime in downloads:
+            st.download_button(
+                label=label,
+                data=exported(fmt),
+                file_name=f"non_overlapping_motifs_{stamp}{FORMATS[fmt][0]}",
+                mime=mime
+            )
 
 elif page == "Additional Information":
     st.markdown("<h2 style='color:#1A5276;'>Additional Information</h2>", unsafe_allow_html=True)
@@ -0,0 +1,245 @@
+"""Scanner benchmarks for the non-overlapping motif engine.
+
+Run with ``python benchmark.py`` (optionally ``--sizes 10000 1000000``);
+``--workers`` adds the process-pool scaling run at 1/2/4/8/16 workers.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import motifs
+from motifs import (
+    all_motifs, all_motifs_table, non_overlapping_finditer, MotifScan, PREFILTERS, REPEATS, RUN_MOTIFS,
+    MOTIF_REGISTRY, SIMPLE_MOTIFS, TRACK_SCORERS, _scan_anchored, run_kernel,
+    G4_PATTERN, BIPARTITE_G4_PATTERN, IMOTIF_PATTERN, ZDNA_PATTERN,
+)
+from incremental import IncrementalAnalysis
+from scoring import score_intervals
+from utils import open_shared_store
+
+SCAN_PATTERNS = [
+    r"(?=(G{3,}([ATGC]{1,7}G{3,}){3}))",
+    r"(?=(G{3,}(?:[ATGC]{0,30}G{3,}){3}))",
+    r"(?=(C{3,}([ATGC]{1,7}C{3,}){3}))",
+    r"(?=((?:CG){6,}))",
+] + [MOTIF_REGISTRY[name].pattern for name in SIMPLE_MOTIFS]
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000, 100_000_000]
+DEFAULT_WORKERS = [1, 2, 4, 8, 16]
+# Bases of the untimed scan run before timing the engine
+WARMUP_BASES = 10_000
+
+
+def random_sequence(length, gc=0.5, seed=0):
+    """Generate a reproducible random DNA sequence with the given GC fraction"""
+    rng = random.Random(seed)
+    weights = [(1 - gc) / 2, (1 - gc) / 2, gc / 2, gc / 2]
+    return "".join(rng.choices("ATGC", weights=weights, k=length))
+
+
+def time_scanner(seq, patterns=SCAN_PATTERNS):
+    """Time one full non-overlapping scan of every pattern; returns (seconds, hits)"""
+    hits = 0
+    t0 = time.perf_counter()
+    for pattern in patterns:
+        for _ in non_overlapping_finditer(pattern, seq):
+            hits += 1
+    return time.perf_counter() - t0, hits
+
+
+def time_engine(seq, patterns=tuple(PREFILTERS)):
+    """Time the shared MotifScan engine over every distinct pattern; returns (seconds, hits)"""
+    # An untimed scan first, so loading and JIT-compiling the run kernels is not timed
+    warmup = MotifScan(seq[:WARMUP_BASES])
+    for pattern in patterns:
+        warmup.spans(pattern)
+    t0 = time.perf_counter()
+    scan = MotifScan(seq)
+    hits = sum(len(scan.spans(pattern)) for pattern in patterns)
+    return time.perf_counter() - t0, hits
+
+
+def check_scoring(seq):
+    """Score G4/i-motif/Z-DNA hits with the reference and vectorized scorers.
+
+    Raises AssertionError on any difference; returns (reference s, vectorized s, hits).
+    """
+    scan = MotifScan(seq)
+    spans = (scan.spans(G4_PATTERN) + scan.spans(BIPARTITE_G4_PATTERN)
+             + scan.spans(IMOTIF_PATTERN) + scan.spans(ZDNA_PATTERN))
+    starts = [start for start, _ in spans]
+    ends = [end for _, end in spans]
+    reference_seconds = vectorized_seconds = 0.0
+    for score_func, method in TRACK_SCORERS.items():
+        t0 = time.perf_counter()
+        expected = [score_func(seq[start:end]) for start, end in spans]
+        reference_seconds += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = score_intervals(scan.codes, starts, ends, method).tolist()
+        vectorized_seconds += time.perf_counter() - t0
+        assert [float(x) for x in expected] == got, f"{method} scores differ from the reference"
+    return reference_seconds, vectorized_seconds, len(spans)
+
+
+def check_repeats(seq):
+    """Find the REPEATS motifs with the anchored regex scan and with repeats.py.
+
+    Raises AssertionError on any difference; returns (regex s, repeat engine s, hits).
+    """
+    regex_seconds = engine_seconds = 0.0
+    hits = 0
+    reference, scan = MotifScan(seq), MotifScan(seq)
+    scan.codes  # encoded once up front, as other patterns of a full scan share it
+    for pattern, repeat in REPEATS.items():
+        t0 = time.perf_counter()
+        expected = _scan_anchored(reference.regex(pattern), reference, PREFILTERS[pattern], 1)
+        regex_seconds += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = scan.repeat_spans(repeat)
+        engine_seconds += time.perf_counter() - t0
+        assert got == expected, f"repeat engine spans differ from the regex for {pattern}"
+        hits += len(got)
+    return regex_seconds, engine_seconds, hits
+
+
+def check_kernels(seq):
+    """Find the RUN_MOTIFS motifs with the regex engine and with the compiled kernels.
+
+    Raises AssertionError on any difference; returns (regex s, kernels s, hits).
+    """
+    if run_kernel() is None:
+        raise RuntimeError("the run-motif kernels need numba")
+    run_kernel()("GGG", [0], [3], next(iter(RUN_MOTIFS.values())))  # compile, or load the cached code
+    found, seconds = [], []
+    for use_kernels in (False, True):
+        motifs.USE_KERNELS = use_kernels
+        try:
+            scan = MotifScan(seq)
+            for base in {motif[0] for motif in RUN_MOTIFS.values()}:
+                scan.runs(base, 3)
+            t0 = time.perf_counter()
+            found.append([scan.spans(pattern) for pattern in RUN_MOTIFS])
+            seconds.append(time.perf_counter() - t0)
+        finally:
+            motifs.USE_KERNELS = True
+    for pattern, expected, got in zip(RUN_MOTIFS, *found):
+        assert got == expected, f"kernel spans differ from the regex for {pattern}"
+    return seconds[0], seconds[1], sum(map(len, found[1]))
+
+
+def time_parallel(seq, worker_counts=DEFAULT_WORKERS):
+    """Time all_motifs at each worker count on one shared store; returns [(workers, seconds, hits)].
+
+    Raises AssertionError if any worker count finds different motifs than the first.
+    """
+    view = open_shared_store(f">benchmark\n{seq}\n".encode())[0]
+    rows, expected = [], None
+    for workers in worker_counts:
+        t0 = time.perf_counter()
+        motifs = all_motifs(view, workers=workers)
+        rows.append((workers, time.perf_counter() - t0, len(motifs)))
+        expected = expected or motifs
+        assert motifs == expected, f"{workers} workers found different motifs"
+    return rows
+
+
+def time_strands(seq, repeat=3):
+    """Best-of-`repeat` seconds of all_motifs on one strand and on both; returns (one, both)"""
+    timings = []
+    for both_strands in (False, True):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            all_motifs_table(seq, both_strands=both_strands)
+            best = min(best, time.perf_counter() - t0)
+        timings.append(best)
+    return tuple(timings)
+
+
+def time_incremental(seq, edits=5, seed=0):
+    """Mean seconds of a full all_motifs_table and of an IncrementalAnalysis update after a point mutation"""
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    analysis = IncrementalAnalysis(seq)
+    full = time.perf_counter() - t0
+    total = 0.0
+    for _ in range(edits):
+        i = rng.randrange(len(seq))
+        seq = seq[:i] + rng.choice("ACGT".replace(seq[i], "")) + seq[i + 1:]
+        t0 = time.perf_counter()
+        analysis.update(seq)
+        total += time.perf_counter() - t0
+    return full, total / edits
+
+
+def hit_memory(seq):
+    """Peak bytes allocated for all_motifs dicts and for the HitTable; returns (dicts, table, hits)"""
+    sizes = []
+    for finder in (all_motifs, all_motifs_table):
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        hits = finder(seq)
+        sizes.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del hits
+    return sizes[0], sizes[1], len(all_motifs_table(seq))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--gc", type=float, default=0.5)
+    parser.add_argument("--check-scoring", action="store_true",
+                        help="verify vectorized scores against utils reference scorers")
+    parser.add_argument("--check-repeats", action="store_true",
+                        help="verify the repeat engine against the regex scan of the REPEATS motifs")
+    parser.add_argument("--check-kernels", action="store_true",
+                        help="verify the compiled G-run kernels against the regex scan (needs numba)")
+    parser.add_argument("--strands", action="store_true",
+                        help="compare one-strand and both-strand all_motifs times")
+    parser.add_argument("--incremental", action="store_true",
+                        help="time incremental re-analysis after point mutations")
+    parser.add_argument("--hit-memory", action="store_true",
+                        help="compare peak memory of scanning to motif dicts and to the columnar HitTable")
+    parser.add_argument("--workers", type=int, nargs="*",
+                        help="also time parallel all_motifs at these worker counts"
+                             f" (default {' '.join(map(str, DEFAULT_WORKERS))} when given without values)")
+    args = parser.parse_args(argv)
+
+    print(f"{'length':>12} {'hits':>10} {'seconds':>10} {'ns/base':>10} {'engine s':>10} {'ns/base':>10}")
+    for size in args.sizes:
+        seq = random_sequence(size, args.gc)
+        seconds, hits = time_scanner(seq)
+        engine_seconds, _ = time_engine(seq)
+        print(f"{size:>12} {hits:>10} {seconds:>10.3f} {seconds / size * 1e9:>10.1f}"
+              f" {engine_seconds:>10.3f} {engine_seconds / size * 1e9:>10.1f}")
+        if args.check_scoring:
+            reference, vectorized, hits = check_scoring(seq)
+            print(f"{'':>12} scoring parity ok on {hits} hits:"
+                  f" reference {reference:.3f}s, vectorized {vectorized:.3f}s")
+        if args.check_repeats:
+            regex, engine, hits = check_repeats(seq)
+            print(f"{'':>12} repeat parity ok on {hits} hits: regex {regex:.3f}s, repeat engine {engine:.3f}s")
+        if args.check_kernels:
+            regex, compiled, hits = check_kernels(seq)
+            print(f"{'':>12} kernel parity ok on {hits} hits: regex {regex:.3f}s, kernels {compiled:.3f}s")
+        if args.strands:
+            one, both = time_strands(seq)
+            print(f"{'':>12} one strand {one:.3f}s, both strands {both:.3f}s ({both / one:.2f}x)")
+        if args.incremental:
+            full, update = time_incremental(seq)
+            print(f"{'':>12} full scan {full:.3f}s, point-mutation update {update * 1e3:.1f} ms")
+        if args.hit_memory:
+            dicts, table, hits = hit_memory(seq)
+            print(f"{'':>12} {hits} hits: peak {dicts / 1e6:.2f} MB with dicts, {table / 1e6:.2f} MB with a table"
+                  f" ({dicts / max(table, 1):.2f}x)")
+        if args.workers is not None:
+            rows = time_parallel(seq, args.workers or DEFAULT_WORKERS)
+            for workers, seconds, hits in rows:
+                print(f"{'':>12} {workers:>3} workers {seconds:>8.3f}s"
+                      f" speedup {rows[0][1] / seconds:>5.2f}x ({hits} motifs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Result cache for motif scans and hotspot regions.
+
+Results are keyed by a content hash of the scanned sequence (see
+sequence_key) together with the motif-set version, and hotspots additionally
+by their parameters. Recent results stay in an in-memory LRU; every result is
+also written to a cache directory (NBD_CACHE_DIR, or ~/.cache/nbdfinder), so a
+sequence scanned by the app or by nbdfinder.py in an earlier session loads
+instead of being rescanned.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from hits import CATEGORY_COLUMNS, HitTable, HitTexts
+from motifs import MOTIF_SET_VERSION, PREFILTERS, REPEATS, all_motifs_table, find_hotspots, resolve_motifs
+from utils import RecordView
+
+HOTSPOT_COLUMNS = ("RegionStart", "RegionEnd", "MotifCount")
+# Bumped when stream_fasta names records differently, so cached file records are not reused
+FILE_RECORDS_FORMAT = 2
+
+
+def new_digest():
+    return hashlib.blake2b(digest_size=20)
+
+
+def sequence_key(seq) -> str:
+    """Content hash of an upper-case sequence (str or RecordView)"""
+    digest = new_digest()
+    if isinstance(seq, RecordView):
+        digest.update(memoryview(seq.buffer)[seq.offset:seq.offset + len(seq)])
+    else:
+        digest.update(seq.encode("ascii", "replace"))
+    return digest.hexdigest()
+
+
+def hashed_pieces(pieces, digest):
+    """Pass sequence pieces through while feeding them to `digest`, as sequence_key does"""
+    for piece in pieces:
+        digest.update(piece.encode("ascii", "replace"))
+        yield piece
+
+
+def motif_set_version(motifs=None) -> str:
+    """Hash of the definitions of `motifs` (every registered motif by default) and MOTIF_SET_VERSION"""
+    definition = json.dumps([MOTIF_SET_VERSION, sorted(PREFILTERS.items()), sorted(REPEATS.items()),
+                             [motif.definition() for motif in resolve_motifs(motifs)]])
+    return hashlib.blake2b(definition.encode(), digest_size=6).hexdigest()
+
+
+def default_cache_dir():
+    return os.environ.get("NBD_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache")), "nbdfinder")
+
+
+class ResultCache:
+    """Memoizes motif tables and hotspot regions in memory (LRU) and on disk.
+
+    `directory=False` keeps the cache in memory only. A cache for a subset of
+    `motifs` (see motifs.resolve_motifs) keeps its results apart from the
+    full set's.
+    """
+
+    def __init__(self, directory=None, max_entries=16, motifs=None):
+        self.directory = default_cache_dir() if directory is None else directory
+        self.max_entries = max_entries
+        self.motif_set = resolve_motifs(motifs)
+        self.version = motif_set_version(self.motif_set)
+        self._memory = OrderedDict()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+        return value
+
+    def _recall(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        return None
+
+    def _path(self, name):
+        directory = os.path.join(self.directory, name[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def _save(self, name, arrays):
+        # A cache that cannot be written only costs a rescan later
+        try:
+            path = self._path(name)
+            # Sessions of one process share a cache and may store the same entry at once
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", prefix=name + ".", dir=os.path.dirname(path))
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.savez(fh, **arrays)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _load(self, name):
+        if not self.directory:
+            return None
+        try:
+            with np.load(os.path.join(self.directory, name[:2], name), allow_pickle=False) as data:
+                return {key: data[key] for key in data.files}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def load_motifs(self, key):
+        """Cached (HitTable, sequence length) for a sequence key, or None.
+
+        Hit text comes from the cached hit sequences; use HitTable.with_source
+        to read it from the sequence instead.
+        """
+        name = f"{key}-{self.version}.motifs.npz"
+        cached = self._recall(name)
+        if cached is not None and cached[0].source is not None:
+            return cached
+        data = self._load(name)
+        if data is None:
+            return None
+        categories = json.loads(str(data["categories"]))
+        codes = {column: data[f"codes_{column}"] for column in CATEGORY_COLUMNS}
+        start, end = data["start"], data["end"]
+        texts, offsets = data["texts"].tobytes().decode("ascii"), np.cumsum(end - start + 1).tolist()
+        spans = zip((start - 1).tolist(), end.tolist(), [0] + offsets, offsets)
+        source = HitTexts({(s, e): texts[a:b] for s, e, a, b in spans})
+        hits = HitTable(source, start, end, data["score"], codes, categories)
+        return self._remember(name, (hits, int(data["length"])))
+
+    def store_motifs(self, key, hits, length):
+        """Cache the HitTable of a sequence key; its source must still be readable"""
+        name = f"{key}-{self.version}.motifs.npz"
+        if self.directory:
+            arrays = {f"codes_{column}": hits.codes[column] for column in CATEGORY_COLUMNS}
+            arrays.update(start=hits.start, end=hits.end, score=hits.score, length=np.int64(length),
+                          categories=np.array(json.dumps(hits.categories)),
+                          texts=np.frombuffer("".join(hits.sequences()).encode("ascii"), dtype=np.uint8))
+            self._save(name, arrays)
+        cached = hits if isinstance(hits.source, HitTexts) else hits.with_source(None)
+        self._remember(name, (cached, length))
+
+    def lookup(self, seq, key=None):
+        """Cached all_motifs_table(seq), or None when this sequence was not scanned before"""
+        key = key or sequence_key(seq)
+        cached = self._recall(f"{key}-{self.version}.motifs.npz") or self.load_motifs(key)
+        return None if cached is None else cached[0].with_source(seq)
+
+    def motifs(self, seq, key=None, report=None) -> HitTable:
+        """all_motifs_table(seq, report=report), from the cache when this sequence was scanned before"""
+        key = key or sequence_key(seq)
+        hits = self.lookup(seq, key)
+        if hits is None:
+            hits = all_motifs_table(seq, report=report, motifs=self.motif_set)
+            self.store_motifs(key, hits, len(seq))
+        return hits
+
+    def hotspots(self, key, window=100, min_count=3, merge=False):
+        """find_hotspots for a sequence whose motifs are cached under `key`"""
+        name = f"{key}-{self.version}-w{window}-m{min_count}-{'merged' if merge else 'windows'}.hotspots.npz"
+        regions = self._recall(name)
+        if regions is None:
+            data = self._load(name)
+            if data is not None:
+                regions = [dict(zip(HOTSPOT_COLUMNS, row)) for row in zip(*(data[c].tolist() for c in HOTSPOT_COLUMNS))]
+        if regions is None:
+            cached = self._recall(f"{key}-{self.version}.motifs.npz") or self.load_motifs(key)
+            if cached is None:
+                raise KeyError(f"no cached motifs for sequence {key}")
+            hits, length = cached
+            regions = find_hotspots(length, hits, window, min_count, merge)
+            if self.directory:
+                self._save(name, {column: np.array([region[column] for region in regions], dtype=np.int64)
+                                  for column in HOTSPOT_COLUMNS})
+        return self._remember(name, regions)
+
+    def file_records(self, path):
+        """Cached [(name, key)] for a FASTA file unchanged since it was scanned, or None"""
+        data = self._load(self._file_name(path))
+        return None if data is None else [tuple(record) for record in json.loads(str(data["records"]))]
+
+    def store_file_records(self, path, records):
+        """Remember the (name, key) records of a FASTA file, keyed by its path, size and mtime"""
+        if self.directory:
+            self._save(self._file_name(path), {"records": np.array(json.dumps(records))})
+
+    def _file_name(self, path):
+        stat = os.stat(path)
+        identity = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\0{FILE_RECORDS_FORMAT}"
+        return hashlib.blake2b(identity.encode(), digest_size=20).hexdigest() + ".file.npz"
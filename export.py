@@ -0,0 +1,326 @@
+"""Streamed export of motif hits.
+
+Writers take one HitTable per record and write it in chunks of EXPORT_CHUNK
+rows, so no full copy of the results (DataFrame, CSV string) is ever built.
+Delimited text, optionally gzip-compressed, goes through the csv module, as
+do BED (BED6+3) and GFF3 feature files. Parquet and Arrow IPC files keep
+Class, Subtype and ScoreMethod as dictionary-encoded columns built straight
+from the HitTable category codes (pyarrow is imported only when one is
+written). Excel output is split over
+sheets of EXCEL_MAX_ROWS hits and refused beyond EXCEL_MAX_SHEETS sheets.
+
+    with open_writer("hits.parquet", record=True) as writer:
+        for name, hits in results:
+            writer.write(hits, name)
+"""
+import csv
+import gzip
+import importlib.util
+import io
+from itertools import repeat
+from urllib.parse import quote
+
+import numpy as np
+
+from hits import CATEGORY_COLUMNS
+
+EXPORT_CHUNK = 100_000
+# Rows below the header of one Excel worksheet
+EXCEL_MAX_ROWS = 1_048_575
+EXCEL_MAX_SHEETS = 8
+HIT_COLUMNS = ["Class", "Subtype", "Start", "End", "Length", "Sequence", "ScoreMethod", "Score"]
+HAVE_ARROW = importlib.util.find_spec("pyarrow") is not None
+# Sequence name of BED/GFF3 features written without a record name
+DEFAULT_RECORD = "sequence"
+BED_COLUMNS = ["chrom", "chromStart", "chromEnd", "name", "score", "strand", "class", "scoreMethod", "motifScore"]
+
+
+def export_columns(record=False, strand=False, constants=None):
+    """Column names written for hits, with optional Record, Strand and constant columns"""
+    return (["Record"] if record else []) + HIT_COLUMNS + (["Strand"] if strand else []) + list(constants or ())
+
+
+def excel_fits(rows):
+    """Whether `rows` hits fit in an Excel export"""
+    return rows <= EXCEL_MAX_ROWS * EXCEL_MAX_SHEETS
+
+
+def _open_binary(target):
+    """(binary file, whether we opened it) for a path or an open binary file"""
+    if isinstance(target, str):
+        return open(target, "wb"), True
+    return target, False
+
+
+class HitWriter:
+    """Base class of the streamed writers.
+
+    `target` is a path or an open binary file (left open on close). Columns
+    are fixed when the writer is opened: `record` adds the record name given
+    to write(), `strand` the hit strand and `constants` maps extra column
+    names to one value repeated on every row.
+    """
+
+    def __init__(self, target, record=False, strand=False, constants=None, chunk_size=EXPORT_CHUNK):
+        self.target = target
+        self.constants = dict(constants or {})
+        self.columns = export_columns(record, strand, self.constants)
+        self.chunk_size = chunk_size
+        self.rows = 0
+
+    def write(self, hits, record=None):
+        """Append one record's HitTable"""
+        for start in range(0, len(hits), self.chunk_size):
+            chunk = hits.take(slice(start, start + self.chunk_size))
+            self._write_chunk(chunk, record)
+            self.rows += len(chunk)
+
+    def _write_chunk(self, hits, record):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _text_columns(self, hits, record):
+        """Per-column value lists of a chunk, scores as text with unscored hits as "0" (as HitTable.records)"""
+        n = len(hits)
+        values = {
+            "Record": repeat(record, n), "Class": hits.labels("Class"), "Subtype": hits.labels("Subtype"),
+            "Start": hits.start.tolist(), "End": hits.end.tolist(), "Length": hits.length.tolist(),
+            "Sequence": hits.sequences(), "ScoreMethod": hits.labels("ScoreMethod"),
+            "Score": ["0" if score != score else f"{score:.2f}" for score in hits.score.tolist()],
+            "Strand": hits.strands(),
+        }
+        values.update((name, repeat(value, n)) for name, value in self.constants.items())
+        return [values[column] for column in self.columns]
+
+
+class DelimitedWriter(HitWriter):
+    """CSV/TSV text, gzip-compressed with compress=True"""
+
+    def __init__(self, target, delimiter=",", compress=False, **kwargs):
+        super().__init__(target, **kwargs)
+        self._file, self._owned = _open_binary(target)
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="wb") if compress else None
+        self._text = io.TextIOWrapper(self._gzip or self._file, encoding="utf-8", newline="")
+        self._writer = csv.writer(self._text, delimiter=delimiter, lineterminator="\n")
+        self._write_header()
+
+    def _write_header(self):
+        self._writer.writerow(self.columns)
+
+    def _write_chunk(self, hits, record):
+        self._writer.writerows(zip(*self._text_columns(hits, record)))
+
+    def close(self):
+        self._text.flush()
+        self._text.detach()
+        if self._gzip is not None:
+            self._gzip.close()
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+class FeatureWriter(DelimitedWriter):
+    """Base of the genome feature formats, written sorted by position within each record"""
+
+    def __init__(self, target, compress=False, **kwargs):
+        kwargs.update(record=True, constants=None)
+        super().__init__(target, "\t", compress, **kwargs)
+
+    def write(self, hits, record=None):
+        super().write(hits.take(hits.position_order()), record)
+
+
+class BedWriter(FeatureWriter):
+    """BED6+3 features: 0-based start, Subtype as name, then Class, ScoreMethod and Score.
+
+    The BED score column is always 0, as motif scores do not map to 0-1000;
+    strand is "." for single-strand results.
+    """
+
+    def _write_header(self):
+        self.columns = BED_COLUMNS
+        self._text.write("#" + "\t".join(self.columns) + "\n")
+
+    def _write_chunk(self, hits, record):
+        n = len(hits)
+        self._writer.writerows(zip(
+            repeat(record or DEFAULT_RECORD, n), (hits.start - 1).tolist(), hits.end.tolist(),
+            hits.labels("Subtype"), repeat(0, n), repeat(".", n) if hits.strand is None else hits.strands(),
+            hits.labels("Class"), hits.labels("ScoreMethod"),
+            ["." if score != score else f"{score:.2f}" for score in hits.score.tolist()],
+        ))
+
+
+class Gff3Writer(FeatureWriter):
+    """GFF3 sequence_motif features, with Name=Subtype and motif_class and score_method attributes"""
+
+    def _write_header(self):
+        self._text.write("##gff-version 3\n")
+
+    def _write_chunk(self, hits, record):
+        seqid = quote(record or DEFAULT_RECORD, safe=".:^*$@!+?|_-")
+        attributes = {}
+        for cls, subtype, method in zip(*(hits.labels(column) for column in CATEGORY_COLUMNS)):
+            if (cls, subtype, method) not in attributes:
+                attributes[cls, subtype, method] = (f"Name={quote(subtype, safe=' /_-')}"
+                                                    f";motif_class={quote(cls, safe=' _-')}"
+                                                    f";score_method={quote(method, safe=' ()_-')}")
+        rows = zip(hits.start.tolist(), hits.end.tolist(),
+                   repeat(".", len(hits)) if hits.strand is None else hits.strands(),
+                   zip(*(hits.labels(column) for column in CATEGORY_COLUMNS)), hits.score.tolist())
+        self._text.writelines(
+            f"{seqid}\tNBDFinder\tsequence_motif\t{start}\t{end}\t{'.' if score != score else f'{score:.2f}'}"
+            f"\t{strand}\t.\tID=motif{i};{attributes[labels]}\n"
+            for i, (start, end, strand, labels, score) in enumerate(rows, start=self.rows + 1))
+
+
+class ArrowWriter(HitWriter):
+    """Parquet (fmt="parquet") or Arrow IPC file (fmt="arrow") with dictionary-encoded categories.
+
+    Category labels get one index for the whole file, so every batch shares
+    a dictionary that only grows; Arrow files append new labels as deltas.
+    """
+
+    def __init__(self, target, fmt="parquet", **kwargs):
+        import pyarrow as pa
+        super().__init__(target, **kwargs)
+        self._labels = {column: {} for column in CATEGORY_COLUMNS}
+        labels = pa.dictionary(pa.int16(), pa.string())
+        types = {"Record": pa.string(), "Start": pa.int64(), "End": pa.int64(), "Length": pa.int64(),
+                 "Sequence": pa.string(), "Score": pa.float64(), "Strand": labels}
+        self.schema = pa.schema([(column, types.get(column, labels)) for column in self.columns])
+        self._file, self._owned = _open_binary(target)
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._file, self.schema)
+        else:
+            import pyarrow.ipc as ipc
+            self._writer = ipc.new_file(self._file, self.schema,
+                                        options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def _categories(self, hits, column):
+        labels = self._labels[column]
+        lookup = np.array([labels.setdefault(label, len(labels)) for label in hits.categories[column]],
+                          dtype=np.int16)
+        return lookup[hits.codes[column]], list(labels)
+
+    def _write_chunk(self, hits, record):
+        import pyarrow as pa
+        n = len(hits)
+        values = {
+            "Record": pa.array(repeat(record, n), pa.string()),
+            "Start": hits.start, "End": hits.end, "Length": hits.length,
+            "Sequence": pa.array(hits.sequences(), pa.string()),
+            "Score": pa.array(hits.score, from_pandas=True),
+            "Strand": pa.DictionaryArray.from_arrays(
+                (np.zeros(n, dtype=np.int16) if hits.strand is None else (hits.strand < 0).astype(np.int16)),
+                ["+", "-"]),
+        }
+        for column in CATEGORY_COLUMNS:
+            values[column] = pa.DictionaryArray.from_arrays(*self._categories(hits, column))
+        for name, value in self.constants.items():
+            values[name] = pa.DictionaryArray.from_arrays(np.zeros(n, dtype=np.int16), [value])
+        self._writer.write_batch(pa.record_batch([values[column] for column in self.columns], schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+        if self._owned:
+            self._file.close()
+
+
+class ExcelWriter(HitWriter):
+    """XLSX written row by row in xlsxwriter's constant-memory mode.
+
+    Hits fill "Motifs", "Motifs (2)", ... sheets of EXCEL_MAX_ROWS rows,
+    followed by a "Summary" sheet; ValueError is raised before writing hits
+    that would need more than EXCEL_MAX_SHEETS sheets.
+    """
+
+    def __init__(self, target, **kwargs):
+        import xlsxwriter
+        super().__init__(target, **kwargs)
+        self._workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+        self._sheet = None
+        self._sheets = 0
+        self._subtypes = set()
+        self._bases = 0
+
+    def _next_sheet(self):
+        self._sheets += 1
+        self._sheet = self._workbook.add_worksheet("Motifs" if self._sheets == 1 else f"Motifs ({self._sheets})")
+        self._sheet.write_row(0, 0, self.columns)
+        self._row = 1
+
+    def write(self, hits, record=None):
+        if not excel_fits(self.rows + len(hits)):
+            raise ValueError(f"{self.rows + len(hits)} motifs do not fit in {EXCEL_MAX_SHEETS} Excel sheets")
+        super().write(hits, record)
+
+    def _write_chunk(self, hits, record):
+        self._subtypes.update(hits.labels("Subtype"))
+        self._bases += int(hits.length.sum())
+        scores = [0 if score != score else score for score in hits.score.tolist()]
+        columns = self._text_columns(hits, record)
+        columns[self.columns.index("Score")] = scores
+        for row in zip(*columns):
+            if self._sheet is None or self._row > EXCEL_MAX_ROWS:
+                self._next_sheet()
+            self._sheet.write_row(self._row, 0, row)
+            self._row += 1
+
+    def close(self):
+        if self._sheet is None:
+            self._next_sheet()
+        summary = self._workbook.add_worksheet("Summary")
+        summary.write_row(0, 0, ["Metric", "Value"])
+        for row, item in enumerate([
+            ("Total Motifs", self.rows), ("Unique Types", len(self._subtypes)),
+            ("Average Length", f"{self._bases / self.rows if self.rows else 0:.1f} bp"),
+            ("Total Coverage", f"{self._bases} bp"),
+        ], start=1):
+            summary.write_row(row, 0, item)
+        self._workbook.close()
+
+
+FORMATS = {
+    "csv": (".csv", lambda target, **kwargs: DelimitedWriter(target, ",", **kwargs)),
+    "csv.gz": (".csv.gz", lambda target, **kwargs: DelimitedWriter(target, ",", compress=True, **kwargs)),
+    "tsv": (".tsv", lambda target, **kwargs: DelimitedWriter(target, "\t", **kwargs)),
+    "tsv.gz": (".tsv.gz", lambda target, **kwargs: DelimitedWriter(target, "\t", compress=True, **kwargs)),
+    "parquet": (".parquet", lambda target, **kwargs: ArrowWriter(target, "parquet", **kwargs)),
+    "arrow": (".arrow", lambda target, **kwargs: ArrowWriter(target, "arrow", **kwargs)),
+    "xlsx": (".xlsx", ExcelWriter),
+    "bed": (".bed", BedWriter),
+    "gff3": (".gff3", Gff3Writer),
+}
+
+
+def format_of(path):
+    """Export format named by a file's extension"""
+    for fmt, (suffix, _) in sorted(FORMATS.items(), key=lambda item: -len(item[1][0])):
+        if path.endswith(suffix):
+            return fmt
+    raise ValueError(f"unknown export format for {path}")
+
+
+def open_writer(target, fmt=None, **kwargs) -> HitWriter:
+    """Writer of format `fmt` (by default taken from the target path's extension)"""
+    return FORMATS[fmt or format_of(target)][1](target, **kwargs)
+
+
+def export_hits(hits, target, fmt=None, record=None, **kwargs):
+    """Write one HitTable to target; returns the number of rows written"""
+    strand = kwargs.pop("strand", hits.strand is not None)
+    with open_writer(target, fmt, record=record is not None, strand=strand, **kwargs) as writer:
+        writer.write(hits, record)
+    return writer.rows
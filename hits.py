@@ -0,0 +1,174 @@
+"""Columnar motif hit table.
+
+Hits are kept as parallel NumPy arrays (category codes, start, end, score)
+instead of one dict per hit. Hit sequences are not stored: they are sliced
+from the scanned source only when a hit is shown or exported.
+"""
+import numpy as np
+
+from utils import reverse_complement, wrap
+
+CATEGORY_COLUMNS = ("Class", "Subtype", "ScoreMethod")
+
+
+class HitTexts:
+    """Sliceable stand-in for a sequence that only holds the hit texts.
+
+    `texts` maps 0-based half-open (start, end) spans to their sequence.
+    """
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    def __getitem__(self, key):
+        return self.texts[(key.start, key.stop)]
+
+
+class HitTable:
+    """Struct-of-arrays motif hits over one source sequence.
+
+    `start`/`end` are 1-based and inclusive like the legacy hit dicts,
+    `codes[column]` index into `categories[column]` for the Class, Subtype and
+    ScoreMethod columns, and unscored hits carry NaN in `score`. `source` is
+    anything sliceable to hit text (a str, RecordView or streamed hit texts).
+    `strand` is None for single-strand results, otherwise +1/-1 per hit;
+    coordinates are always on the forward strand and minus-strand hit text is
+    reverse-complemented when read.
+    """
+
+    def __init__(self, source, start, end, score, codes, categories, strand=None):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.score = score
+        self.codes = codes
+        self.categories = categories
+        self.strand = strand
+
+    @classmethod
+    def from_spans(cls, source, spans, class_name, subtype, score_method="None", scores=None):
+        """Table of one motif subtype from 0-based half-open spans"""
+        bounds = np.array(spans, dtype=np.int64).reshape(-1, 2)
+        n = len(bounds)
+        score = np.full(n, np.nan) if scores is None else np.asarray(scores, dtype=np.float64)
+        codes = {column: np.zeros(n, dtype=np.uint8) for column in CATEGORY_COLUMNS}
+        categories = {"Class": [class_name], "Subtype": [subtype], "ScoreMethod": [score_method]}
+        return cls(source, bounds[:, 0] + 1, bounds[:, 1], score, codes, categories)
+
+    @classmethod
+    def concat(cls, tables, source=None):
+        """Concatenate tables over the same source, in order"""
+        tables = list(tables)
+        if source is None and tables:
+            source = tables[0].source
+        codes, categories = {}, {}
+        for column in CATEGORY_COLUMNS:
+            labels = list(dict.fromkeys(label for table in tables for label in table.categories[column]))
+            lookup = {label: i for i, label in enumerate(labels)}
+            parts = [np.array([lookup[label] for label in table.categories[column]], dtype=np.uint8)[table.codes[column]]
+                     for table in tables]
+            codes[column] = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+            categories[column] = labels
+        if not tables:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(source, empty, empty, np.zeros(0), codes, categories)
+        strand = None
+        if any(table.strand is not None for table in tables):
+            strand = np.concatenate([np.ones(len(table), dtype=np.int8) if table.strand is None else table.strand
+                                     for table in tables])
+        return cls(source, np.concatenate([table.start for table in tables]),
+                   np.concatenate([table.end for table in tables]),
+                   np.concatenate([table.score for table in tables]), codes, categories, strand)
+
+    def __len__(self):
+        return len(self.start)
+
+    def with_source(self, source):
+        """The same hits, reading their text from another source"""
+        return HitTable(source, self.start, self.end, self.score, self.codes, self.categories, self.strand)
+
+    def take(self, index):
+        """The hits selected by a slice, mask or index array, over the same source"""
+        return HitTable(self.source, self.start[index], self.end[index], self.score[index],
+                        {column: codes[index] for column, codes in self.codes.items()}, self.categories,
+                        None if self.strand is None else self.strand[index])
+
+    def position_order(self):
+        """Row order sorting the hits by start, then end"""
+        return np.lexsort((self.end, self.start))
+
+    def on_strand(self, strand):
+        """The same hits, all marked as found on `strand` (+1 or -1)"""
+        return HitTable(self.source, self.start, self.end, self.score, self.codes, self.categories,
+                        np.full(len(self), strand, dtype=np.int8))
+
+    def mirrored(self, length, source):
+        """Hits found on the reverse complement, moved to forward coordinates over `source`"""
+        return HitTable(source, length - self.end + 1, length - self.start + 1, self.score, self.codes,
+                        self.categories, np.full(len(self), -1, dtype=np.int8))
+
+    @property
+    def length(self):
+        return self.end - self.start + 1
+
+    @property
+    def nbytes(self):
+        """Memory held by the hit columns, in bytes"""
+        return (self.start.nbytes + self.end.nbytes + self.score.nbytes
+                + sum(codes.nbytes for codes in self.codes.values())
+                + (0 if self.strand is None else self.strand.nbytes))
+
+    def labels(self, column):
+        """Per-hit strings of a category column"""
+        labels = self.categories[column]
+        return [labels[code] for code in self.codes[column].tolist()]
+
+    def sequence(self, i):
+        """Sequence of hit i, sliced from the source and read on the hit's strand"""
+        text = self.source[int(self.start[i]) - 1:int(self.end[i])]
+        return reverse_complement(text) if self.strand is not None and self.strand[i] < 0 else text
+
+    def sequences(self):
+        texts = [self.source[start - 1:end] for start, end in zip(self.start.tolist(), self.end.tolist())]
+        if self.strand is not None:
+            for i in np.flatnonzero(self.strand < 0).tolist():
+                texts[i] = reverse_complement(texts[i])
+        return texts
+
+    def strands(self):
+        """Per-hit "+"/"-" labels (all "+" for single-strand results)"""
+        if self.strand is None:
+            return ["+"] * len(self)
+        return ["-" if strand < 0 else "+" for strand in self.strand.tolist()]
+
+    def records(self):
+        """Hits as the legacy list of dicts (wrapped sequence, score formatted as text).
+
+        Two-strand tables add a "Strand" key.
+        """
+        rows = zip(self.labels("Class"), self.labels("Subtype"), self.start.tolist(), self.end.tolist(),
+                   self.sequences(), self.labels("ScoreMethod"), self.score.tolist())
+        records = [{
+            "Class": cls, "Subtype": subtype, "Start": start, "End": end,
+            "Length": end - start + 1, "Sequence": wrap(sequence), "ScoreMethod": method,
+            "Score": "0" if score != score else f"{score:.2f}"
+        } for cls, subtype, start, end, sequence, method, score in rows]
+        if self.strand is not None:
+            for record, strand in zip(records, self.strands()):
+                record["Strand"] = strand
+        return records
+
+    def to_dataframe(self, sequences=False):
+        """DataFrame view with categorical labels; hit sequences are only sliced when requested"""
+        import pandas as pd
+        labels = {column: pd.Categorical.from_codes(self.codes[column], self.categories[column])
+                  .remove_unused_categories() for column in CATEGORY_COLUMNS}
+        data = {"Class": labels["Class"], "Subtype": labels["Subtype"],
+                "Start": self.start, "End": self.end, "Length": self.length}
+        if sequences:
+            data["Sequence"] = self.sequences()
+        data["ScoreMethod"] = labels["ScoreMethod"]
+        data["Score"] = self.score
+        if self.strand is not None:
+            data["Strand"] = pd.Categorical.from_codes((self.strand < 0).astype(np.int8), ["+", "-"])
+        return pd.DataFrame(data, copy=False)
@@ -0,0 +1,214 @@
+"""Sorted, block-compressed motif hit store with a coordinate index.
+
+A hit store file holds the hits of every record sorted by start, cut into
+blocks of BLOCK_ROWS hits that are zlib-compressed separately, followed by a
+JSON index giving each block's file offset, first start and largest end.
+A region query binary-searches the index (ends through their running
+maximum, as in HitIndex) and decompresses only the blocks that can overlap
+the region, like a tabix lookup on a bgzip-compressed BED file.
+
+    with HitStoreWriter("genome.nbdhits") as writer:
+        writer.write(hits, "chr1", length)
+    HitStore("genome.nbdhits").query(*parse_region("chr1:1,000-2,000"))
+"""
+import json
+import mmap
+import re
+import struct
+import zlib
+
+import numpy as np
+
+from export import HitWriter
+from hits import CATEGORY_COLUMNS, HitTable, HitTexts
+
+HITSTORE_SUFFIX = ".nbdhits"
+MAGIC = b"NBDHITS1"
+BLOCK_ROWS = 4096
+_FOOTER = struct.Struct("<Q8s")
+# Block columns: start, end, score, Class/Subtype/ScoreMethod codes, strand, text length
+_BLOCK_DTYPES = ("<i8", "<i8", "<f8", "u1", "u1", "u1", "i1", "<i4")
+_NO_END = np.iinfo(np.int64).max
+_REGION = re.compile(r"^(?:(.*):)?([\d,]+)(?:-([\d,]+))?$")
+
+
+def parse_region(text):
+    """(record or None, start, end or None) of "chr1:1,000-2,000", "1000-2000", "chr1:500" or "chr1".
+
+    Coordinates are 1-based and inclusive; a bare name selects a whole record.
+    """
+    text = text.strip()
+    match = _REGION.match(text)
+    if not match:
+        return text, 1, None
+    record, start, end = match.groups()
+    start = int(start.replace(",", ""))
+    end = int(end.replace(",", "")) if end else start
+    if start < 1 or end < start:
+        raise ValueError(f"invalid region {text!r}")
+    return record, start, end
+
+
+def overlap_bounds(starts, running_ends, start, end):
+    """(lo, hi): entries sorted by start that can overlap start..end lie in lo..hi-1.
+
+    `running_ends` is the running maximum of the entry ends, so every entry
+    before lo ends before `start` and every entry from hi on starts after `end`.
+    """
+    return int(np.searchsorted(running_ends, start)), int(np.searchsorted(starts, end, "right"))
+
+
+class HitIndex:
+    """In-memory coordinate index of one HitTable"""
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.order = hits.position_order()
+        self.starts = hits.start[self.order]
+        self.ends = hits.end[self.order]
+        self.running_ends = np.maximum.accumulate(self.ends) if len(hits) else self.ends
+
+    def rows(self, start=1, end=None):
+        """Table rows of the hits overlapping bases start..end (1-based, inclusive), by position"""
+        end = _NO_END if end is None else end
+        lo, hi = overlap_bounds(self.starts, self.running_ends, start, end)
+        return self.order[lo:hi][self.ends[lo:hi] >= start]
+
+    def query(self, start=1, end=None):
+        return self.hits.take(self.rows(start, end))
+
+
+class HitStoreWriter(HitWriter):
+    """Writes a hit store, one record per write() call.
+
+    Each block stores the start, end, score, category code, strand and hit
+    text columns of up to BLOCK_ROWS hits; category codes index labels shared
+    by the whole file.
+    """
+
+    def __init__(self, target, block_rows=BLOCK_ROWS):
+        super().__init__(target, chunk_size=block_rows)
+        self._file = open(target, "wb")
+        self._file.write(MAGIC)
+        self._labels = {column: {} for column in CATEGORY_COLUMNS}
+        self._records = []
+
+    def write(self, hits, record=None, length=None):
+        """Append one record's HitTable; `length` is the record length kept in the index"""
+        self._records.append({"name": record, "length": length, "hits": len(hits),
+                              "stranded": hits.strand is not None,
+                              "offset": [], "size": [], "rows": [], "first_start": [], "max_end": []})
+        super().write(hits.take(hits.position_order()), record)
+
+    def _write_chunk(self, hits, record):
+        columns = [hits.start.astype("<i8"), hits.end.astype("<i8"), hits.score.astype("<f8")]
+        for column in CATEGORY_COLUMNS:
+            labels = self._labels[column]
+            lookup = np.array([labels.setdefault(label, len(labels)) for label in hits.categories[column]],
+                              dtype=np.uint8)
+            columns.append(lookup[hits.codes[column]])
+        columns.append(np.ones(len(hits), dtype=np.int8) if hits.strand is None else hits.strand.astype(np.int8))
+        texts = [hits.source[start - 1:end].encode("ascii") for start, end in zip(hits.start.tolist(),
+                                                                                   hits.end.tolist())]
+        columns.append(np.array([len(text) for text in texts], dtype="<i4"))
+        block = zlib.compress(b"".join(column.tobytes() for column in columns) + b"".join(texts))
+        entry = self._records[-1]
+        entry["offset"].append(self._file.tell())
+        entry["size"].append(len(block))
+        entry["rows"].append(len(hits))
+        entry["first_start"].append(int(hits.start[0]))
+        entry["max_end"].append(int(hits.end.max()))
+        self._file.write(block)
+
+    def close(self):
+        index = {"block_rows": self.chunk_size, "records": self._records,
+                 "categories": {column: list(labels) for column, labels in self._labels.items()}}
+        offset = self._file.tell()
+        self._file.write(zlib.compress(json.dumps(index).encode()))
+        self._file.write(_FOOTER.pack(offset, MAGIC))
+        self._file.close()
+
+
+class HitStore:
+    """Read-only hit store, memory-mapped; query() reads only the blocks a region needs"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        offset, magic = _FOOTER.unpack_from(self._buffer, len(self._buffer) - _FOOTER.size)
+        if self._buffer[:len(MAGIC)] != MAGIC or magic != MAGIC:
+            raise ValueError(f"{path} is not a hit store")
+        index = json.loads(zlib.decompress(self._buffer[offset:len(self._buffer) - _FOOTER.size]))
+        self.categories = index["categories"]
+        self._records = {}
+        for record in index["records"]:
+            for key in ("offset", "size", "rows", "first_start", "max_end"):
+                record[key] = np.array(record[key], dtype=np.int64)
+            record["running_end"] = np.maximum.accumulate(record["max_end"]) if record["hits"] else record["max_end"]
+            self._records[record["name"]] = record
+
+    @property
+    def records(self):
+        """Record names in file order"""
+        return list(self._records)
+
+    def length(self, record):
+        return self._records[record]["length"]
+
+    def stranded(self, record):
+        """Whether a record's hits were found on both strands"""
+        return self._records[record]["stranded"]
+
+    def _record(self, record):
+        if record is None:
+            if len(self._records) != 1:
+                raise ValueError(f"{self.path} holds {len(self._records)} records; name one in the region")
+            return next(iter(self._records.values()))
+        try:
+            return self._records[record]
+        except KeyError:
+            raise ValueError(f"no record {record!r} in {self.path}") from None
+
+    def query(self, record=None, start=1, end=None) -> HitTable:
+        """Hits of `record` overlapping bases start..end (1-based, inclusive; end None for the whole record).
+
+        The hits come sorted by position and read their text from the store.
+        """
+        entry = self._record(record)
+        end = _NO_END if end is None else end
+        lo, hi = overlap_bounds(entry["first_start"], entry["running_end"], start, end)
+        parts = [self._decode(entry, i) for i in range(lo, max(lo, hi))] or [self._decode(entry, None)]
+        starts, ends, score, *codes, strand, texts = (np.concatenate(column) for column in zip(*parts))
+        keep = (ends >= start) & (starts <= end)
+        spans = zip((starts[keep] - 1).tolist(), ends[keep].tolist())
+        source = HitTexts(dict(zip(spans, texts[keep].tolist())))
+        return HitTable(source, starts[keep], ends[keep], score[keep],
+                        {column: code[keep] for column, code in zip(CATEGORY_COLUMNS, codes)},
+                        self.categories, strand[keep] if entry["stranded"] else None)
+
+    def _decode(self, entry, i):
+        """Columns of block i of a record (no rows for i=None)"""
+        if i is None:
+            data, n = b"", 0
+        else:
+            data = zlib.decompress(self._buffer[entry["offset"][i]:entry["offset"][i] + entry["size"][i]])
+            n = int(entry["rows"][i])
+        columns, pos = [], 0
+        for dtype in _BLOCK_DTYPES:
+            column = np.frombuffer(data, dtype=dtype, count=n, offset=pos)
+            columns.append(column)
+            pos += column.nbytes
+        ends = np.cumsum(columns[-1]) + pos
+        texts = np.array([data[a:b].decode("ascii") for a, b in zip((ends - columns[-1]).tolist(), ends.tolist())],
+                         dtype=object)
+        return columns[:-1] + [texts]
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,172 @@
+"""Incremental re-analysis of edited sequences.
+
+An IncrementalAnalysis keeps the non-overlapping spans of every pattern from
+its last scan. After an edit each pattern is rescanned from a restart point
+just before the changed bases until its scan position falls back in step
+with the old spans behind the edit (see parallel.merge_spans); spans outside
+that stretch are kept, those after the edit shifted by the change in length.
+Hotspot windows are recounted only around the hits that changed. The result
+is identical to analyzing the edited sequence from scratch.
+"""
+from bisect import bisect_left
+
+import numpy as np
+
+from motifs import PREFILTERS, MotifScan, all_motifs_table, hot_windows, hotspot_regions
+from parallel import merge_spans
+from utils import RecordView
+
+RESCAN_STEP = 1024
+RESTART_CONTEXT = 4096
+# Edits replacing more than this fraction of the sequence are rescanned in full
+FULL_RESCAN_FRACTION = 0.25
+
+
+def _codes(seq):
+    if isinstance(seq, RecordView):
+        return seq.array()
+    return np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+
+
+def _slice(seq, start, end):
+    return seq.window(start, end) if isinstance(seq, RecordView) else seq[start:end]
+
+
+def _resume(span):
+    """Scan position after a match at span"""
+    return max(span[1], span[0] + 1)
+
+
+def _period(anchor):
+    return next(p for p in range(1, len(anchor) + 1) if anchor[p:] == anchor[:-p])
+
+
+def edit_bounds(old, new):
+    """(start, old_end, new_end) such that new is old with old[start:old_end] replaced by new[start:new_end]"""
+    a, b = _codes(old), _codes(new)
+    m = min(len(a), len(b))
+    same = a[:m] == b[:m]
+    start = m if same.all() else int(np.argmin(same))
+    tail = m - start
+    same = a[len(a) - tail:][::-1] == b[len(b) - tail:][::-1]
+    suffix = tail if same.all() else int(np.argmin(same))
+    return start, len(a) - suffix, len(b) - suffix
+
+
+def restart_point(seq, pattern, edit_start):
+    """Position before edit_start from which a rescan of pattern reproduces the full scan.
+
+    No match attempt starting before it reads as far as edit_start: an
+    attempt of a clustered pattern (see PREFILTERS) reads at most max_gap +
+    min_run bases past the run cluster it starts in, and one of an anchored
+    pattern stops where the repeat of the anchor's period it starts in ends.
+    """
+    prefilter = PREFILTERS.get(pattern)
+    if not prefilter:
+        return 0
+    context = RESTART_CONTEXT
+    while True:
+        lo = max(0, edit_start - context)
+        window = _slice(seq, lo, edit_start)
+        n = edit_start - lo
+        if isinstance(prefilter, tuple):
+            bases, min_run, max_gap, _ = prefilter
+            starts, ends, _ = MotifScan(window).clusters(bases, min_run, max_gap)
+            reaching = np.flatnonzero(ends + max_gap + min_run + 1 >= n)
+            point = min(int(starts[reaching[0]]) if len(reaching) else n, n - min_run - 1)
+            # A cluster this close to the window start may continue before it
+            clipped = point <= max_gap + min_run
+        else:
+            codes, period = _codes(window), _period(prefilter)
+            breaks = np.flatnonzero(codes[period:] != codes[:-period]) if n > period else []
+            point = min(int(breaks[-1]) + 1 if len(breaks) else 0, n - len(prefilter))
+            clipped = not len(breaks)
+        if lo == 0 or not clipped:
+            return max(0, lo + point - 1)
+        context *= 4
+
+
+class IncrementalAnalysis:
+    """Motif hits of a sequence that is re-analyzed incrementally after each edit.
+
+    `hits` may pass an already known HitTable of `seq` (e.g. from the
+    ResultCache); the per-pattern spans are then found by one full scan when
+    the first edit arrives.
+    """
+
+    def __init__(self, seq, hits=None):
+        self.seq = seq
+        self._spans = None
+        if hits is None:
+            hits = self._scan(seq)
+        self.hits = hits
+        self._hot = {}
+
+    def _scan(self, seq):
+        scan = MotifScan(seq)
+        hits = all_motifs_table(scan)
+        self._spans = {pattern: scan.spans(pattern) for pattern in PREFILTERS}
+        return hits
+
+    def update(self, seq):
+        """HitTable of the edited sequence `seq`, rescanning only around the edit"""
+        start, old_end, new_end = edit_bounds(self.seq, seq)
+        if start == old_end == new_end:
+            self.seq = seq
+            return self.hits
+        if new_end - start > FULL_RESCAN_FRACTION * len(seq):
+            self.seq, self.hits, self._hot = seq, self._scan(seq), {}
+            return self.hits
+        if self._spans is None:
+            self._scan(self.seq)
+        delta = new_end - old_end
+        spans = {}
+        for pattern, old in self._spans.items():
+            restart = restart_point(seq, pattern, start)
+            starts = [span_start for span_start, _ in old]
+            i, j = bisect_left(starts, restart), bisect_left(starts, old_end)
+            # Before the edit the scan is exact up to the restart point; after
+            # it the old scan agrees once it is at the same shifted position
+            before = (old[:i], max(restart, _resume(old[i - 1])) if i else restart)
+            after_start = max(new_end, _resume(old[j - 1]) + delta) if j else new_end
+            after = ([(s + delta, e + delta) for s, e in old[j:]], len(seq))
+            spans[pattern] = merge_spans(seq, pattern, [(0, before), (after_start, after)], RESCAN_STEP)
+        hits = all_motifs_table(MotifScan(seq, spans))
+        if self._hot:
+            self._update_hotspots(hits, len(seq), start, old_end, new_end)
+        self.seq, self._spans, self.hits = seq, spans, hits
+        return hits
+
+    def _changed_range(self, hits, start, old_end, new_end):
+        """1-based first and last base of the edited sequence whose hit coverage changed"""
+        old, delta = self.hits, new_end - old_end
+        old_starts = np.where(old.start > old_end, old.start + delta, np.minimum(old.start, start + 1))
+        old_ends = np.where(old.end > old_end, old.end + delta, np.minimum(old.end, start + 1))
+        scale = max(len(self.seq), len(self.seq) + delta) + 2
+        keys = np.concatenate((old_starts * scale + old_ends, hits.start * scale + hits.end))
+        weights = np.concatenate((-np.ones(len(old)), np.ones(len(hits))))
+        values, inverse = np.unique(keys, return_inverse=True)
+        changed = values[np.bincount(inverse, weights=weights, minlength=len(values)) != 0]
+        first = min(start + 1, int((changed // scale).min()) if len(changed) else start + 1)
+        last = max(new_end, start + 1, int((changed % scale).max()) if len(changed) else 0)
+        return first, last
+
+    def _update_hotspots(self, hits, length, start, old_end, new_end):
+        first, last = self._changed_range(hits, start, old_end, new_end)
+        delta = new_end - old_end
+        for (window, min_count), (positions, counts) in self._hot.items():
+            # Windows clear of the changed range touch the same hits as before
+            lo, hi = first - window + 1, last
+            before, after = positions < lo, positions > hi - delta
+            middle = hot_windows(length, hits.start, hits.end, window, min_count, lo, hi)
+            self._hot[window, min_count] = (
+                np.concatenate((positions[before], middle[0], positions[after] + delta)),
+                np.concatenate((counts[before], middle[1], counts[after])))
+
+    def hotspots(self, window=100, min_count=3, merge=False):
+        """find_hotspots of the current hits, kept up to date across edits"""
+        if (window, min_count) not in self._hot:
+            self._hot[window, min_count] = hot_windows(len(self.seq), self.hits.start, self.hits.end,
+                                                       window, min_count)
+        positions, counts = self._hot[window, min_count]
+        return hotspot_regions(positions, counts, self.hits.start, self.hits.end, window, merge)
@@ -0,0 +1,85 @@
+"""Background motif scans with progress and cooperative cancellation.
+
+A ScanJob runs all_motifs_table in a worker thread, streaming the sequence
+through a StreamScan chunk by chunk. After every chunk it publishes how many
+bases are settled and checks for cancellation, so a caller such as the
+Streamlit page can poll it and stay responsive. A cancelled job keeps the
+hits found so far: every hit starting before the settled position, exactly
+as a full scan reports them.
+"""
+import threading
+import time
+
+from motifs import StreamScan, all_motifs_table
+
+MIN_JOB_CHUNK = 50_000
+PROGRESS_STEPS = 100
+
+
+class ScanJob:
+    """all_motifs_table(seq) in a background thread.
+
+    `status` moves from "pending" to "running" and ends as "done",
+    "cancelled" or "failed" (with `error` set). `result` is the HitTable once
+    the job has ended, partial when cancelled; hit text is read from `seq`.
+    """
+
+    def __init__(self, seq, chunk_size=None, report=None):
+        self.seq = seq
+        self.length = len(seq)
+        self.chunk_size = chunk_size or max(MIN_JOB_CHUNK, self.length // PROGRESS_STEPS)
+        self.report = report
+        self.status = "pending"
+        self.settled = 0
+        self.result = None
+        self.error = None
+        self.started = self.finished = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="nbd-scan", daemon=True)
+
+    def start(self):
+        self.status = "running"
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Ask the scan to stop after the chunk it is working on"""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the job ends (or timeout seconds pass); returns True if it ended"""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @property
+    def running(self):
+        return self.status in ("pending", "running")
+
+    @property
+    def fraction(self):
+        """Share of the sequence whose hits are final, 0.0 to 1.0"""
+        return self.settled / self.length if self.length else 1.0
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def _chunk_done(self, settled):
+        self.settled = settled
+        return not self._cancel.is_set()
+
+    def _run(self):
+        try:
+            step = self.chunk_size
+            pieces = (self.seq[start:start + step] for start in range(0, self.length, step))
+            scan = StreamScan(pieces, step, report=self.report, on_chunk=self._chunk_done)
+            self.result = all_motifs_table(scan, report=self.report).with_source(self.seq)
+            self.status = "cancelled" if scan.cancelled else "done"
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+        finally:
+            self.finished = time.perf_counter()
@@ -0,0 +1,117 @@
+"""Compiled kernels for the G-run motifs (the G-quadruplex family, i-motif and G-triplex).
+
+Each of these motifs is a run of at least min_run copies of one base followed
+by loops of loop_min..loop_max A/T/G/C bases, each closed by another such
+run (see motifs.RUN_MOTIFS). Instead of letting the regex engine try every
+position, the kernel only walks the run clusters MotifScan has built from
+its tokenized runs: a match can only start where a run starts (or where the
+scan resumes inside one), and if it fails there it fails at every later
+position of the same run.
+From each candidate start it searches the loop and run lengths depth-first
+in the order the backtracking regex would (longer first), so it reports the
+very same span.
+
+This module needs numba; motifs.py only imports it on first use, when numba
+is installed, and scans with the regex engine otherwise. Compiled code is
+cached on disk, so only the first process ever pays for the compilation.
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, nogil=True)
+def _run_end(codes, p, base):
+    n = len(codes)
+    while p < n and codes[p] == base:
+        p += 1
+    return p
+
+
+@njit(cache=True, nogil=True)
+def _loop_room(codes, q, loop_max):
+    # Bases from q that a loop may span: A, T, G or C only
+    n, room = len(codes), 0
+    while room < loop_max and q + room < n:
+        code = codes[q + room]
+        if code != 65 and code != 84 and code != 71 and code != 67:
+            break
+        room += 1
+    return room
+
+
+@njit(cache=True, nogil=True)
+def _match(codes, start, base, min_run, loop_min, loop_max, min_loops, max_loops, frames):
+    # Frame d is loop d, from frames[d, 0] and frames[d, 1] bases long, and the
+    # run of frames[d, 2] bases closing it; frame 0 is the first run alone.
+    # max_loops < 0 means no limit. Returns the match end, -1 for no match or
+    # -2 when a match needs more frames than there are.
+    end = _run_end(codes, start, base)
+    if end - start < min_run:
+        return -1
+    frames[0, 0], frames[0, 1], frames[0, 2] = start, 0, end - start
+    d = 0
+    while True:
+        end = frames[d, 0] + frames[d, 1] + frames[d, 2]
+        if d == max_loops:
+            return end
+        if d + 1 == len(frames):
+            return -2
+        d += 1
+        frames[d, 0], frames[d, 1], frames[d, 2] = end, _loop_room(codes, end, loop_max) + 1, 0
+        # Move frame d to its next choice, backing up through exhausted frames
+        while True:
+            if frames[d, 2] > min_run:
+                frames[d, 2] -= 1
+                break
+            if d == 0:
+                return -1
+            q, loop, closing = frames[d, 0], frames[d, 1] - 1, 0
+            while loop >= loop_min:
+                closing = _run_end(codes, q + loop, base) - q - loop
+                if closing >= min_run:
+                    break
+                loop -= 1
+            if loop >= loop_min:
+                frames[d, 1], frames[d, 2] = loop, closing
+                break
+            d -= 1
+            if d >= min_loops:
+                return frames[d, 0] + frames[d, 1] + frames[d, 2]
+
+
+@njit(cache=True, nogil=True)
+def _scan(codes, base, window_starts, window_ends, pos, min_run, loop_min, loop_max, min_loops, max_loops):
+    # Every match holds a run of min_run bases, so the windows bound their number
+    found = np.empty(((window_ends - window_starts).sum() // min_run + 1, 2), np.int64)
+    frames = np.empty((16, 3), np.int64)
+    count = 0
+    for w in range(len(window_starts)):
+        start = max(window_starts[w], pos)
+        while start < window_ends[w]:
+            if codes[start] != base:
+                start += 1
+                continue
+            end = _match(codes, start, base, min_run, loop_min, loop_max, min_loops, max_loops, frames)
+            while end == -2:
+                frames = np.empty((2 * len(frames), 3), np.int64)
+                end = _match(codes, start, base, min_run, loop_min, loop_max, min_loops, max_loops, frames)
+            if end >= 0:
+                found[count, 0], found[count, 1] = start, end
+                count += 1
+                start = pos = end
+            else:
+                # A later start in the same run has fewer choices and fails too
+                start = _run_end(codes, start, base)
+    return found[:count]
+
+
+def run_motif_spans(codes, window_starts, window_ends, motif, pos=0):
+    """Non-overlapping spans from pos of a RUN_MOTIFS motif, searched from the runs inside sorted windows.
+
+    Every match must lie inside one window (a candidate run cluster).
+    """
+    base, min_run, loop_min, loop_max, min_loops, max_loops = motif
+    found = _scan(codes, ord(base), np.asarray(window_starts, dtype=np.int64),
+                  np.asarray(window_ends, dtype=np.int64), pos, min_run, loop_min, loop_max, min_loops,
+                  -1 if max_loops is None else max_loops)
+    return list(zip(found[:, 0].tolist(), found[:, 1].tolist()))
@@ -0,0 +1,135 @@
+"""Motif map rendering that scales to large sequences.
+
+Every hit of a view is drawn as a bar on its subtype's track, all in one
+PolyCollection. Views wider than `pixels` bases are drawn as per-pixel
+density tracks instead: each track is binned into `pixels` columns shaded
+by the fraction of their bases covered by hits, computed exactly from sorted
+starts and ends without any per-base array. plotly_motif_map builds the same
+map as a zoomable Plotly figure for one region, from only the hits in it.
+"""
+import numpy as np
+
+MAP_PIXELS = 1200
+# Regions with more hits than this are shown as density tracks in Plotly
+PLOTLY_MAX_BARS = 20_000
+BAR_HEIGHT = 0.6
+MIN_DENSITY_ALPHA = 0.25
+
+
+def track_colors(subtypes):
+    """Subtype -> RGB color, from the husl palette over the sorted subtypes"""
+    import seaborn as sns
+    return dict(zip(subtypes, sns.color_palette("husl", n_colors=len(subtypes))))
+
+
+def coverage_bins(starts, ends, first, last, bins):
+    """(edges, density) of hits over bases first..last split into `bins` equal columns.
+
+    A hit covers [start, end + 1) on the axis; density is the covered
+    fraction of each column, counting overlapping hits more than once.
+    """
+    edges = np.linspace(first, last + 1, bins + 1)
+    starts = np.sort(np.asarray(starts, dtype=np.float64))
+    stops = np.sort(np.asarray(ends, dtype=np.float64) + 1)
+    start_sums = np.concatenate(([0.0], np.cumsum(starts)))
+    stop_sums = np.concatenate(([0.0], np.cumsum(stops)))
+    # Covered bases left of x: sum(x - start) over started hits minus sum(x - stop) over ended ones
+    opened = np.searchsorted(starts, edges)
+    closed = np.searchsorted(stops, edges)
+    covered = opened * edges - start_sums[opened] - (closed * edges - stop_sums[closed])
+    return edges, np.diff(covered) / np.diff(edges)
+
+
+def _tracks(hits):
+    subtypes = hits.labels("Subtype")
+    names = sorted(set(subtypes))
+    rows = {name: i + 1 for i, name in enumerate(names)}
+    return names, np.array([rows[name] for name in subtypes], dtype=np.float64)
+
+
+def draw_motif_map(ax, hits, first=1, last=None, pixels=MAP_PIXELS, label_fraction=0.05):
+    """Draw hits over bases first..last on a matplotlib Axes; returns the subtype track names.
+
+    Views of more than `pixels` bases become density tracks. Bars longer
+    than label_fraction of the view are labelled with their length.
+    """
+    from matplotlib.collections import PolyCollection
+    last = last or int(hits.end.max(initial=first))
+    visible = (hits.end >= first) & (hits.start <= last)
+    hits = hits.take(visible)
+    names, y = _tracks(hits)
+    colors = track_colors(names)
+    span = last - first + 1
+    if span > pixels:
+        boxes, facecolors = [], []
+        for row, name in enumerate(names, start=1):
+            track = y == row
+            edges, density = coverage_bins(hits.start[track], hits.end[track], first, last, pixels)
+            filled = np.flatnonzero(density > 0)
+            half = BAR_HEIGHT / 2
+            boxes.append(_rectangles(edges[filled], edges[filled + 1], row - half, row + half))
+            # Any covered column stays visible; denser columns are more opaque
+            alpha = MIN_DENSITY_ALPHA + (1 - MIN_DENSITY_ALPHA) * density[filled] / density.max(initial=1e-9)
+            facecolors += [(*colors[name], a) for a in alpha.tolist()]
+        collection = PolyCollection(np.concatenate(boxes) if boxes else np.zeros((0, 4, 2)),
+                                    facecolors=facecolors, linewidths=0)
+    else:
+        half = BAR_HEIGHT / 2
+        collection = PolyCollection(_rectangles(hits.start, hits.end + 1, y - half, y + half),
+                                    facecolors=[colors[name] for name in hits.labels("Subtype")],
+                                    edgecolors="black", linewidths=0.5, alpha=0.8)
+        for i in np.flatnonzero(hits.length > span * label_fraction).tolist():
+            ax.text(hits.start[i] + hits.length[i] / 2, y[i], f"{hits.length[i]}bp",
+                    ha="center", va="center", fontsize=8, fontweight="bold")
+    ax.add_collection(collection)
+    ax.set_xlim(first - 1, last)
+    ax.set_ylim(0.4, len(names) + 0.6)
+    ax.set_yticks(range(1, len(names) + 1))
+    ax.set_yticklabels(names)
+    return names
+
+
+def _rectangles(left, right, bottom, top):
+    """(n, 4, 2) vertices of axis-aligned rectangles for PolyCollection"""
+    left, right = np.asarray(left, dtype=np.float64), np.asarray(right, dtype=np.float64)
+    bottom, top = np.broadcast_to(bottom, left.shape), np.broadcast_to(top, left.shape)
+    return np.stack([np.stack([left, bottom], -1), np.stack([left, top], -1),
+                     np.stack([right, top], -1), np.stack([right, bottom], -1)], 1)
+
+
+def plotly_motif_map(hits, first, last, pixels=MAP_PIXELS, max_bars=PLOTLY_MAX_BARS):
+    """Zoomable Plotly motif map of the hits overlapping bases first..last.
+
+    `hits` should already be limited to the region (e.g. by a HitIndex query).
+    Up to max_bars hits are drawn as bars with hover details; more become a
+    density heatmap of `pixels` columns.
+    """
+    import plotly.graph_objects as go
+    names, y = _tracks(hits)
+    colors = track_colors(names)
+    fig = go.Figure()
+    if len(hits) > max_bars:
+        rows = [coverage_bins(hits.start[y == row], hits.end[y == row], first, last, pixels)
+                for row in range(1, len(names) + 1)]
+        edges = rows[0][0]
+        fig.add_trace(go.Heatmap(
+            x=(edges[:-1] + edges[1:]) / 2, y=names, z=[np.minimum(density, 1.0) for _, density in rows],
+            colorscale="Blues", zmin=0, zmax=1, colorbar={"title": "Covered"},
+            hovertemplate="%{y}<br>%{x:.0f}: %{z:.0%} covered<extra></extra>"))
+    else:
+        classes = np.array(hits.labels("Class"), dtype=object)
+        for row, name in enumerate(names, start=1):
+            track = y == row
+            r, g, b = (int(255 * channel) for channel in colors[name])
+            fig.add_trace(go.Bar(
+                orientation="h", y=[name] * int(track.sum()), base=hits.start[track],
+                x=hits.length[track], name=name, marker={"color": f"rgb({r},{g},{b})", "line": {"width": 0}},
+                customdata=np.stack([hits.start[track], hits.end[track], classes[track],
+                                     hits.score[track]], -1),
+                hovertemplate="%{customdata[2]} %{y}<br>%{customdata[0]}-%{customdata[1]}"
+                              "<br>score %{customdata[3]:.2f}<extra></extra>"))
+    fig.update_layout(barmode="overlay", showlegend=False, height=max(300, 40 * len(names) + 120),
+                      xaxis={"title": "Position (bp)", "range": [first - 1, last + 1]},
+                      yaxis={"categoryorder": "array", "categoryarray": names},
+                      margin={"l": 10, "r": 10, "t": 30, "b": 40})
+    return fig
@@ -1,142 +1,950 @@
+import importlib.util
 import re
-from utils import wrap, gc_content, reverse_complement, g4hunter_score, zseeker_score
+import time
+from functools import lru_cache
+import numpy as np
+from utils import (
+    wrap, gc_content, reverse_complement, g4hunter_score, imotif_score, zseeker_score, stream_fasta,
+    RecordView,
+)
+from scoring import encode, score_intervals, score_texts
+from hits import HitTable, HitTexts
+from repeats import literal_runs, literal_spans, literal_starts, periodic_stretches, tandem_spans
 
-def non_overlapping_finditer(pattern, seq):
-    """Find non-overlapping matches"""
-    regex = re.compile(pattern)
+G4_PATTERN = r"(?=(G{3,}([ATGC]{1,7}G{3,}){3}))"
+RELAXED_G4_PATTERN = r"(?=(G{3,}(?:[ATGC]{0,12}G{3,}){3}))"
+BULGED_G4_PATTERN = r"(?=(G{3,}[ATGC]{0,3}G{3,}[ATGC]{0,3}G{3,}[ATGC]{0,3}G{3,}))"
+BIPARTITE_G4_PATTERN = r"(?=(G{3,}(?:[ATGC]{0,30}G{3,}){3}))"
+MULTIMERIC_G4_PATTERN = r"(?=((G{3,}(?:[ATGC]{0,12}G{3,}){4,})))"
+IMOTIF_PATTERN = r"(?=(C{3,}([ATGC]{1,7}C{3,}){3}))"
+GTRIPLEX_PATTERN = r"(?=(G{3,}([ATGC]{1,7}G{3,}){2}))"
+ZDNA_PATTERN = r"(?=((?:CG){6,}))"
+HDNA_PATTERN = r"(?=(T{3,}[ATGC]{1,7}A{3,}))"
+STICKY_PATTERN = r"(?=(CTGCTGCTGCTG))"
+AT_SLIPPAGE_PATTERN = r"(?=((?:AT){6,}))"
+CRUCIFORM_PATTERN = r"(?=(A{4,}TTTT))"
+POLY_AT_PATTERN = r"(?=(A{6,7}|T{6,7}))"
+APR_PATTERN = r"(?=((?:AAATT){2,}))"
+MIRROR_PATTERN = r"(?=(ATCGCGAT))"
+POLY_G_PATTERN = r"(?=(G{6,}))"
+
+# Candidate-site prefilters, keyed by pattern. A string is a literal every match
+# must start with; a tuple (bases, min_run, max_gap, min_units) says every match
+# lies inside a cluster of runs of `bases` (each >= min_run long, consecutive
+# runs at most max_gap apart) holding at least min_units non-overlapping
+# min_run-long units, so the regex only has to be tried inside those clusters.
+PREFILTERS = {
+    HDNA_PATTERN: ("TA", 3, 7, 2),
+    CRUCIFORM_PATTERN: ("AT", 4, 0, 2),
+    POLY_AT_PATTERN: ("AT", 6, 0, 1),
+    POLY_G_PATTERN: ("G", 6, 0, 1),
+}
+
+# Regex motifs that run from a run of one base to a run of another, keyed by
+# pattern: (first, min_first, second, min_second, max_gap) says every match
+# starts in a run of at least min_first `first`s and ends in a run of at least
+# min_second `second`s starting at most max_gap bases after that first run.
+# The regex is only tried from each such first run to the furthest second run
+# it reaches (see MotifScan.pair_windows), never along a lone homopolymer,
+# where it would backtrack at every start. Pairs lie in PREFILTERS clusters.
+RUN_PAIRS = {
+    HDNA_PATTERN: ("T", 3, "A", 3, 7),
+    CRUCIFORM_PATTERN: ("A", 4, "T", 4, 0),
+}
+
+# Exact repeats found by repeats.py instead of the regex, keyed by pattern:
+# (unit, min_units, max_units) is min_units..max_units copies of unit (no
+# limit for None), matching the pattern repeats.repeat_pattern gives. Each is
+# also an anchored PREFILTERS entry, for streamed and incremental scans.
+REPEATS = {
+    ZDNA_PATTERN: ("CG", 6, None),
+    STICKY_PATTERN: ("CTG", 4, 4),
+    AT_SLIPPAGE_PATTERN: ("AT", 6, None),
+    APR_PATTERN: ("AAATT", 2, None),
+    MIRROR_PATTERN: ("ATCGCGAT", 1, 1),
+}
+
+def _repeat_prefilter(repeat):
+    unit, min_units, _ = repeat
+    return unit * min_units
+
+PREFILTERS.update((pattern, _repeat_prefilter(repeat)) for pattern, repeat in REPEATS.items())
+
+# Run motifs found by the compiled kernels of kernels.py when numba is
+# installed (see run_kernel), keyed by pattern: (base, min_run, loop_min,
+# loop_max, min_loops, max_loops) is a run of at least min_run `base`s, then
+# min_loops..max_loops (no limit for None) loops of loop_min..loop_max bases
+# each closed by such a run. Their clusters are the PREFILTERS entries.
+RUN_MOTIFS = {
+    G4_PATTERN: ("G", 3, 1, 7, 3, 3),
+    RELAXED_G4_PATTERN: ("G", 3, 0, 12, 3, 3),
+    BULGED_G4_PATTERN: ("G", 3, 0, 3, 3, 3),
+    BIPARTITE_G4_PATTERN: ("G", 3, 0, 30, 3, 3),
+    MULTIMERIC_G4_PATTERN: ("G", 3, 0, 12, 4, None),
+    IMOTIF_PATTERN: ("C", 3, 1, 7, 3, 3),
+    GTRIPLEX_PATTERN: ("G", 3, 1, 7, 2, 2),
+}
+
+def _run_prefilter(run):
+    base, min_run, _, loop_max, min_loops, _ = run
+    return base, min_run, loop_max, min_loops + 1
+
+PREFILTERS.update((pattern, _run_prefilter(run)) for pattern, run in RUN_MOTIFS.items())
+
+# Set to False to scan the run motifs with the regex engine even with numba
+USE_KERNELS = True
+
+# Reference scorers with a vectorized ScoreTrack equivalent
+TRACK_SCORERS = {g4hunter_score: "g4hunter", imotif_score: "imotif", zseeker_score: "zseeker"}
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# Bump when a change alters which motifs are found or how they are scored, so
+# cached results (see cache.py) are recomputed
+MOTIF_SET_VERSION = 1
+
+compile_pattern = lru_cache(maxsize=None)(re.compile)
+
+@lru_cache(maxsize=None)
+def _load_run_kernel():
+    if importlib.util.find_spec("numba") is None:
+        return None
+    try:
+        from kernels import run_motif_spans
+    except ImportError:
+        return None
+    return run_motif_spans
+
+def run_kernel():
+    """kernels.run_motif_spans, or None to use the regex engine (numba missing or USE_KERNELS off).
+
+    kernels.py, and numba with it, is only imported on the first call.
+    """
+    return _load_run_kernel() if USE_KERNELS else None
+
+# Base complements as a str translation table and as a uint8 lookup, matching
+# utils.reverse_complement (bases other than A, T, G, C are kept)
+COMPLEMENT = str.maketrans("ATGC", "TACG")
+COMPLEMENT_CODES = np.arange(256, dtype=np.uint8)
+COMPLEMENT_CODES[np.frombuffer(b"ATGC", dtype=np.uint8)] = np.frombuffer(b"TACG", dtype=np.uint8)
+
+def non_overlapping_finditer(pattern, seq, group=1):
+    """Find non-overlapping matches, advancing past the captured motif span.
+
+    Motif patterns are zero-width lookaheads, so the match itself never
+    consumes input; the scan resumes at the end of the captured group instead,
+    which guarantees a single forward pass over the sequence.
+    """
+    regex = compile_pattern(pattern)
+    if regex.groups < group:
+        group = 0
     pos = 0
-    while pos < len(seq):
+    n = len(seq)
+    while pos < n:
         match = regex.search(seq, pos)
         if not match:
             break
         yield match
-        pos = match.end()  # Move past the entire match for non-overlapping
+        pos = max(match.end(group), match.start() + 1)
+
+class MotifScan:
+    """Shared scan state for one sequence.
+
+    Encodes the sequence once, tokenizes base runs on demand and memoizes the
+    non-overlapping spans of every pattern, so finders that use the same
+    pattern (or the same runs) share a single pass. Every finder accepts either
+    a plain string, a utils.RecordView or a MotifScan. Record views are scanned
+    in place through their buffer, without copying the record. `spans` seeds
+    already known group-1 spans by pattern (see parallel.py).
+    """
+
+    def __init__(self, seq, spans=None):
+        self.seq = seq
+        if isinstance(seq, RecordView):
+            self.buffer, self.base = seq.buffer, seq.offset
+        else:
+            self.buffer, self.base = seq, 0
+        self._codes = None
+        self._runs = {}
+        self._clusters = {}
+        self._stretches = {}
+        self._spans = {(pattern, 1): found for pattern, found in (spans or {}).items()}
+        # A profiling.ScanReport while all_motifs_table runs with one
+        self.report = None
+
+    @property
+    def codes(self):
+        if self._codes is None:
+            self._codes = self.seq.array() if isinstance(self.seq, RecordView) else encode(self.seq)
+        return self._codes
+
+    def regex(self, pattern):
+        """Compiled pattern matching this scan's buffer type (str or bytes-like)"""
+        return compile_pattern(pattern if isinstance(self.buffer, str) else pattern.encode())
+
+    def window_buffers(self, windows):
+        """(buffer, bases) to regex-search sorted (start, end) windows in: base i of window w is buffer[bases[w] + i]"""
+        return self.buffer, [self.base] * len(windows)
+
+    def runs(self, base, min_run=1):
+        """Return (starts, ends) arrays of maximal runs of `base` at least min_run long"""
+        key = (base, min_run)
+        if key not in self._runs:
+            if min_run > 1:
+                starts, ends = self.runs(base)
+                keep = ends - starts >= min_run
+                self._runs[key] = (starts[keep], ends[keep])
+            else:
+                hit = np.concatenate(([False], self.codes == ord(base), [False]))
+                edges = np.flatnonzero(hit[1:] != hit[:-1])
+                self._runs[key] = (edges[0::2], edges[1::2])
+        return self._runs[key]
+
+    def clusters(self, bases, min_run, max_gap):
+        """Return (starts, ends, units) arrays of run clusters, see PREFILTERS"""
+        key = (bases, min_run, max_gap)
+        if key not in self._clusters:
+            self._clusters[key] = self._find_clusters(bases, min_run, max_gap)
+        return self._clusters[key]
+
+    def _find_clusters(self, bases, min_run, max_gap):
+        parts = [self.runs(base, min_run) for base in bases]
+        starts = np.concatenate([s for s, _ in parts])
+        ends = np.concatenate([e for _, e in parts])
+        if not len(starts):
+            return starts, ends, starts
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+        first = np.flatnonzero(np.concatenate(([True], starts[1:] - ends[:-1] > max_gap)))
+        last = np.concatenate((first[1:], [len(starts)])) - 1
+        units = np.add.reduceat((ends - starts) // min_run, first)
+        return starts[first], ends[last], units
+
+    def pair_windows(self, first, min_first, second, min_second, max_gap):
+        """Return (starts, ends) arrays of windows from first runs to the second runs they reach, see RUN_PAIRS"""
+        first_starts, first_ends = self.runs(first, min_first)
+        second_starts, second_ends = self.runs(second, min_second)
+        # The last second run starting within max_gap of each first run; runs of
+        # two bases never overlap, so one starting before the first run's end lies before it
+        last = np.searchsorted(second_starts, first_ends + max_gap, "right") - 1
+        keep = last >= 0
+        keep[keep] = second_starts[last[keep]] >= first_ends[keep]
+        starts, ends = first_starts[keep], second_ends[last[keep]]
+        if not len(starts):
+            return starts, ends
+        first = np.flatnonzero(np.concatenate(([True], starts[1:] >= ends[:-1])))
+        return starts[first], ends[np.concatenate((first[1:], [len(starts)])) - 1]
+
+    def stretches(self, period, min_length):
+        """Return (starts, ends) arrays of maximal stretches of period `period`, see repeats.py"""
+        key = (period, min_length)
+        if key not in self._stretches:
+            self._stretches[key] = periodic_stretches(self.codes, period, min_length)
+        return self._stretches[key]
+
+    def repeat_spans(self, repeat, pos=0):
+        """Return the non-overlapping spans from pos of a (unit, min_units, max_units) repeat"""
+        unit, min_units, max_units = repeat
+        if min_units == 1:
+            return literal_spans(self.codes, unit, max_units, pos)
+        stretches = self.stretches(len(unit), len(unit) * min_units)
+        return tandem_spans(self.codes, stretches, unit, min_units, max_units, pos)
+
+    def run_motif_spans(self, motif, starts, ends, pos=0):
+        """Return the non-overlapping spans from pos of a RUN_MOTIFS motif inside run clusters (starts, ends)"""
+        return run_kernel()(self.codes, starts, ends, motif, pos)
+
+    def windows(self, bases, min_run, max_gap, min_units):
+        """Return (start, end) clusters of runs that can contain a match"""
+        starts, ends, units = self.clusters(bases, min_run, max_gap)
+        keep = units >= min_units
+        return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+    def spans(self, pattern, group=1):
+        """Return the 0-based (start, end) spans of non-overlapping matches of pattern"""
+        key = (pattern, group)
+        if key not in self._spans:
+            regex = self.regex(pattern)
+            if regex.groups < group:
+                group = 0
+            prefilter = PREFILTERS.get(pattern)
+            t0 = time.perf_counter() if self.report is not None else 0.0
+            windows = self.windows(*prefilter) if isinstance(prefilter, tuple) else [(0, len(self.seq))]
+            if pattern in RUN_PAIRS:
+                windows = _pair_windows(self, pattern, windows)
+            if pattern in REPEATS and group == 1:
+                spans = self.repeat_spans(REPEATS[pattern])
+            elif pattern in RUN_MOTIFS and group == 1 and run_kernel():
+                starts, ends, units = self.clusters(*prefilter[:3])
+                keep = units >= prefilter[3]
+                spans = self.run_motif_spans(RUN_MOTIFS[pattern], starts[keep], ends[keep])
+            elif prefilter and not isinstance(prefilter, tuple):
+                spans = _scan_anchored(regex, self, prefilter, group)
+            else:
+                spans = _scan_windows(regex, self, windows, group)
+            if self.report is not None:
+                self.report.scanned(pattern, sum(end - start for start, end in windows), time.perf_counter() - t0)
+            self._spans[key] = spans
+        return self._spans[key]
+
+    @property
+    def source(self):
+        """Sliceable sequence that hit tables read their hit text from"""
+        return self.seq
+
+    def text(self, start, end):
+        """Return the sequence of a span"""
+        return self.seq[start:end]
+
+    def scores(self, score_func, spans):
+        """Score each span, through the vectorized ScoreTrack when score_func has one"""
+        method = TRACK_SCORERS.get(score_func)
+        if method is None or not spans:
+            return np.array([score_func(self.text(start, end)) for start, end in spans], dtype=np.float64)
+        starts, ends = np.array(spans, dtype=np.int64).T
+        return score_intervals(self.codes, starts, ends, method)
+
+class _MinusStrand:
+    """Sliceable reverse complement of a sequence, read from the forward one on demand"""
+
+    def __init__(self, seq):
+        self.seq = seq
+
+    def __len__(self):
+        return len(self.seq)
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(len(self.seq))
+        n = len(self.seq)
+        return reverse_complement(self.seq[n - max(start, stop):n - start])
+
+class ReverseScan(MotifScan):
+    """MotifScan of the reverse-complement strand of a forward MotifScan, without a copy of that strand.
+
+    Base i of the minus strand is the complement of base n-1-i, so the minus
+    strand is the forward codes read backwards (a NumPy view) with every base
+    complemented, and each engine searches those for the complement of what it
+    wants. Base runs, run clusters and periodic stretches are mirrored from the
+    forward scan, tandem repeats and the run kernels search the reversed codes
+    for the complemented unit or base, and literals are the mirrored forward
+    occurrences of their reverse complement. The regex engine only gets the
+    reverse complement of the candidate windows it searches, gathered in one
+    pass (a pattern searched anchored by the regex engine, which no built-in
+    motif is, needs the rest of the strand). Spans are in minus-strand
+    coordinates (see HitTable.mirrored); `spans` seeds known minus-strand
+    spans by pattern, as for MotifScan.
+    """
+
+    def __init__(self, forward, spans=None):
+        if isinstance(forward, StreamScan):
+            raise ValueError("scanning both strands needs the whole sequence, not a stream")
+        super().__init__(_MinusStrand(forward.seq), spans)
+        self.forward = forward
+        self.buffer = None
+
+    @property
+    def reversed_codes(self):
+        """The forward codes read backwards: position i holds the complement of minus-strand base i"""
+        return self.forward.codes[::-1]
+
+    def regex(self, pattern):
+        return compile_pattern(pattern.encode())
+
+    def window_buffers(self, windows):
+        # The reverse complement of the windows only, packed back to back in one gather
+        starts, ends = np.array(windows, dtype=np.int64).reshape(-1, 2).T
+        lengths = ends - starts
+        offsets = np.cumsum(lengths) - lengths
+        index = np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+        buffer = COMPLEMENT_CODES[self.forward.codes[len(self.seq) - 1 - index]].tobytes()
+        return buffer, (offsets - starts).tolist()
+
+    def runs(self, base, min_run=1):
+        starts, ends = self.forward.runs(base.translate(COMPLEMENT), min_run)
+        n = len(self.seq)
+        return n - ends[::-1], n - starts[::-1]
+
+    def stretches(self, period, min_length):
+        starts, ends = self.forward.stretches(period, min_length)
+        n = len(self.seq)
+        return n - ends[::-1], n - starts[::-1]
+
+    def _find_clusters(self, bases, min_run, max_gap):
+        starts, ends, units = self.forward.clusters(bases.translate(COMPLEMENT), min_run, max_gap)
+        n = len(self.seq)
+        return n - ends[::-1], n - starts[::-1], units[::-1]
+
+    def repeat_spans(self, repeat, pos=0):
+        unit, min_units, max_units = repeat
+        if min_units == 1:
+            found = literal_starts(self.forward.codes, reverse_complement(unit))
+            return literal_runs(len(self.seq) - len(unit) - found[::-1], len(unit), max_units, pos)
+        stretches = self.stretches(len(unit), len(unit) * min_units)
+        return tandem_spans(self.reversed_codes, stretches, unit.translate(COMPLEMENT), min_units, max_units, pos)
+
+    def run_motif_spans(self, motif, starts, ends, pos=0):
+        base, *shape = motif
+        return run_kernel()(self.reversed_codes, starts, ends, (base.translate(COMPLEMENT), *shape), pos)
+
+    def scores(self, score_func, spans):
+        method = TRACK_SCORERS.get(score_func)
+        texts = [self.text(start, end) for start, end in spans]
+        if method is None or not texts:
+            return np.array([score_func(text) for text in texts], dtype=np.float64)
+        return score_texts(texts, method)
+
+class StreamScan(MotifScan):
+    """MotifScan over a sequence that arrives as a stream of pieces.
+
+    The pieces are consumed in chunks of about `chunk_size` bases. Each chunk
+    is scanned together with the unresolved tail of the previous one, and
+    every prefiltered pattern keeps its own resume position. A hit is only
+    accepted once its candidate cluster (or anchored repeat) is provably
+    complete inside the buffer; otherwise the pattern stalls there until more
+    sequence arrives. Results are therefore identical to scanning the joined
+    sequence, no hit is reported twice, and memory stays bounded by the chunk
+    size plus the longest unresolved cluster. Only the hit sequences are kept.
+    A profiling.ScanReport `report` records the time spent on each pattern,
+    charged to the first finder that reads the pattern's spans.
+
+    `on_chunk(settled)` is called after every chunk with the number of bases
+    whose hits are final for all patterns. If it returns False the scan stops
+    there: `cancelled` is set and only hits starting before `settled` are kept,
+    exactly the hits a full scan finds in that stretch.
+    """
+
+    def __init__(self, pieces, chunk_size=DEFAULT_CHUNK_SIZE, patterns=None, report=None, on_chunk=None):
+        super().__init__("")
+        self.chunk_size = chunk_size
+        self.length = 0
+        self.settled = 0
+        self.cancelled = False
+        self._texts = {}
+        # Per pattern [bases, seconds] streamed, until a finder reads the spans
+        self._costs = {}
+        self._stream(iter(pieces), list(patterns or PREFILTERS), report, on_chunk)
+
+    def _stream(self, pieces, patterns, report=None, on_chunk=None):
+        buf, offset = "", 0
+        resume = dict.fromkeys(patterns, 0)
+        for pattern in patterns:
+            self._spans[(pattern, 1)] = []
+        final = False
+        while not final:
+            parts, size = [buf], 0
+            for piece in pieces:
+                parts.append(piece)
+                size += len(piece)
+                if size >= self.chunk_size:
+                    break
+            else:
+                final = True
+            buf = "".join(parts)
+            self.length = offset + len(buf)
+            chunk = MotifScan(buf)
+            for pattern in patterns:
+                t0 = time.perf_counter() if report is not None else 0.0
+                spans, pos = settled_spans(chunk, pattern, resume[pattern] - offset, final)
+                if report is not None:
+                    nbytes, seconds = offset + len(buf) - resume[pattern], time.perf_counter() - t0
+                    report.scanned(pattern, nbytes, seconds)
+                    cost = self._costs.setdefault(pattern, [0, 0.0])
+                    cost[0] += nbytes
+                    cost[1] += seconds
+                resume[pattern] = offset + pos
+                found = self._spans[(pattern, 1)]
+                for start, end in spans:
+                    span = (offset + start, offset + end)
+                    found.append(span)
+                    self._texts[span] = buf[start:end]
+            trim = min(resume.values(), default=self.length) - offset
+            buf, offset = buf[trim:], offset + trim
+            self.settled = self.length if final else offset
+            if on_chunk is not None and on_chunk(self.settled) is False and not final:
+                self.cancelled = True
+                for pattern in patterns:
+                    self._spans[(pattern, 1)] = [span for span in self._spans[(pattern, 1)] if span[0] < offset]
+                self._texts = {span: text for span, text in self._texts.items() if span[0] < offset}
+                break
+
+    def spans(self, pattern, group=1):
+        if (pattern, group) not in self._spans:
+            raise KeyError(f"pattern was not part of the streamed scan: {pattern}")
+        cost = self._costs.pop(pattern, None)
+        if cost is not None and self.report is not None:
+            self.report.streamed(*cost)
+        return self._spans[(pattern, group)]
+
+    @property
+    def source(self):
+        return HitTexts(self._texts)
+
+    def text(self, start, end):
+        return self._texts[(start, end)]
 
-def create_motif_dict(cls, subtype, match, seq, score_method="None", score="0", group=0):
-    """Helper to create standardized motif dictionary"""
-    sequence = match.group(group)
+    def scores(self, score_func, spans):
+        method = TRACK_SCORERS.get(score_func)
+        texts = [self._texts[span] for span in spans]
+        if method is None or not texts:
+            return np.array([score_func(text) for text in texts], dtype=np.float64)
+        return score_texts(texts, method)
+
+def settled_spans(scan, pattern, pos, final):
+    """Spans of pattern from pos that are settled within scan's buffer.
+
+    Returns the settled spans and the position the next chunk must resume from.
+    The buffer may start inside a cluster (a chunk of a longer sequence): the
+    leading cluster is then searched even if its clipped runs fall short of
+    min_units, which matches what a scan of the whole sequence finds from pos.
+    """
+    regex = scan.regex(pattern)
+    prefilter = PREFILTERS[pattern]
+    n = len(scan.seq)
+    if isinstance(prefilter, tuple):
+        bases, min_run, max_gap, min_units = prefilter
+        starts, ends, units = scan.clusters(bases, min_run, max_gap)
+        # A cluster is complete once no run long enough to extend it can start
+        # within max_gap of its end inside the unseen part of the sequence
+        frontier = n if final else n - max_gap - min_run
+        open_clusters = np.flatnonzero(ends > frontier)
+        if len(open_clusters):
+            frontier = min(frontier, int(starts[open_clusters[0]]))
+        keep = ((units >= min_units) | (starts < max_gap + min_run)) & (starts < frontier)
+        if pattern in RUN_MOTIFS and run_kernel():
+            spans = scan.run_motif_spans(RUN_MOTIFS[pattern], starts[keep], ends[keep], pos)
+        else:
+            windows = list(zip(starts[keep].tolist(), ends[keep].tolist()))
+            if pattern in RUN_PAIRS:
+                windows = _pair_windows(scan, pattern, windows)
+            spans = _scan_windows(regex, scan, windows, 1, pos)
+    else:
+        if pattern in REPEATS:
+            spans = scan.repeat_spans(REPEATS[pattern], pos)
+        else:
+            spans = _scan_anchored(regex, scan, prefilter, 1, pos)
+        frontier = n if final else n - len(prefilter) + 1
+        for i, (start, end) in enumerate(spans):
+            if end + len(prefilter) > n and not final:
+                frontier, spans = start, spans[:i]
+                break
+    return spans, max(pos, spans[-1][1] if spans else pos, frontier)
+
+def _pair_windows(scan, pattern, windows):
+    """The RUN_PAIRS windows of pattern that lie in the sorted cluster windows"""
+    starts, ends = scan.pair_windows(*RUN_PAIRS[pattern])
+    cluster_starts = np.array([start for start, _ in windows], dtype=np.int64)
+    cluster_ends = np.array([end for _, end in windows], dtype=np.int64)
+    cluster = np.searchsorted(cluster_starts, starts, "right") - 1
+    inside = cluster >= 0
+    inside[inside] = starts[inside] < cluster_ends[cluster[inside]]
+    return list(zip(starts[inside].tolist(), ends[inside].tolist()))
+
+def _scan_windows(regex, scan, windows, group, pos=0):
+    """Non-overlapping scan restricted to sorted candidate windows"""
+    spans = []
+    windows = [(start, end) for start, end in windows if end > pos]
+    buffer, bases = scan.window_buffers(windows)
+    for (window_start, window_end), base in zip(windows, bases):
+        if pos < window_start:
+            pos = window_start
+        while pos < window_end:
+            match = regex.search(buffer, base + pos, base + window_end)
+            if not match:
+                break
+            start, end = match.span(group)
+            spans.append((start - base, end - base))
+            restart = match.start() + 1
+            pos = (end if end > restart else restart) - base
+    return spans
+
+def _scan_anchored(regex, scan, anchor, group, pos=0):
+    """Non-overlapping scan that only tries positions where `anchor` occurs"""
+    buffer, (base,) = scan.window_buffers([(pos, len(scan.seq))])
+    limit = base + len(scan.seq)
+    if not isinstance(buffer, str):
+        anchor = anchor.encode()
+    spans = []
+    find, match_at = buffer.find, regex.match
+    pos = find(anchor, base + pos, limit)
+    while pos >= 0:
+        match = match_at(buffer, pos, limit)
+        if match:
+            start, end = match.span(group)
+            spans.append((start - base, end - base))
+            pos = max(end, pos + 1)
+        else:
+            pos += 1
+        pos = find(anchor, pos, limit)
+    return spans
+
+def as_scan(seq):
+    """Wrap a sequence in a MotifScan unless it already is one"""
+    return seq if isinstance(seq, MotifScan) else MotifScan(seq)
+
+def create_motif_dict(cls, subtype, span, sequence, score_method="None", score="0"):
+    """Helper to create standardized motif dictionary for `sequence` found at span"""
+    start = span[0]
     return {
-        "Class": cls, "Subtype": subtype, "Start": match.start() + 1,
-        "End": match.start() + len(sequence), "Length": len(sequence),
+        "Class": cls, "Subtype": subtype, "Start": start + 1,
+        "End": start + len(sequence), "Length": len(sequence),
         "Sequence": wrap(sequence), "ScoreMethod": score_method, "Score": score
     }
 
-def find_motif(seq, pattern, cls, subtype, score_method="None", score_func=None, group=0):
-    """Generic motif finder with non-overlapping logic"""
-    results = []
-    for m in non_overlapping_finditer(pattern, seq):
-        if score_func:
-            score = f"{score_func(m.group(group)):.2f}"
-        else:
-            score = "0"
-        results.append(create_motif_dict(cls, subtype, m, seq, score_method, score, group))
-    return results
+def find_motif(seq, pattern, cls, subtype, score_method="None", score_func=None, group=1, table=False):
+    """Generic motif finder with non-overlapping logic.
+
+    Returns a list of motif dicts, or a hits.HitTable with table=True.
+    """
+    scan = as_scan(seq)
+    spans = scan.spans(pattern, group)
+    scores = None
+    if score_func and scan.report is not None:
+        t0 = time.perf_counter()
+        scores = scan.scores(score_func, spans)
+        scan.report.scored(time.perf_counter() - t0)
+    elif score_func:
+        scores = scan.scores(score_func, spans)
+    hits = HitTable.from_spans(scan.source, spans, cls, subtype, score_method, scores)
+    return hits if table else hits.records()
+
+class Motif:
+    """A registered motif: the non-overlapping hits of `pattern`, reported as cls / subtype.
+
+    Hits are scored with score_func (reported as score_method). A hybrid
+    names in `overlaps` the pattern whose hits its own must overlap.
+    `family` groups motifs for select_motifs (the class by default), and
+    `max_span` is the longest hit in bases (None when the pattern has
+    unbounded runs or repeats). How the pattern is scanned (see `engine`)
+    follows from the REPEATS and RUN_MOTIFS tables. A Motif is called like
+    the find_* functions.
+    """
+
+    def __init__(self, name, cls, subtype, pattern, score_method="None", score_func=None, family=None,
+                 max_span=None, overlaps=None):
+        self.name = name
+        self.cls = cls
+        self.subtype = subtype
+        self.pattern = pattern
+        self.score_method = score_method
+        self.score_func = score_func
+        self.family = family or cls
+        self.max_span = max_span
+        self.overlaps = overlaps
+
+    def __call__(self, seq, table=False):
+        if self.overlaps:
+            return find_overlap_hybrid(seq, self.overlaps, self.pattern, self.cls, self.subtype, table=table)
+        return find_motif(seq, self.pattern, self.cls, self.subtype, self.score_method, self.score_func,
+                          table=table)
+
+    def __repr__(self):
+        return f"Motif({self.name!r}, {self.cls!r}, {self.subtype!r})"
+
+    @property
+    def patterns(self):
+        """Patterns whose spans the motif is found from"""
+        return (self.overlaps, self.pattern) if self.overlaps else (self.pattern,)
+
+    @property
+    def engine(self):
+        """How the pattern is scanned: "repeat", "kernel" (the regex without numba) or "regex" """
+        return "repeat" if self.pattern in REPEATS else "kernel" if self.pattern in RUN_MOTIFS else "regex"
+
+    @property
+    def regex(self):
+        """The compiled pattern, compiled once per process"""
+        return compile_pattern(self.pattern)
+
+    def definition(self):
+        """What the motif reports, as JSON-able values (see cache.motif_set_version)"""
+        return [self.name, self.cls, self.subtype, self.pattern, self.score_method,
+                getattr(self.score_func, "__name__", None), self.overlaps]
+
+# Registered motifs by name, in output order
+MOTIF_REGISTRY = {}
+
+def register_motif(motif, prefilter=None, repeat=None, run=None):
+    """Add a Motif to the registry, after the motifs already there.
+
+    A new pattern declares how it is scanned: as a REPEATS (unit, min_units,
+    max_units) repeat, a RUN_MOTIFS run motif or a regex with a PREFILTERS
+    entry. Every pattern needs a prefilter, which streamed and parallel
+    scans rely on; repeats and run motifs get theirs from their definition.
+    """
+    if motif.name in MOTIF_REGISTRY:
+        raise ValueError(f"motif {motif.name!r} is already registered")
+    if repeat is not None:
+        REPEATS[motif.pattern] = repeat
+        PREFILTERS[motif.pattern] = _repeat_prefilter(repeat)
+    elif run is not None:
+        RUN_MOTIFS[motif.pattern] = run
+        PREFILTERS[motif.pattern] = _run_prefilter(run)
+    elif prefilter is not None:
+        PREFILTERS[motif.pattern] = prefilter
+    missing = [pattern for pattern in motif.patterns if pattern not in PREFILTERS]
+    if missing:
+        raise ValueError(f"pattern {missing[0]} of motif {motif.name!r} has no prefilter")
+    MOTIF_REGISTRY[motif.name] = motif
+    return motif
+
+def select_motifs(*keys):
+    """Registered motifs matching any key (a motif name, family or class), in output order; all without keys"""
+    motifs = list(MOTIF_REGISTRY.values())
+    if not keys:
+        return motifs
+    known = {value for motif in motifs for value in (motif.name, motif.family, motif.cls)}
+    unknown = [key for key in keys if key not in known]
+    if unknown:
+        raise ValueError(f"unknown motif {unknown[0]!r}; choose from {', '.join(sorted(known))}")
+    return [motif for motif in motifs if {motif.name, motif.family, motif.cls} & set(keys)]
+
+def resolve_motifs(motifs=None):
+    """A list of Motifs from None (every registered motif), Motifs, or keys for select_motifs"""
+    if motifs is None:
+        return list(MOTIF_REGISTRY.values())
+    motifs = list(motifs)
+    keys = [motif for motif in motifs if isinstance(motif, str)]
+    if not keys:
+        return motifs
+    if len(keys) < len(motifs):
+        raise ValueError("give either Motifs or motif keys, not both")
+    return select_motifs(*keys)
+
+def motif_patterns(motifs=None):
+    """Patterns a scan must search to find `motifs` (see resolve_motifs)"""
+    return list(dict.fromkeys(pattern for motif in resolve_motifs(motifs) for pattern in motif.patterns))
+
+def motif_max_span(motifs=None):
+    """Longest hit any of `motifs` can report, or None when one of them is unbounded"""
+    spans = [motif.max_span for motif in resolve_motifs(motifs)]
+    return None if None in spans else max(spans, default=0)
+
+# The registry, in output order. poly_g and local_bent report the Poly-G and
+# Poly-A/T hits of the simple motifs a second time, as all_motifs always has.
+for _motif in [
+    Motif("canonical_g4", "Quadruplex", "Canonical_G-Quadruplex", G4_PATTERN, "G4Hunter", g4hunter_score,
+          family="G4"),
+    Motif("relaxed_g4", "Quadruplex", "Relaxed_G-Quadruplex", RELAXED_G4_PATTERN, "G4Hunter", g4hunter_score,
+          family="G4"),
+    Motif("bulged_g4", "Quadruplex", "Bulged_G-Quadruplex", BULGED_G4_PATTERN, "G4Hunter (bulge)", g4hunter_score,
+          family="G4"),
+    Motif("imotif", "Quadruplex", "i-Motif", IMOTIF_PATTERN, "G4Hunter", imotif_score, family="i-Motif"),
+    Motif("gtriplex", "Triplex", "G-Triplex", GTRIPLEX_PATTERN, "G4Hunter", g4hunter_score),
+    Motif("bipartite_g4", "Quadruplex", "Bipartite_G-Quadruplex", BIPARTITE_G4_PATTERN, "G4Hunter", g4hunter_score,
+          family="G4"),
+    Motif("multimeric_g4", "Quadruplex", "Multimeric_G-Quadruplex", MULTIMERIC_G4_PATTERN, "G4Hunter",
+          g4hunter_score, family="G4"),
+    Motif("zdna", "Z-DNA", "CG_Repeat", ZDNA_PATTERN, "ZSeeker", zseeker_score),
+    Motif("hdna", "H-DNA", "T-A", HDNA_PATTERN),
+    Motif("sticky", "Sticky_DNA", "CTG", STICKY_PATTERN, max_span=12),
+    Motif("at_slippage", "Slipped_DNA", "AT_Slippage", AT_SLIPPAGE_PATTERN),
+    Motif("cruciform", "Cruciform", "A-T", CRUCIFORM_PATTERN),
+    Motif("poly_at", "Bent_DNA", "Poly-A/T", POLY_AT_PATTERN, max_span=7),
+    Motif("apr", "A-Phased_Repeat", "APR", APR_PATTERN),
+    Motif("mirror", "Mirror_Repeat", "ATCGCGAT", MIRROR_PATTERN, max_span=8),
+    Motif("direct_repeat", "Direct_Repeat", "Poly-G", POLY_G_PATTERN),
+    Motif("g4_triplex", "Hybrid", "G4-Triplex", GTRIPLEX_PATTERN, overlaps=G4_PATTERN),
+    Motif("cruciform_triplex", "Junction", "Cruciform-Triplex", GTRIPLEX_PATTERN, overlaps=CRUCIFORM_PATTERN),
+    Motif("g4_imotif", "Hybrid", "G4-i-Motif", IMOTIF_PATTERN, overlaps=G4_PATTERN),
+    Motif("poly_g", "Direct_Repeat", "Poly-G", POLY_G_PATTERN),
+    Motif("local_bent", "Bent_DNA", "Poly-A/T", POLY_AT_PATTERN, max_span=7),
+]:
+    register_motif(_motif)
+del _motif
 
 # G-Quadruplex variants
-def find_gquadruplex(seq):
-    return find_motif(seq, r"(?=(G{3,}([ATGC]{1,7}G{3,}){3}))", 
-                     "Quadruplex", "Canonical_G-Quadruplex", "G4Hunter", g4hunter_score)
-
-def find_relaxed_gquadruplex(seq):
-    return find_motif(seq, r"(?=(G{3,}(?:[ATGC]{0,12}G{3,}){3}))", 
-                     "Quadruplex", "Relaxed_G-Quadruplex", "G4Hunter", g4hunter_score)
-
-def find_bulged_gquadruplex(seq):
-    return find_motif(seq, r"(?=(G{3,}[ATGC]{0,3}G{3,}[ATGC]{0,3}G{3,}[ATGC]{0,3}G{3,}))", 
-                     "Quadruplex", "Bulged_G-Quadruplex", "G4Hunter (bulge)", g4hunter_score, 1)
-
-def find_bipartite_gquadruplex(seq):
-    return find_motif(seq, r"(?=(G{3,}(?:[ATGC]{0,30}G{3,}){3}))", 
-                     "Quadruplex", "Bipartite_G-Quadruplex", "G4Hunter", g4hunter_score)
-
-def find_multimeric_gquadruplex(seq):
-    return find_motif(seq, r"(?=((G{3,}(?:[ATGC]{0,12}G{3,}){4,})))", 
-                     "Quadruplex", "Multimeric_G-Quadruplex", "G4Hunter", g4hunter_score, 1)
-
-def find_imotif(seq):
-    return find_motif(seq, r"(?=(C{3,}([ATGC]{1,7}C{3,}){3}))", 
-                     "Quadruplex", "i-Motif", "G4Hunter", 
-                     lambda x: -g4hunter_score(x.replace('C','G')))
-
-def find_gtriplex(seq):
-    return find_motif(seq, r"(?=(G{3,}([ATGC]{1,7}G{3,}){2}))", 
-                     "Triplex", "G-Triplex", "G4Hunter", g4hunter_score)
-
-def find_zdna(seq):
-    return find_motif(seq, r"(?=((?:CG){6,}))", 
-                     "Z-DNA", "CG_Repeat", "ZSeeker", zseeker_score, 1)
-
-# Simple motifs (no scoring)
-SIMPLE_MOTIFS = [
-    (r"(?=(T{3,}[ATGC]{1,7}A{3,}))", "H-DNA", "T-A"),
-    (r"(?=(CTGCTGCTGCTG))", "Sticky_DNA", "CTG"),
-    (r"(?=((?:AT){6,}))", "Slipped_DNA", "AT_Slippage"),
-    (r"(?=(A{4,}TTTT))", "Cruciform", "A-T"),
-    (r"(?=(A{6,7}|T{6,7}))", "Bent_DNA", "Poly-A/T"),
-    (r"(?=(?:AAATT){2,})", "A-Phased_Repeat", "APR"),
-    (r"(?=(ATCGCGAT))", "Mirror_Repeat", "ATCGCGAT"),
-    (r"(?=(G{6,}))", "Direct_Repeat", "Poly-G"),
-]
-
-def find_simple_motifs(seq):
+def find_gquadruplex(seq, table=False):
+    return MOTIF_REGISTRY["canonical_g4"](seq, table)
+
+def find_relaxed_gquadruplex(seq, table=False):
+    return MOTIF_REGISTRY["relaxed_g4"](seq, table)
+
+def find_bulged_gquadruplex(seq, table=False):
+    return MOTIF_REGISTRY["bulged_g4"](seq, table)
+
+def find_bipartite_gquadruplex(seq, table=False):
+    return MOTIF_REGISTRY["bipartite_g4"](seq, table)
+
+def find_multimeric_gquadruplex(seq, table=False):
+    return MOTIF_REGISTRY["multimeric_g4"](seq, table)
+
+def find_imotif(seq, table=False):
+    return MOTIF_REGISTRY["imotif"](seq, table)
+
+def find_gtriplex(seq, table=False):
+    return MOTIF_REGISTRY["gtriplex"](seq, table)
+
+def find_zdna(seq, table=False):
+    return MOTIF_REGISTRY["zdna"](seq, table)
+
+# Simple motifs (no scoring), by registry name
+SIMPLE_MOTIFS = ["hdna", "sticky", "at_slippage", "cruciform", "poly_at", "apr", "mirror", "direct_repeat"]
+
+def find_simple_motifs(seq, table=False):
     """Find all simple motifs that don't require scoring"""
-    results = []
-    for pattern, cls, subtype in SIMPLE_MOTIFS:
-        group = 1 if pattern.count('(') > 1 else 0
-        results.extend(find_motif(seq, pattern, cls, subtype, group=group))
-    return results
-
-def find_local_bent(seq):
-    return find_motif(seq, r"(?=(A{6,7}|T{6,7}))", "Bent_DNA", "Poly-A/T", group=1)
-
-def find_overlap_hybrid(seq, pattern1, pattern2, cls, subtype):
-    """Generic function to find overlapping motifs (non-overlapping within each pattern)"""
-    hits = []
-    hits1 = [(m.start(), m.end()) for m in non_overlapping_finditer(pattern1, seq)]
-    for m in non_overlapping_finditer(pattern2, seq):
-        for start1, end1 in hits1:
-            if m.start() < end1 and m.end() > start1:
-                hits.append(create_motif_dict(cls, subtype, m, seq))
-                break
-    return hits
-
-def find_quadruplex_triplex_hybrid(seq):
-    return find_overlap_hybrid(seq, r"(?=(G{3,}([ATGC]{1,7}G{3,}){3}))", 
-                              r"(?=(G{3,}([ATGC]{1,7}G{3,}){2}))", 
-                              "Hybrid", "G4-Triplex")
-
-def find_cruciform_triplex_junction(seq):
-    return find_overlap_hybrid(seq, r"(?=(A{4,}TTTT))", 
-                              r"(?=(G{3,}([ATGC]{1,7}G{3,}){2}))", 
-                              "Junction", "Cruciform-Triplex")
-
-def find_g4_imotif_hybrid(seq):
-    return find_overlap_hybrid(seq, r"(?=(G{3,}([ATGC]{1,7}G{3,}){3}))", 
-                              r"(?=(C{3,}([ATGC]{1,7}C{3,}){3}))", 
-                              "Hybrid", "G4-i-Motif")
-
-def find_polyG(seq):
-    return find_motif(seq, r"(?=(G{6,}))", "Direct_Repeat", "Poly-G", group=1)
-
-def all_motifs(seq):
-    """Find all motifs in sequence"""
-    motif_funcs = [
-        find_gquadruplex, find_relaxed_gquadruplex, find_bulged_gquadruplex,
-        find_imotif, find_gtriplex, find_bipartite_gquadruplex, find_multimeric_gquadruplex,
-        find_zdna, find_simple_motifs, find_quadruplex_triplex_hybrid, 
-        find_cruciform_triplex_junction, find_g4_imotif_hybrid, find_polyG, find_local_bent
-    ]
-    return [hit for func in motif_funcs for hit in func(seq)]
-
-def find_hotspots(seq, motif_hits, window=100, min_count=3):
-    """Find regions with high motif density"""
-    motif_positions = [(hit["Start"], hit["End"]) for hit in motif_hits]
-    hotspots = {}
-    
-    for i in range(1, len(seq) - window + 2):
-        region_end = i + window - 1
-        count = sum(start <= region_end and end >= i for start, end in motif_positions)
-        if count >= min_count:
-            hotspots[(i, region_end)] = {"RegionStart": i, "RegionEnd": region_end, "MotifCount": count}
-    
-    return list(hotspots.values())
+    scan = as_scan(seq)
+    hits = HitTable.concat((MOTIF_REGISTRY[name](scan, table=True) for name in SIMPLE_MOTIFS), scan.source)
+    return hits if table else hits.records()
+
+def find_local_bent(seq, table=False):
+    return MOTIF_REGISTRY["local_bent"](seq, table)
+
+def overlap_mask(spans, others):
+    """For each (start, end) span, whether it overlaps any of the `others` spans.
+
+    A sorted sweep: the others are ordered by start with a running maximum of
+    their ends, so each span only needs one binary search, O((N + M) log M).
+    """
+    if not len(spans) or not len(others):
+        return np.zeros(len(spans), dtype=bool)
+    starts, ends = np.array(spans, dtype=np.int64).T
+    other_starts, other_ends = np.array(others, dtype=np.int64).T
+    order = np.argsort(other_starts, kind="stable")
+    reach = np.maximum.accumulate(other_ends[order])
+    # Last other span starting before this span ends; any of those reaching
+    # past this span's start overlaps it
+    last = np.searchsorted(other_starts[order], ends, side="left") - 1
+    return (last >= 0) & (reach[np.maximum(last, 0)] > starts)
+
+def find_overlap_hybrid(seq, pattern1, pattern2, cls, subtype, table=False):
+    """Hits of pattern2 that overlap a hit of pattern1, reusing the scan's memoized spans"""
+    scan = as_scan(seq)
+    spans = scan.spans(pattern2)
+    keep = overlap_mask(spans, scan.spans(pattern1))
+    hits = HitTable.from_spans(scan.source, [span for span, hit in zip(spans, keep.tolist()) if hit], cls, subtype)
+    return hits if table else hits.records()
+
+# Hybrid categories by registry name, in output order: hits of a motif's
+# pattern that overlap any hit of its `overlaps` pattern
+HYBRIDS = ["g4_triplex", "cruciform_triplex", "g4_imotif"]
+
+def find_hybrids(seq, hybrids=None, table=False):
+    """Find every configured hybrid category (the HYBRIDS Motifs by default)"""
+    scan = as_scan(seq)
+    hybrids = hybrids or [MOTIF_REGISTRY[name] for name in HYBRIDS]
+    hits = HitTable.concat((hybrid(scan, table=True) for hybrid in hybrids), scan.source)
+    return hits if table else hits.records()
+
+def find_quadruplex_triplex_hybrid(seq, table=False):
+    return MOTIF_REGISTRY["g4_triplex"](seq, table)
+
+def find_cruciform_triplex_junction(seq, table=False):
+    return MOTIF_REGISTRY["cruciform_triplex"](seq, table)
+
+def find_g4_imotif_hybrid(seq, table=False):
+    return MOTIF_REGISTRY["g4_imotif"](seq, table)
+
+def find_polyG(seq, table=False):
+    return MOTIF_REGISTRY["poly_g"](seq, table)
+
+def all_motifs(seq, workers=1, both_strands=False, report=None, motifs=None):
+    """Find all motifs in sequence as a list of motif dicts, see all_motifs_table"""
+    return all_motifs_table(seq, workers, both_strands, report, motifs).records()
+
+def all_motifs_table(seq, workers=1, both_strands=False, report=None, motifs=None):
+    """Find all motifs in sequence as a HitTable, sharing one MotifScan across all finders.
+
+    `motifs` limits the scan to some registered motifs (Motifs or keys for
+    select_motifs, e.g. ["G4"]); only the patterns they need are searched.
+    With workers other than 1 (None for every CPU) the sequence is scanned in
+    chunks by a process pool, see parallel.all_motifs_parallel. With
+    both_strands=True the reverse complement is scanned too (its chunks on
+    the same pool): minus-strand hits follow the forward ones, in forward
+    coordinates, and every hit carries a strand. A profiling.ScanReport
+    `report` records per-motif timings and reports progress.
+    """
+    motifs = resolve_motifs(motifs)
+    if workers != 1 and not isinstance(seq, MotifScan):
+        from parallel import all_motifs_parallel
+        return all_motifs_parallel(seq, workers, report=report, motifs=motifs, both_strands=both_strands)
+    if both_strands:
+        scan = as_scan(seq)
+        forward = all_motifs_table(scan, report=report, motifs=motifs)
+        minus = all_motifs_table(ReverseScan(scan), report=report, motifs=motifs).mirrored(len(scan.seq),
+                                                                                           forward.source)
+        return HitTable.concat([forward.on_strand(1), minus])
+    scan = as_scan(seq)
+    if report is None:
+        return HitTable.concat((motif(scan, table=True) for motif in motifs), scan.source)
+    scan.report = report
+    tables = []
+    try:
+        for done, motif in enumerate(motifs, 1):
+            tables.append(report.run(motif, scan))
+            if report.progress:
+                report.progress(done, len(motifs), motif.name)
+    finally:
+        scan.report = None
+    report.scans += 1
+    report.bases += scan.length if isinstance(scan, StreamScan) else len(scan.seq)
+    return HitTable.concat(tables, scan.source)
+
+def all_motifs_stream(pieces, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Find all motifs in a sequence given as an iterable of pieces, in bounded memory"""
+    return all_motifs(StreamScan(pieces, chunk_size))
+
+def all_motifs_stream_table(pieces, chunk_size=DEFAULT_CHUNK_SIZE):
+    """all_motifs_stream as a HitTable"""
+    return all_motifs_table(StreamScan(pieces, chunk_size))
+
+def scan_fasta(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (name, length, motifs) for each record of a FASTA file or handle.
+
+    Records are scanned separately, so no motif spans a record boundary, and
+    each record is streamed in chunks rather than loaded whole.
+    """
+    for name, pieces in stream_fasta(source):
+        scan = StreamScan(pieces, chunk_size)
+        yield name, scan.length, all_motifs(scan)
+
+def find_hotspots(seq, motif_hits, window=100, min_count=3, merge=False):
+    """Find regions with high motif density.
+
+    Window i covers positions i..i+window-1 (1-based) and counts every motif it
+    touches; `seq` may also be given as the sequence length. Counts come from
+    a difference array over motif start/end events, so the cost is
+    O(len(seq) + len(motif_hits)). With merge=True, overlapping hotspot
+    windows are merged into maximal regions whose MotifCount is the number of
+    distinct motifs touching the region.
+    """
+    if isinstance(motif_hits, HitTable):
+        starts, ends = motif_hits.start, motif_hits.end
+    else:
+        starts = np.fromiter((hit["Start"] for hit in motif_hits), dtype=np.int64, count=len(motif_hits))
+        ends = np.fromiter((hit["End"] for hit in motif_hits), dtype=np.int64, count=len(motif_hits))
+    length = seq if isinstance(seq, int) else len(seq)
+    positions, counts = hot_windows(length, starts, ends, window, min_count)
+    return hotspot_regions(positions, counts, starts, ends, window, merge)
+
+def hot_windows(length, starts, ends, window=100, min_count=3, first=1, last=None):
+    """1-based starts and motif counts of the windows first..last touched by at least min_count motifs"""
+    last = length - window + 1 if last is None else min(last, length - window + 1)
+    first = max(first, 1)
+    if last < first:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # A motif touches windows max(1, start - window + 1) .. min(end, n_windows)
+    lo = np.maximum(starts - window + 1, first)
+    hi = np.minimum(ends, last)
+    valid = lo <= hi
+    size = last - first + 1
+    events = (np.bincount(lo[valid] - first, minlength=size + 1)
+              - np.bincount(hi[valid] - first + 1, minlength=size + 1))
+    counts = np.cumsum(events)[:size]
+    hot = np.flatnonzero(counts >= min_count)
+    return hot + first, counts[hot]
+
+def hotspot_regions(positions, counts, starts, ends, window=100, merge=False):
+    """Hotspot dicts from hot_windows output and the motif start/end arrays"""
+    if not merge:
+        return [{"RegionStart": i, "RegionEnd": i + window - 1, "MotifCount": count}
+                for i, count in zip(positions.tolist(), counts.tolist())]
+
+    if not len(positions):
+        return []
+    breaks = np.flatnonzero(np.diff(positions) >= window) + 1
+    region_starts = positions[np.concatenate(([0], breaks))]
+    region_ends = positions[np.concatenate((breaks - 1, [len(positions) - 1]))] + window - 1
+    motif_counts = (np.searchsorted(np.sort(starts), region_ends, side="right")
+                    - np.searchsorted(np.sort(ends), region_starts, side="left"))
+    return [{"RegionStart": s, "RegionEnd": e, "MotifCount": c}
+            for s, e, c in zip(region_starts.tolist(), region_ends.tolist(), motif_counts.tolist())]
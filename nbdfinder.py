@@ -0,0 +1,307 @@
+"""Headless batch motif finder.
+
+Scans FASTA files (or every FASTA file in a directory) and streams motifs of
+each file to the output directory in any export format (tab-separated by
+default, see export.FORMATS) and hotspot regions to tab-separated files.
+With --index each file also gets an indexed hit store, which later runs can
+query by region instead of scanning:
+
+    python nbdfinder.py genome.fa.gz contigs/ -o results -j 8 --index
+    python nbdfinder.py results/genome.nbdhits --region chr1:1,000,000-1,010,000
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import repeat
+
+from cache import ResultCache, hashed_pieces, new_digest
+from export import FORMATS, DelimitedWriter, open_writer
+from hitstore import HITSTORE_SUFFIX, HitStore, HitStoreWriter, parse_region
+from motifs import DEFAULT_CHUNK_SIZE, StreamScan, all_motifs_table, find_hotspots, motif_patterns, select_motifs
+from profiling import ScanReport
+from tracks import SequenceTracks, hit_tracks, write_bedgraph
+from utils import stream_fasta
+
+FASTA_SUFFIXES = (".fa", ".fasta", ".fna", ".fas", ".txt")
+HOTSPOT_COLUMNS = ["Record", "RegionStart", "RegionEnd", "MotifCount"]
+
+
+def fasta_files(inputs):
+    """Expand files and directories into a sorted list of FASTA paths"""
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if _stem(name) != name and os.path.isfile(os.path.join(path, name))))
+        else:
+            files.append(path)
+    return files
+
+
+def _stem(name):
+    base = name[:-3] if name.endswith(".gz") else name
+    for suffix in FASTA_SUFFIXES:
+        if base.endswith(suffix):
+            return base[:-len(suffix)]
+    return name
+
+
+def output_stems(files):
+    """Output name per input file, numbered when two inputs share a name"""
+    stems, seen = [], {}
+    for path in files:
+        stem = _stem(os.path.basename(path))
+        seen[stem] = seen.get(stem, 0) + 1
+        stems.append(stem if seen[stem] == 1 else f"{stem}.{seen[stem]}")
+    return stems
+
+
+def _fed_pieces(pieces, builder):
+    """Pass sequence pieces through while feeding them to a SequenceTracks builder"""
+    for piece in pieces:
+        builder.feed(piece)
+        yield piece
+
+
+def _record_pieces(path, bin_size):
+    """Sequence pieces of each record of a file when tracks are wanted, else endless empty records"""
+    if not bin_size:
+        return repeat(())
+    return (pieces for _, pieces in stream_fasta(path))
+
+
+def _file_results(path, cache, chunk_size, report=None, bin_size=None, progress=None, motifs=None):
+    """Yield (name, length, HitTable, sequence tracks) per record, from the cache when the file is unchanged.
+
+    With a `bin_size` the GC and G4Hunter tracks of each record are built
+    from the same read of the file (from a plain read when results are
+    cached); otherwise the tracks are None. `progress` is called with the
+    bases of the file scanned so far after every chunk. Only `motifs` (all
+    registered ones by default) are scanned; a cache must be for the same.
+    """
+    records = cache.file_records(path) if cache else None
+    cached = [cache.load_motifs(key) for _, key in records] if records else None
+    done = 0
+    if cached and all(cached):
+        for (name, _), (hits, length), pieces in zip(records, cached, _record_pieces(path, bin_size)):
+            builder = SequenceTracks(bin_size) if bin_size else None
+            for piece in pieces:
+                builder.feed(piece)
+            done += length
+            if progress is not None:
+                progress(done)
+            yield name, length, hits, builder and builder.tracks()
+        return
+    keys = []
+    for name, pieces in stream_fasta(path):
+        digest = new_digest()
+        builder = SequenceTracks(bin_size) if bin_size else None
+        pieces = hashed_pieces(pieces, digest)
+        on_chunk = None if progress is None else lambda settled, done=done: progress(done + settled)
+        scan = StreamScan(_fed_pieces(pieces, builder) if builder else pieces, chunk_size,
+                          motif_patterns(motifs), report=report, on_chunk=on_chunk)
+        hits = all_motifs_table(scan, report=report, motifs=motifs)
+        done += scan.length
+        if cache:
+            keys.append((name, digest.hexdigest()))
+            cache.store_motifs(keys[-1][1], hits, scan.length)
+        yield name, scan.length, hits, builder and builder.tracks()
+    if cache:
+        cache.store_file_records(path, keys)
+
+
+def analyze_file(path, output_dir, stem, chunk_size=DEFAULT_CHUNK_SIZE, hotspots=None, cache_dir=False,
+                 profile=False, fmt="tsv", index=False, bin_size=None, progress=None, motifs=None):
+    """Scan one FASTA file record by record, writing results as they are found.
+
+    `hotspots` is a dict of find_hotspots keyword arguments, or None to skip
+    hotspot detection; motifs are written in export format `fmt`, and also
+    to a hit store with index=True. With a `bin_size`, coverage, density, GC
+    and G4Hunter tracks in bins of that size are written as one bedGraph file
+    per track under <stem>.tracks/. With a
+    `cache_dir` (None for the default), results of files scanned before are
+    read from the ResultCache instead. `progress` is called with the number
+    of bases scanned so far as the scan advances. `motifs` limits the scan to
+    some registered motifs (see motifs.resolve_motifs). Returns a summary dict with
+    counts and elapsed seconds, plus the ScanReport as a dict under "profile"
+    with profile=True.
+    """
+    cache = ResultCache(cache_dir, motifs=motifs) if cache_dir is not False else None
+    report = ScanReport() if profile else None
+    t0 = time.perf_counter()
+    summary = {"path": path, "records": 0, "bases": 0, "motifs": 0, "hotspots": 0}
+    motif_path = os.path.join(output_dir, f"{stem}.motifs{FORMATS[fmt][0]}")
+    with open_writer(motif_path, fmt, record=True) as motif_writer:
+        hotspot_out = None
+        if hotspots is not None:
+            hotspot_out = open(os.path.join(output_dir, f"{stem}.hotspots.tsv"), "w", newline="")
+            hotspot_writer = csv.writer(hotspot_out, delimiter="\t", lineterminator="\n")
+            hotspot_writer.writerow(HOTSPOT_COLUMNS)
+        store_writer = HitStoreWriter(os.path.join(output_dir, f"{stem}{HITSTORE_SUFFIX}")) if index else None
+        track_files, track_dir = {}, os.path.join(output_dir, f"{stem}.tracks")
+        if bin_size:
+            os.makedirs(track_dir, exist_ok=True)
+        try:
+            for name, length, hits, tracks in _file_results(path, cache, chunk_size, report, bin_size, progress,
+                                                             motifs):
+                motif_writer.write(hits, name)
+                if store_writer is not None:
+                    store_writer.write(hits, name, length)
+                if tracks is not None:
+                    tracks.update(hit_tracks(hits, length, bin_size))
+                    for track, values in tracks.items():
+                        first = track not in track_files
+                        if first:
+                            track_files[track] = open(os.path.join(track_dir, f"{track}.bedgraph"), "w")
+                        write_bedgraph(track_files[track], name, values, bin_size,
+                                       f"{stem}.{track}" if first else None, length)
+                if hotspot_out is not None:
+                    regions = find_hotspots(length, hits, **hotspots)
+                    hotspot_writer.writerows([name] + [region[column] for column in HOTSPOT_COLUMNS[1:]]
+                                             for region in regions)
+                    summary["hotspots"] += len(regions)
+                summary["records"] += 1
+                summary["bases"] += length
+                summary["motifs"] += len(hits)
+        finally:
+            if hotspot_out is not None:
+                hotspot_out.close()
+            if store_writer is not None:
+                store_writer.close()
+            for fh in track_files.values():
+                fh.close()
+    summary["seconds"] = time.perf_counter() - t0
+    if report is not None:
+        summary["profile"] = report.as_dict()
+    return summary
+
+
+def _report(summary):
+    seconds = summary["seconds"]
+    print(f"{summary['path']}\t{summary['records']}\t{summary['bases']}\t{summary['motifs']}"
+          f"\t{summary['hotspots']}\t{seconds:.2f}\t{summary['bases'] / max(seconds, 1e-9) / 1e6:.2f}",
+          flush=True)
+
+
+def query_stores(paths, regions, out):
+    """Write the hits of each region (every record when none are given) in hit stores as TSV to `out`.
+
+    Raises ValueError for a region naming no record of the stores, which is
+    also how a region parse_region cannot read (a bare, unknown name) surfaces.
+    """
+    stores = [HitStore(path) for path in paths]
+    texts = list(regions)
+    regions = [parse_region(region) for region in texts] or [(None, 1, None)]
+    known = {name for store in stores for name in store.records}
+    for (record, _, _), text in zip(regions, texts):
+        if record is not None and record not in known:
+            raise ValueError(f"region {text!r}: no record {record!r} in the hit stores"
+                             " (regions look like chr1:1000-2000, 1000-2000 or chr1)")
+    stranded = any(store.stranded(record) for store in stores for record in store.records)
+    t0, found = time.perf_counter(), 0
+    with DelimitedWriter(out, "\t", record=True, strand=stranded) as writer:
+        for store in stores:
+            for record, start, end in regions:
+                for name in store.records if record is None else [record] if record in store.records else []:
+                    hits = store.query(name, start, end)
+                    writer.write(hits, name)
+                    found += len(hits)
+    print(f"{found} motifs in {time.perf_counter() - t0:.3f}s", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="nbdfinder", description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="FASTA files (optionally .gz) or directories of them")
+    parser.add_argument("-o", "--output-dir", default="nbdfinder_results")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of files processed in parallel (0 for one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="bases read per streaming step")
+    parser.add_argument("--format", choices=list(FORMATS), default="tsv", help="motif output format")
+    parser.add_argument("--window", type=int, default=100, help="hotspot window size (bp)")
+    parser.add_argument("--min-count", type=int, default=3, help="minimum motifs per hotspot window")
+    parser.add_argument("--merge-hotspots", action="store_true",
+                        help="merge overlapping hotspot windows into regions")
+    parser.add_argument("--no-hotspots", action="store_true", help="skip hotspot detection")
+    parser.add_argument("--cache-dir", default=None,
+                        help="result cache directory (default NBD_CACHE_DIR or ~/.cache/nbdfinder)")
+    parser.add_argument("--no-cache", action="store_true", help="always rescan, without reading or writing the cache")
+    parser.add_argument("--index", action="store_true",
+                        help=f"also write each file's motifs to an indexed hit store (*{HITSTORE_SUFFIX})")
+    parser.add_argument("--tracks", type=int, metavar="BIN",
+                        help="write coverage, density, GC and G4Hunter bedGraph tracks in bins of BIN bases")
+    parser.add_argument("--region", action="append", default=[],
+                        help="with hit store inputs, print the motifs overlapping this region"
+                             " (chr1:1000-2000, 1000-2000 or chr1; repeatable) instead of scanning")
+    parser.add_argument("--motifs", nargs="+", metavar="KEY",
+                        help="scan only these motifs: registered names, families (G4) or classes"
+                             " (default: all)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write per-finder and per-pattern timings of every scanned file to FILE as JSON")
+    args = parser.parse_args(argv)
+
+    if all(path.endswith(HITSTORE_SUFFIX) for path in args.inputs):
+        try:
+            return query_stores(args.inputs, args.region, sys.stdout.buffer)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    if args.region:
+        parser.error(f"--region queries hit stores (*{HITSTORE_SUFFIX}); scan with --index first")
+    if args.motifs:
+        try:
+            select_motifs(*args.motifs)
+        except ValueError as e:
+            parser.error(str(e))
+    files = fasta_files(args.inputs)
+    if not files:
+        parser.error("no FASTA files found")
+    os.makedirs(args.output_dir, exist_ok=True)
+    hotspots = None if args.no_hotspots else {
+        "window": args.window, "min_count": args.min_count, "merge": args.merge_hotspots}
+    cache_dir = False if args.no_cache else args.cache_dir
+    jobs = [(path, args.output_dir, stem, args.chunk_size, hotspots, cache_dir, args.profile is not None,
+             args.format, args.index, args.tracks, None, args.motifs)
+            for path, stem in zip(files, output_stems(files))]
+
+    print("file\trecords\tbases\tmotifs\thotspots\tseconds\tMb/s", flush=True)
+    t0 = time.perf_counter()
+    summaries, failed = [], 0
+    if args.workers == 1:
+        for job in jobs:
+            try:
+                summaries.append(analyze_file(*job))
+            except (OSError, ValueError) as e:
+                print(f"{job[0]}: {e}", file=sys.stderr)
+                failed += 1
+                continue
+            _report(summaries[-1])
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(args.workers or None) as pool:
+            futures = {pool.submit(analyze_file, *job): job[0] for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    summaries.append(future.result())
+                except (OSError, ValueError) as e:
+                    print(f"{futures[future]}: {e}", file=sys.stderr)
+                    failed += 1
+                    continue
+                _report(summaries[-1])
+
+    seconds = time.perf_counter() - t0
+    if args.profile:
+        profiles = {summary["path"]: summary["profile"] for summary in summaries}
+        with open(args.profile, "w") as fh:
+            json.dump({"files": profiles, "total": ScanReport.merged(profiles.values()).as_dict()}, fh, indent=1)
+    bases = sum(summary["bases"] for summary in summaries)
+    print(f"total\t{sum(s['records'] for s in summaries)}\t{bases}\t{sum(s['motifs'] for s in summaries)}"
+          f"\t{sum(s['hotspots'] for s in summaries)}\t{seconds:.2f}\t{bases / max(seconds, 1e-9) / 1e6:.2f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Process-pool motif scanning across records and chromosome chunks.
+
+Records are cut into chunks of `chunk_size` bases, each extended by `overlap`
+bases, and every chunk is scanned by a worker process. Workers map the
+SequenceStore file themselves, so only (path, offset, bounds) and the found
+spans cross the process boundary, never sequence text.
+
+A chunk starting mid-sequence begins its scan in a different state than the
+whole-sequence scan would be in at that point. The parent therefore merges
+chunks per pattern by following the exact scan position: once that position
+lies between two of a chunk's spans, the chunk's remaining spans are the ones
+a single pass would find; until then the parent rescans forward from the
+position itself. The merged hits are identical to ``motifs.all_motifs``.
+With both strands, the minus strand is chunked and merged the same way in
+its own coordinates, each chunk scanned as a motifs.ReverseScan of the
+forward bases it covers.
+"""
+from bisect import bisect_left
+
+from hits import HitTable
+from motifs import (
+    MotifScan, ReverseScan, all_motifs_table, find_hotspots, motif_max_span, motif_patterns, resolve_motifs,
+    settled_spans,
+)
+from utils import RecordView, SequenceStore, open_shared_store
+
+DEFAULT_PARALLEL_CHUNK_SIZE = 2_000_000
+DEFAULT_OVERLAP = 10_000
+
+_stores = {}
+
+def _open_store(path):
+    """Open a store once per worker process"""
+    if path not in _stores:
+        _stores[path] = SequenceStore(path)
+    return _stores[path]
+
+def _chunks(length, chunk_size, overlap):
+    return [(start, min(length, start + chunk_size + overlap)) for start in range(0, length, chunk_size)]
+
+def chunk_overlap(motifs=None):
+    """Bases each chunk extends into the next: the longest hit of `motifs`, or DEFAULT_OVERLAP if unbounded.
+
+    Merged spans are exact for any overlap; one shorter than the hits only
+    makes the merge rescan more.
+    """
+    span = motif_max_span(motifs)
+    return DEFAULT_OVERLAP if span is None else min(max(span, 1), DEFAULT_OVERLAP)
+
+def _window_scan(view, start, end, strand=1):
+    """Scan of bases start..end-1 of a RecordView or str, in the coordinates of `strand` (+1 or -1)"""
+    if strand < 0:
+        start, end = len(view) - end, len(view) - start
+    scan = MotifScan(view.window(start, end) if isinstance(view, RecordView) else view[start:end])
+    return scan if strand > 0 else ReverseScan(scan)
+
+def _scan_chunk(path, offset, length, start, end, patterns, strand=1):
+    """Settled spans and resume position of each pattern, scanned from `start` on `strand`"""
+    scan = _window_scan(RecordView(_open_store(path).buffer, "", offset, length, path), start, end, strand)
+    results = {}
+    for pattern in patterns:
+        spans, resume = settled_spans(scan, pattern, 0, end == length)
+        results[pattern] = ([(s + start, e + start) for s, e in spans], resume + start)
+    return results
+
+def _rescan(view, pattern, pos, size, strand=1):
+    """Settled spans of pattern from the exact scan position pos, and the next position"""
+    size = max(size, 1024)
+    while True:
+        end = min(len(view), pos + size)
+        spans, resume = settled_spans(_window_scan(view, pos, end, strand), pattern, 0, end == len(view))
+        if resume > 0:
+            return [(s + pos, e + pos) for s, e in spans], resume + pos
+        size *= 2
+
+def merge_spans(view, pattern, chunks, overlap=DEFAULT_OVERLAP, strand=1):
+    """Join the (start, (spans, resume)) results of consecutive chunks into one exact scan.
+
+    `view` is the whole sequence (a RecordView or str), rescanned in steps of
+    at least `overlap` bases wherever no chunk agrees with the exact position.
+    With strand=-1 chunks, spans and positions are on the minus strand.
+    """
+    merged, pos = [], 0
+    for start, (spans, resume) in chunks:
+        starts = [span_start for span_start, _ in spans]
+        while pos < resume:
+            if pos >= start:
+                # The chunk's scan resumed at or before pos and found nothing
+                # until spans[i], so from here on it agrees with the exact scan
+                i = bisect_left(starts, pos)
+                previous = start if i == 0 else max(spans[i - 1][1], spans[i - 1][0] + 1)
+                if previous <= pos:
+                    merged.extend(spans[i:])
+                    pos = resume
+                    break
+            found, pos = _rescan(view, pattern, pos, overlap, strand)
+            merged.extend(found)
+    return merged
+
+def _merged_spans(view, patterns, starts, futures, overlap, strand=1):
+    results = [future.result() for future in futures]
+    return {pattern: merge_spans(view, pattern, [(start, result[pattern]) for start, result in zip(starts, results)],
+                                 overlap, strand)
+            for pattern in patterns}
+
+def scan_views(views, workers=None, chunk_size=DEFAULT_PARALLEL_CHUNK_SIZE, overlap=None,
+               hotspots=None, report=None, motifs=None, both_strands=False):
+    """Yield (name, length, HitTable, hotspot regions) for store-backed RecordViews.
+
+    All chunks of all views are queued on one pool of `workers` processes
+    (None for every CPU) and results are yielded in input order. `hotspots`
+    is a dict of find_hotspots keyword arguments; regions are None without it.
+    `motifs` limits the scan as in all_motifs_table, and chunks overlap by
+    chunk_overlap(motifs) bases unless `overlap` is given. With
+    both_strands=True the minus-strand chunks are queued too, and the hits
+    are those of all_motifs_table(..., both_strands=True).
+    A profiling.ScanReport `report` times the finders run on the merged spans.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    motifs = resolve_motifs(motifs)
+    patterns = motif_patterns(motifs)
+    overlap = chunk_overlap(motifs) if overlap is None else overlap
+    strands = (1, -1) if both_strands else (1,)
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = []
+        for view in views:
+            chunks = _chunks(len(view), chunk_size, overlap)
+            futures = {strand: [pool.submit(_scan_chunk, view.path, view.offset, len(view), start, end, patterns,
+                                            strand) for start, end in chunks]
+                       for strand in strands}
+            jobs.append((view, [start for start, _ in chunks], futures))
+        for view, starts, futures in jobs:
+            spans = _merged_spans(view, patterns, starts, futures[1], overlap)
+            hits = all_motifs_table(MotifScan(view, spans), report=report, motifs=motifs)
+            if both_strands:
+                spans = _merged_spans(view, patterns, starts, futures[-1], overlap, -1)
+                minus = all_motifs_table(ReverseScan(MotifScan(view), spans), report=report, motifs=motifs)
+                hits = HitTable.concat([hits.on_strand(1), minus.mirrored(len(view), hits.source)])
+            # A vectorized sweep over the merged hits: cheaper here than a round trip to a worker
+            regions = None if hotspots is None else find_hotspots(len(view), hits, **hotspots)
+            yield view.name, len(view), hits, regions
+
+def scan_store(store, workers=None, chunk_size=DEFAULT_PARALLEL_CHUNK_SIZE, overlap=None,
+               hotspots=None, report=None, motifs=None, both_strands=False):
+    """scan_views over every record of a SequenceStore"""
+    return scan_views(store, workers, chunk_size, overlap, hotspots, report, motifs, both_strands)
+
+def all_motifs_parallel(seq, workers=None, chunk_size=DEFAULT_PARALLEL_CHUNK_SIZE, overlap=None,
+                        report=None, motifs=None, both_strands=False):
+    """all_motifs_table over a process pool; plain strings are first written to a shared store"""
+    if not (isinstance(seq, RecordView) and seq.path):
+        seq = open_shared_store(f">\n{seq}\n".encode())[0]
+    for _, _, hits, _ in scan_views([seq], workers, chunk_size, overlap, report=report, motifs=motifs,
+                                    both_strands=both_strands):
+        return hits
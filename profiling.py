@@ -0,0 +1,95 @@
+"""Per-finder instrumentation of motif scans.
+
+Pass a ScanReport as `report` to motifs.all_motifs_table (or
+ResultCache.motifs, StreamScan) to record, for every motif scanned (see
+motifs.MOTIF_REGISTRY), its wall time, hit count, the bases its pattern scans
+searched and the time spent scoring hits, and for every pattern its scan
+time. Without a report the scan runs uninstrumented.
+"""
+import json
+import time
+
+
+class ScanReport:
+    """Structured per-finder timings, accumulated over every scan it is passed to.
+
+    `progress` is called as progress(done, total, finder) after each finder.
+    Bases searched by a pattern are counted for the first finder that needs
+    the pattern; later finders reuse the memoized spans and scan nothing.
+    Streamed scans search their patterns before the finders run, so the time
+    and bases of each streamed pattern are charged to the first finder that
+    reads its spans. Process-pool scans are searched in the workers, and their
+    finders report no bases scanned.
+    """
+
+    def __init__(self, progress=None):
+        self.progress = progress
+        self.finders = {}
+        self.patterns = {}
+        self.scans = 0
+        self.bases = 0
+        self._current = None
+
+    def run(self, finder, scan):
+        """Run finder(scan, table=True), recording its stats under its name; returns the HitTable"""
+        name = getattr(finder, "name", None) or finder.__name__
+        stats = self.finders.setdefault(name, {
+            "finder": name, "seconds": 0.0, "hits": 0, "bytes_scanned": 0, "scoring_seconds": 0.0})
+        self._current = stats
+        t0 = time.perf_counter()
+        try:
+            hits = finder(scan, table=True)
+        finally:
+            self._current = None
+        stats["seconds"] += time.perf_counter() - t0
+        stats["hits"] += len(hits)
+        return hits
+
+    def scanned(self, pattern, nbytes, seconds):
+        """Count a pattern scan, and its bases against the running finder"""
+        stats = self.patterns.setdefault(pattern, {"pattern": pattern, "seconds": 0.0, "bytes_scanned": 0})
+        stats["seconds"] += seconds
+        stats["bytes_scanned"] += nbytes
+        if self._current is not None:
+            self._current["bytes_scanned"] += nbytes
+
+    def streamed(self, nbytes, seconds):
+        """Charge a pattern scan made before the finders ran (see motifs.StreamScan) to the running finder"""
+        if self._current is not None:
+            self._current["bytes_scanned"] += nbytes
+            self._current["seconds"] += seconds
+
+    def scored(self, seconds):
+        """Count time the running finder spent scoring its hits"""
+        if self._current is not None:
+            self._current["scoring_seconds"] += seconds
+
+    def as_dict(self):
+        rows = list(self.finders.values())
+        return {
+            "scans": self.scans, "bases": self.bases,
+            "seconds": sum(row["seconds"] for row in rows),
+            "hits": sum(row["hits"] for row in rows),
+            "finders": sorted(rows, key=lambda row: row["seconds"], reverse=True),
+            "patterns": sorted(self.patterns.values(), key=lambda row: row["seconds"], reverse=True),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.as_dict()["finders"])
+
+    @classmethod
+    def merged(cls, reports):
+        """One ScanReport summing the as_dict() output of several reports (e.g. one per file)"""
+        total = cls()
+        for report in reports:
+            total.scans += report["scans"]
+            total.bases += report["bases"]
+            for name, table in (("finder", total.finders), ("pattern", total.patterns)):
+                for row in report[f"{name}s"]:
+                    stats = table.setdefault(row[name], dict.fromkeys(row, 0))
+                    stats.update({key: value if key == name else stats[key] + value for key, value in row.items()})
+        return total
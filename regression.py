@@ -0,0 +1,427 @@
+"""Benchmark and regression suite for the motif finders and scorers.
+
+Every finder in motifs.py, the end-to-end all_motifs, the scorers,
+find_hotspots and the binned tracks are timed on synthetic genomes of fixed size and composition
+(see GENOMES), reporting bases/second and peak traced memory. Results are
+compared against a JSON baseline and any case slower or larger than the
+baseline by more than --threshold is flagged. Golden fixtures pin the exact
+motif and hotspot output of smaller genomes, so speedups can be shown to
+keep results identical. Behavior checks (BEHAVIOR_CHECKS) pin fixed bugs
+alongside the golden fixtures. Startup checks import each core module in a fresh
+interpreter: none may load a plotting, DataFrame, Excel or JIT dependency, and
+the modules a worker process loads must add at most WORKER_IMPORT_SECONDS to
+importing NumPy.
+
+    python regression.py                    # check golden output, time, compare to baseline
+    python regression.py --startup-only     # only check core module import times
+    python regression.py --save-baseline    # record this machine's timings as the baseline
+    python regression.py --update-golden    # rewrite golden fixtures after an intended change
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmark import random_sequence
+from motifs import (
+    G4_PATTERN, IMOTIF_PATTERN, ZDNA_PATTERN, MotifScan, all_motifs, all_motifs_table, find_bipartite_gquadruplex,
+    find_bulged_gquadruplex, find_cruciform_triplex_junction, find_g4_imotif_hybrid, find_gquadruplex,
+    find_gtriplex, find_hotspots, find_imotif, find_local_bent, find_multimeric_gquadruplex, find_polyG,
+    find_quadruplex_triplex_hybrid, find_relaxed_gquadruplex, find_simple_motifs, find_zdna,
+)
+from scoring import score_intervals
+from tracks import hit_tracks, sequence_tracks
+from utils import g4hunter_score, read_fasta
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+GOLDEN_DIR = os.path.join(BENCHMARK_DIR, "golden")
+DEFAULT_SIZE = 1_000_000
+GOLDEN_SIZE = 100_000
+DEFAULT_THRESHOLD = 0.2
+# Differences below this many seconds are timer noise, never regressions
+NOISE_SECONDS = 0.002
+# Modules used without the app, and dependencies they may only import on first use
+CORE_MODULES = ["motifs", "parallel", "jobs", "cache", "export", "hitstore", "tracks", "incremental", "nbdfinder"]
+LAZY_DEPENDENCIES = ["pandas", "matplotlib", "seaborn", "plotly", "streamlit", "openpyxl", "xlsxwriter",
+                     "pyarrow", "numba"]
+# A parallel scan worker imports this module (and motifs through it), which on top
+# of NumPy (the scanning core's one dependency) may take this many seconds
+WORKER_MODULE = "parallel"
+WORKER_IMPORT_SECONDS = 0.03
+# Longest all_motifs may take on a 200 kb homopolymer (see check_homopolymers)
+HOMOPOLYMER_SECONDS = 2.0
+# Import times vary more than scan times between runs
+STARTUP_NOISE_SECONDS = 0.01
+_IMPORT_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import numpy
+t1 = time.perf_counter()
+import {module}
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1, *sorted({{name.split(".")[0] for name in sys.modules}} & {lazy!r}))
+"""
+
+FINDERS = [
+    find_gquadruplex, find_relaxed_gquadruplex, find_bulged_gquadruplex, find_bipartite_gquadruplex,
+    find_multimeric_gquadruplex, find_imotif, find_gtriplex, find_zdna, find_simple_motifs, find_local_bent,
+    find_quadruplex_triplex_hybrid, find_cruciform_triplex_junction, find_g4_imotif_hybrid, find_polyG,
+]
+SCORED_PATTERNS = {"g4hunter": G4_PATTERN, "imotif": IMOTIF_PATTERN, "zseeker": ZDNA_PATTERN}
+
+
+def telomeric_genome(length, seed=0, fraction=0.2):
+    """Random background with (TTAGGG)n and (CCCTAA)n arrays covering about `fraction` of it"""
+    rng = random.Random(seed)
+    pieces, total = [], 0
+    while total < length:
+        background = random_sequence(int(rng.expovariate(fraction / 600)), 0.41, rng.randrange(1 << 30))
+        array = rng.choice(["TTAGGG", "CCCTAA"]) * rng.randint(10, 200)
+        pieces += [background, array]
+        total += len(background) + len(array)
+    return "".join(pieces)[:length]
+
+
+GENOMES = {
+    "random": lambda length, seed: random_sequence(length, 0.41, seed),
+    "gc_rich": lambda length, seed: random_sequence(length, 0.65, seed),
+    "telomeric": telomeric_genome,
+    "at_rich": lambda length, seed: random_sequence(length, 0.3, seed),
+}
+
+
+def benchmark_cases(seq):
+    """(name, callable) pairs timed on one genome; each finder gets the plain string, without a shared scan"""
+    cases = [(finder.__name__, lambda finder=finder: finder(seq, table=True)) for finder in FINDERS]
+    cases.append(("all_motifs", lambda: all_motifs(seq)))
+    cases.append(("all_motifs_table", lambda: all_motifs_table(seq)))
+    scan = MotifScan(seq)
+    for method, pattern in SCORED_PATTERNS.items():
+        starts, ends = zip(*scan.spans(pattern)) if scan.spans(pattern) else ((), ())
+        cases.append((f"score_intervals[{method}]",
+                      lambda starts=starts, ends=ends, method=method: score_intervals(scan.codes, starts, ends, method)))
+    texts = [seq[start:end] for start, end in scan.spans(G4_PATTERN)]
+    cases.append(("g4hunter_score", lambda: [g4hunter_score(text) for text in texts]))
+    hits = all_motifs_table(seq)
+    cases.append(("find_hotspots", lambda: find_hotspots(len(seq), hits)))
+    cases.append(("find_hotspots[merge]", lambda: find_hotspots(len(seq), hits, merge=True)))
+    cases.append(("hit_tracks", lambda: hit_tracks(hits, len(seq))))
+    cases.append(("sequence_tracks", lambda: sequence_tracks(seq)))
+    return cases
+
+
+def measure(func, repeat=3):
+    """(best seconds of `repeat` runs, peak traced bytes of one more run)"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(size=DEFAULT_SIZE, genomes=None, repeat=3, seed=0):
+    """Time every case on every genome; returns {genome: {case: {"seconds", "bases_per_second", "peak_bytes"}}}"""
+    results = {}
+    for genome in genomes or GENOMES:
+        seq = GENOMES[genome](size, seed)
+        results[genome] = {}
+        for name, func in benchmark_cases(seq):
+            seconds, peak = measure(func, repeat)
+            results[genome][name] = {"seconds": seconds, "bases_per_second": size / max(seconds, 1e-9),
+                                     "peak_bytes": peak}
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Regression messages for cases slower or using more memory than the baseline by over `threshold`"""
+    regressions = []
+    for genome, cases in results.items():
+        for name, result in cases.items():
+            base = baseline.get(genome, {}).get(name)
+            if base is None:
+                continue
+            if result["seconds"] - base["seconds"] > max(threshold * base["seconds"], NOISE_SECONDS):
+                regressions.append(f"{genome}/{name}: {result['seconds']:.4f}s vs baseline {base['seconds']:.4f}s")
+            if result["peak_bytes"] > base["peak_bytes"] * (1 + threshold):
+                regressions.append(f"{genome}/{name}: peak {result['peak_bytes'] / 1e6:.2f} MB"
+                                   f" vs baseline {base['peak_bytes'] / 1e6:.2f} MB")
+    return regressions
+
+
+def import_cost(module, repeat=5):
+    """Best seconds to import NumPy and then `module` in a fresh interpreter, and lazy dependencies it loaded"""
+    probe = _IMPORT_PROBE.format(module=module, lazy=set(LAZY_DEPENDENCIES))
+    numpy_seconds, seconds, loaded = float("inf"), float("inf"), set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", probe], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout.split()
+        numpy_seconds, seconds = min(numpy_seconds, float(output[0])), min(seconds, float(output[1]))
+        loaded.update(output[2:])
+    return numpy_seconds, seconds, sorted(loaded)
+
+
+def run_startup(modules=None, repeat=5):
+    """Import every core module on its own; returns {module: {"numpy_seconds", "seconds", "loaded"}}"""
+    results = {}
+    for module in modules or CORE_MODULES:
+        numpy_seconds, seconds, loaded = import_cost(module, repeat)
+        results[module] = {"numpy_seconds": numpy_seconds, "seconds": seconds, "loaded": loaded}
+    return results
+
+
+def check_startup(results, baseline=None, threshold=DEFAULT_THRESHOLD):
+    """Messages for eagerly loaded dependencies, a slow worker import and imports slower than the baseline.
+
+    Times are what each module adds to importing NumPy, so they do not
+    depend on how fast this machine loads NumPy itself.
+    """
+    messages = []
+    for module, result in results.items():
+        if result["loaded"]:
+            messages.append(f"import {module} loads {', '.join(result['loaded'])}")
+        base = (baseline or {}).get(module)
+        if base and result["seconds"] - base["seconds"] > max(threshold * base["seconds"], STARTUP_NOISE_SECONDS):
+            messages.append(f"import {module}: {result['seconds']:.4f}s vs baseline {base['seconds']:.4f}s")
+    worker = results.get(WORKER_MODULE)
+    if worker and worker["seconds"] > WORKER_IMPORT_SECONDS:
+        messages.append(f"import {WORKER_MODULE}: {worker['seconds']:.4f}s after NumPy, over the worker budget"
+                        f" of {WORKER_IMPORT_SECONDS}s")
+    return messages
+
+
+def print_startup(results, baseline=None):
+    print(f"{'module':<12} {'numpy s':>9} {'import s':>9} {'vs base':>8}")
+    for module, result in results.items():
+        base = (baseline or {}).get(module)
+        change = f"{result['seconds'] / base['seconds'] - 1:+8.0%}" if base and base["seconds"] else ""
+        print(f"{module:<12} {result['numpy_seconds']:>9.4f} {result['seconds']:>9.4f} {change:>8}")
+
+
+def golden_output(genome, size=GOLDEN_SIZE, seed=0):
+    """Exact motif and hotspot output of a golden genome, as stored in its fixture"""
+    seq = GENOMES[genome](size, seed)
+    motifs = all_motifs(seq)
+    columns = ["Class", "Subtype", "Start", "End", "ScoreMethod", "Score"]
+    return {
+        "genome": genome, "length": size, "seed": seed,
+        "sha256": hashlib.sha256(json.dumps(motifs, sort_keys=True).encode()).hexdigest(),
+        "motifs": [[motif[column] for column in columns] for motif in motifs],
+        "hotspots": [[region["RegionStart"], region["RegionEnd"], region["MotifCount"]]
+                     for region in find_hotspots(seq, motifs, merge=True)],
+        "hotspot_windows": len(find_hotspots(seq, motifs)),
+    }
+
+
+def check_golden(genomes=None, update=False):
+    """Compare (or with update=True rewrite) golden fixtures; returns mismatch messages"""
+    mismatches = []
+    for genome in genomes or GENOMES:
+        path = os.path.join(GOLDEN_DIR, f"{genome}.json")
+        output = golden_output(genome)
+        if update:
+            os.makedirs(GOLDEN_DIR, exist_ok=True)
+            with open(path, "w") as fh:
+                json.dump(output, fh, separators=(",", ":"))
+                fh.write("\n")
+            continue
+        try:
+            with open(path) as fh:
+                expected = json.load(fh)
+        except FileNotFoundError:
+            mismatches.append(f"{genome}: no golden fixture at {path}")
+            continue
+        for key in ("sha256", "motifs", "hotspots", "hotspot_windows"):
+            if output[key] != expected[key]:
+                mismatches.append(f"{genome}: {key} differs from the golden fixture")
+    return mismatches
+
+
+def check_record_names():
+    """Records are named by the first word of their header, in the scan output and the hit store"""
+    import nbdfinder
+    from hitstore import HitStore
+
+    messages = []
+    fasta = ">chr1 assembled from contigs\nACGT\n>chr2\tsecond record\nGG\n>\nTT\n"
+    names = [name for name, _ in read_fasta(io.StringIO(fasta))]
+    if names != ["chr1", "chr2", ""]:
+        messages.append(f"read_fasta named records {names}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "described.fa")
+        with open(path, "w") as fh:
+            fh.write(f">chr1 Homo sapiens chromosome 1\n{GENOMES['telomeric'](5000, 0)}\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            nbdfinder.main([path, "-o", tmp, "--index", "--no-cache", "--no-hotspots"])
+        store = HitStore(os.path.join(tmp, f"described{nbdfinder.HITSTORE_SUFFIX}"))
+        if list(store.records) != ["chr1"]:
+            messages.append(f"hit store records are {list(store.records)}")
+    return messages
+
+
+def check_region_queries():
+    """Region queries for an unknown record or a malformed region exit with an error"""
+    import nbdfinder
+
+    messages = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "genome.fa")
+        with open(path, "w") as fh:
+            fh.write(f">chr1\n{GENOMES['telomeric'](5000, 0)}\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            nbdfinder.main([path, "-o", tmp, "--index", "--no-cache", "--no-hotspots"])
+        store = os.path.join(tmp, f"genome{nbdfinder.HITSTORE_SUFFIX}")
+        out = io.BytesIO()
+        with contextlib.redirect_stderr(io.StringIO()):
+            nbdfinder.query_stores([store], ["chr1:1-5000", "1-5000"], out)
+        if b"chr1" not in out.getvalue():
+            messages.append("query of chr1:1-5000 found no hits")
+        for region in ("chrX:1-10", "chr1:10-5", "1000\u20132000", "chr1:1,000..2,000"):
+            try:
+                with contextlib.redirect_stderr(io.StringIO()):
+                    code = nbdfinder.main([store, "--region", region])
+            except SystemExit as e:
+                code = e.code
+            if not code:
+                messages.append(f"--region {region!r} exited with status {code}")
+    return messages
+
+
+def check_streamed_report():
+    """A streamed scan charges its pattern scans to the finders, as an in-memory scan does"""
+    from motifs import StreamScan, resolve_motifs
+    from profiling import ScanReport
+
+    messages = []
+    seq = GENOMES["telomeric"](200_000, 0)
+    report = ScanReport()
+    scan = StreamScan((seq[i:i + 10_000] for i in range(0, len(seq), 10_000)), 50_000, report=report)
+    all_motifs_table(scan, report=report)
+    finders = report.as_dict()["finders"]
+    seen = set()
+    for motif in resolve_motifs():
+        stats = report.finders[motif.name]
+        first = motif.pattern not in seen
+        seen.update(motif.patterns)
+        # Later finders of a pattern reuse its spans, as in an in-memory scan
+        if motif.engine == "regex" and first and not (stats["bytes_scanned"] > 0 and stats["seconds"] > 0):
+            messages.append(f"{motif.name}: {stats['bytes_scanned']} bytes scanned in {stats['seconds']:.6f}s")
+    streamed = sum(row["bytes_scanned"] for row in report.patterns.values())
+    charged = sum(row["bytes_scanned"] for row in finders)
+    if charged != streamed:
+        messages.append(f"finders were charged {charged} of {streamed} streamed bytes")
+    return messages
+
+
+def check_homopolymers(size=200_000, budget=HOMOPOLYMER_SECONDS):
+    """all_motifs stays linear on long homopolymers, where backtracking patterns used to go quadratic"""
+    messages = []
+    all_motifs("ACGT" * 100)
+    for seq in ("A" * size, "T" * size, "A" * (size // 2) + "C" + "T" * (size // 2)):
+        t0 = time.perf_counter()
+        all_motifs(seq)
+        seconds = time.perf_counter() - t0
+        if seconds > budget:
+            messages.append(f"{seq[0]}...{seq[-1]} ({len(seq)} bp) took {seconds:.2f}s, over {budget}s")
+    return messages
+
+
+BEHAVIOR_CHECKS = [check_record_names, check_region_queries, check_streamed_report, check_homopolymers]
+
+
+def check_behavior(checks=None):
+    """Run behavior checks; returns failure messages"""
+    return [f"{check.__name__}: {message}" for check in checks or BEHAVIOR_CHECKS for message in check()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="bases per synthetic genome")
+    parser.add_argument("--genomes", nargs="+", choices=list(GENOMES), default=list(GENOMES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (best is kept)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="flag cases slower or larger than the baseline by more than this fraction")
+    parser.add_argument("--update-golden", action="store_true", help="rewrite the golden output fixtures")
+    parser.add_argument("--golden-only", action="store_true", help="only check the golden output fixtures and behavior checks")
+    parser.add_argument("--startup-only", action="store_true", help="only check core module import times")
+    args = parser.parse_args(argv)
+
+    saved = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            saved = json.load(fh)
+    if args.startup_only:
+        startup = run_startup(repeat=max(args.repeat, 5))
+        print_startup(startup, saved.get("startup"))
+        messages = check_startup(startup, saved.get("startup"), args.threshold)
+        for message in messages:
+            print(f"STARTUP {message}")
+        return 1 if messages else 0
+
+    mismatches = check_golden(args.genomes, update=args.update_golden)
+    for message in mismatches:
+        print(f"GOLDEN MISMATCH {message}")
+    if not mismatches:
+        print(f"golden output {'updated' if args.update_golden else 'ok'} for {', '.join(args.genomes)}")
+    failures = check_behavior()
+    for message in failures:
+        print(f"BEHAVIOR {message}")
+    if not failures:
+        print(f"behavior checks ok ({len(BEHAVIOR_CHECKS)})")
+    mismatches += failures
+    if args.golden_only:
+        return 1 if mismatches else 0
+
+    results = run_suite(args.size, args.genomes, args.repeat)
+    startup = run_startup(repeat=max(args.repeat, 5))
+    baseline = None
+    if saved:
+        if saved["size"] == args.size:
+            baseline = saved["results"]
+        else:
+            print(f"baseline {args.baseline} was recorded at size {saved['size']}, not compared")
+
+    print(f"{'genome':<10} {'case':<34} {'seconds':>9} {'Mb/s':>9} {'peak MB':>9} {'vs base':>8}")
+    for genome, cases in results.items():
+        for name, result in cases.items():
+            base = (baseline or {}).get(genome, {}).get(name)
+            change = f"{result['seconds'] / base['seconds'] - 1:+8.0%}" if base and base["seconds"] else ""
+            print(f"{genome:<10} {name:<34} {result['seconds']:>9.4f} {result['bases_per_second'] / 1e6:>9.2f}"
+                  f" {result['peak_bytes'] / 1e6:>9.2f} {change:>8}")
+    print_startup(startup, saved.get("startup"))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as fh:
+            json.dump({"size": args.size, "repeat": args.repeat, "python": platform.python_version(),
+                       "machine": platform.machine(), "results": results,
+                       "startup": {module: {"seconds": result["seconds"]} for module, result in startup.items()}},
+                      fh, indent=1)
+        print(f"baseline written to {args.baseline}")
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    startup_messages = check_startup(startup, saved.get("startup"), args.threshold)
+    for message in startup_messages:
+        print(f"STARTUP {message}")
+    return 1 if mismatches or regressions or startup_messages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Exact tandem-repeat and literal motif finder.
+
+A repeat is (unit, min_units, max_units): min_units to max_units (None for no
+limit) consecutive copies of `unit`, found greedily and without overlaps,
+giving the same spans as scanning for repeat_pattern(unit, min_units,
+max_units) with motifs.MotifScan. A literal is a repeat of one copy.
+
+Tandem repeats of one period share a single scan: every few bases, a machine
+word of the sequence is compared with the word `period` bases further on,
+which finds every stretch of that period long enough to hold a match, and
+only those stretches are searched for the units. Literals are found by
+comparing a word-sized prefix at every position. Both are vectorized passes
+with Python work only per candidate, so a new repeat class (a CAG or CGG
+expansion, another STR) is one more table entry, not one more regex pass.
+"""
+import numpy as np
+
+WORD_SIZES = (8, 4, 2, 1)
+# Bases a stretch is extended by in one vectorized step
+EXTEND_BASES = 8
+
+
+def repeat_pattern(unit, min_units, max_units=None):
+    """Lookahead regex matching the same spans as a repeat (the reference for REPEATS entries)"""
+    if min_units == max_units == 1:
+        return f"(?=({unit}))"
+    if max_units is None:
+        count = f"{min_units},"
+    else:
+        count = f"{min_units}" if max_units == min_units else f"{min_units},{max_units}"
+    return f"(?=((?:{unit}){{{count}}}))"
+
+
+def _words(codes, size, stride, offset=0):
+    """Unaligned little-endian `size`-byte words of codes starting every `stride` bases from offset"""
+    count = max((len(codes) - offset - size) // stride + 1, 0)
+    return np.ndarray((count,), dtype=f"<u{size}", buffer=codes, offset=offset if count else 0,
+                      strides=(stride,))
+
+
+def _periodic_end(codes, period, x):
+    """First y >= x with codes[y] != codes[y + period], or len(codes) - period"""
+    limit, size = len(codes) - period, 64
+    while x < limit:
+        stop = min(x + size, limit)
+        diff = np.flatnonzero(codes[x:stop] != codes[x + period:stop + period])
+        if len(diff):
+            return x + int(diff[0])
+        x, size = stop, size * 2
+    return max(x, limit)
+
+
+def _periodic_start(codes, period, x):
+    """Smallest y <= x with codes[z] == codes[z + period] for all y <= z < x"""
+    size = 64
+    while x > 0:
+        start = max(x - size, 0)
+        diff = np.flatnonzero(codes[start:x] != codes[start + period:x + period])
+        if len(diff):
+            return start + int(diff[-1]) + 1
+        x, size = start, size * 2
+    return 0
+
+
+def _extend(codes, period, xs, step):
+    """For each x, how far the period continues from x: _periodic_end for step 1, _periodic_start for -1.
+
+    All are first extended together by up to EXTEND_BASES; only those still
+    periodic there are followed one by one.
+    """
+    limit = len(codes) - period
+    offsets = np.arange(EXTEND_BASES) if step > 0 else -1 - np.arange(EXTEND_BASES)
+    z = xs[:, None] + offsets
+    outside = (z >= limit) | (z < 0)
+    z = np.clip(z, 0, max(limit - 1, 0))
+    stop = outside | (codes[z] != codes[z + period])
+    first = stop.argmax(axis=1)
+    reached = xs + offsets[first] + (step < 0)
+    for i in np.flatnonzero(~stop.any(axis=1)).tolist():
+        reached[i] = (_periodic_end(codes, period, int(xs[i]) + EXTEND_BASES) if step > 0
+                      else _periodic_start(codes, period, int(xs[i]) - EXTEND_BASES))
+    return np.clip(reached, 0, max(limit, 0))
+
+
+def periodic_stretches(codes, period, min_length):
+    """(starts, ends) of the maximal stretches of codes with period `period` at least min_length long.
+
+    In a stretch [start, end) every base equals the one `period` bases on.
+    Any such interval of min_length > period bases holds a whole word pair
+    at one of the sampled positions, so none is missed; consecutive periodic
+    samples overlap enough to lie in the same stretch.
+    """
+    room = min_length - period
+    size = next(size for size in WORD_SIZES if size <= room)
+    stride = room - size + 1
+    left = _words(codes, size, stride)
+    right = _words(codes, size, stride, period)
+    samples = np.flatnonzero(left[:len(right)] == right)
+    if not len(samples):
+        return samples, samples
+    first = np.flatnonzero(np.concatenate(([True], np.diff(samples) > 1)))
+    last = np.concatenate((first[1:], [len(samples)])) - 1
+    starts = _extend(codes, period, samples[first] * stride, -1)
+    ends = _extend(codes, period, samples[last] * stride + size, 1) + period
+    keep = ends - starts >= min_length
+    return starts[keep], ends[keep]
+
+
+def _phases(codes, starts, unit):
+    """For each stretch start, the offset of the first copy of unit from it (-1 for none)"""
+    period = len(unit)
+    units = np.frombuffer(unit.encode(), dtype=np.uint8)
+    offsets = np.arange(period)
+    heads = codes[starts[:, None, None] + offsets[None, :, None] + offsets[None, None, :]]
+    found = (heads == units).all(axis=2)
+    return np.where(found.any(axis=1), found.argmax(axis=1), -1)
+
+
+def tandem_spans(codes, stretches, unit, min_units, max_units=None, pos=0):
+    """Non-overlapping spans of min_units.. copies of unit from pos, found in periodic_stretches only.
+
+    A match never crosses a stretch end, and inside a stretch the copies of
+    the unit follow each other from its first one, so each stretch's matches
+    follow from that copy's offset and the stretch length. A stretch can only
+    be entered past a match ending in the one before it (they overlap by less
+    than a period); such shifts are settled by a few vectorized rounds.
+    """
+    period = len(unit)
+    starts, ends = stretches
+    open_from = np.searchsorted(ends, pos, "right")
+    starts, ends = starts[open_from:], ends[open_from:]
+    phases = _phases(codes, starts, unit)
+    keep = phases >= 0
+    starts, ends, copies = starts[keep], ends[keep], starts[keep] + phases[keep]
+    entry = np.maximum(starts, pos)
+    while True:
+        first = copies + np.maximum(-(-(entry - copies) // period), 0) * period
+        units = np.maximum((ends - first) // period, 0)
+        if max_units is None:
+            full, rest = np.zeros_like(units), units
+        else:
+            full, rest = units // max_units, units % max_units
+        rest = np.where(rest >= min_units, rest, 0)
+        stop = first + (full * (max_units or 0) + rest) * period
+        matched = np.where(full + rest > 0, stop, 0)
+        reached = np.maximum.accumulate(np.concatenate(([pos], matched[:-1])))
+        shifted = np.maximum(entry, reached)
+        if (shifted == entry).all():
+            break
+        entry = shifted
+    # Every stretch gives `full` spans of max_units copies and one of the `rest`
+    count = full + (rest > 0)
+    stretch = np.repeat(np.arange(len(first)), count)
+    index = np.arange(len(stretch)) - np.repeat(np.cumsum(count) - count, count)
+    span_starts = first[stretch] + index * (max_units or 0) * period
+    span_ends = np.where(index < full[stretch], span_starts + (max_units or 0) * period,
+                         span_starts + rest[stretch] * period)
+    return list(zip(span_starts.tolist(), span_ends.tolist()))
+
+
+def literal_starts(codes, literal, pos=0):
+    """Sorted starts from pos of every occurrence of `literal` in codes, overlapping ones included"""
+    size = next(size for size in WORD_SIZES if size <= len(literal))
+    key = np.frombuffer(literal[:size].encode(), dtype=f"<u{size}")[0]
+    starts = np.flatnonzero(_words(codes[pos:], size, 1) == key) + pos
+    starts = starts[starts + len(literal) <= len(codes)]
+    if len(literal) > size and len(starts):
+        units = np.frombuffer(literal.encode(), dtype=np.uint8)
+        starts = starts[(codes[starts[:, None] + np.arange(len(literal))] == units).all(axis=1)]
+    return starts
+
+
+def literal_runs(starts, length, max_units=1, pos=0):
+    """Non-overlapping spans from pos taken greedily from sorted literal starts.
+
+    Each span is extended by the copies following it directly, up to max_units.
+    """
+    starts = starts.tolist()
+    following = set(starts) if max_units != 1 else ()
+    spans = []
+    for i in starts:
+        if i < pos:
+            continue
+        units, end = 1, i + length
+        while (max_units is None or units < max_units) and end in following:
+            units, end = units + 1, end + length
+        spans.append((i, end))
+        pos = end
+    return spans
+
+
+def literal_spans(codes, literal, max_units=1, pos=0):
+    """Non-overlapping spans of `literal` (extended by further copies up to max_units) from pos"""
+    return literal_runs(literal_starts(codes, literal, pos), len(literal), max_units, pos)
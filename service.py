@@ -0,0 +1,543 @@
+"""Local HTTP/JSON analysis service.
+
+Runs the finder for other tools, with scans queued on a shared pool of
+worker processes instead of inside a caller's own process:
+
+    python service.py --port 8750 --workers 2
+
+    POST   /uploads              FASTA body (optionally gzip-compressed) -> the stored upload
+    GET    /uploads/<id>         record names and lengths of an upload
+    POST   /jobs                 {"upload": id, "format": "tsv", "hotspots": {"window": 100},
+                                  "motifs": ["G4", "zdna"]} -> 202, the job
+    GET    /jobs                 every job
+    GET    /jobs/<id>            status and progress of a job
+    GET    /jobs/<id>/progress   status lines (NDJSON) streamed as the job advances, until it ends
+    GET    /jobs/<id>/result     motif file of a finished job in its export format, streamed
+    GET    /jobs/<id>/hotspots   hotspot regions of a finished job as TSV, streamed
+    DELETE /jobs/<id>            cancel a job that has not started
+
+Uploads are kept once under the SHA-256 of their bytes, so sending a file
+again stores nothing new and its scan is read from the ResultCache. A job
+runs nbdfinder.analyze_file on one upload, for every registered motif or
+only those its "motifs" keys select (see motifs.select_motifs). Jobs reach the pool only when a
+worker is free, taking the waiting clients (a job's "client" field, or the
+caller's address) in turn, so one client's batch cannot hold back another's.
+Workers report the bases scanned so far through a queue.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from export import FORMATS
+from motifs import DEFAULT_CHUNK_SIZE, select_motifs
+from nbdfinder import analyze_file
+from utils import stream_fasta
+
+DEFAULT_PORT = 8750
+UPLOAD_BLOCK = 1 << 20
+GZIP_MAGIC = b"\x1f\x8b"
+# Seconds between progress lines while a job does not change
+PROGRESS_SECONDS = 5.0
+HOTSPOT_PARAMS = {"window": int, "min_count": int, "merge": bool}
+CONTENT_TYPES = {"csv": "text/csv", "tsv": "text/tab-separated-values", "bed": "text/plain", "gff3": "text/plain",
+                 "csv.gz": "application/gzip", "tsv.gz": "application/gzip"}
+RESULT_STEM = "result"
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+class NotFound(LookupError):
+    """An upload or job that does not exist (answered with 404)"""
+
+
+class UploadStore:
+    """FASTA uploads on disk, one file per distinct content, described by a JSON file beside it"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _meta_path(self, upload):
+        return os.path.join(self.directory, f"{upload}.json")
+
+    def get(self, upload):
+        """Description of a stored upload ({"upload", "path", "bytes", "bases", "records"}), or None"""
+        if not _UPLOAD_ID.match(upload):
+            return None
+        try:
+            with open(self._meta_path(upload)) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def add(self, stream, size):
+        """Store `size` bytes of FASTA read from `stream`; returns (description, whether it was new)"""
+        digest, head = hashlib.sha256(), b""
+        tmp = os.path.join(self.directory, f"upload.{secrets.token_hex(8)}.tmp")
+        try:
+            with open(tmp, "wb") as out:
+                remaining = size
+                while remaining:
+                    block = stream.read(min(remaining, UPLOAD_BLOCK))
+                    if not block:
+                        raise ValueError("upload ended before its Content-Length")
+                    head = head or block[:len(GZIP_MAGIC)]
+                    digest.update(block)
+                    out.write(block)
+                    remaining -= len(block)
+            upload = digest.hexdigest()
+            known = self.get(upload)
+            if known is not None:
+                return known, False
+            # stream_fasta tells gzip from plain text by the file name
+            suffix = ".fa.gz" if head == GZIP_MAGIC else ".fa"
+            os.replace(tmp, tmp + suffix)
+            tmp += suffix
+            try:
+                records = [{"name": name, "length": sum(len(piece) for piece in pieces)}
+                           for name, pieces in stream_fasta(tmp)]
+            except (OSError, EOFError, UnicodeDecodeError) as e:
+                raise ValueError(f"not a FASTA file: {e}") from None
+            if not records:
+                raise ValueError("no FASTA records in the upload")
+            description = {"upload": upload, "path": os.path.join(self.directory, upload + suffix), "bytes": size,
+                           "bases": sum(record["length"] for record in records), "records": records}
+            with self._lock:
+                known = self.get(upload)
+                if known is not None:
+                    return known, False
+                os.replace(tmp, description["path"])
+                # The description is written last: an upload exists once it does
+                with open(tmp + ".json", "w") as fh:
+                    json.dump(description, fh)
+                os.replace(tmp + ".json", self._meta_path(upload))
+            return description, True
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+class ServiceJob:
+    """One analyze_file run on an upload.
+
+    `status` moves from "queued" to "running" and ends as "done" or "failed"
+    (with `error` set); a job cancelled before it started ends as
+    "cancelled". `bases` counts the bases of the upload scanned so far.
+    """
+
+    def __init__(self, upload, client, fmt="tsv", hotspots=None, motifs=None):
+        self.id = secrets.token_hex(8)
+        self.upload = upload
+        self.client = client
+        self.format = fmt
+        self.hotspots = hotspots
+        self.motif_keys = motifs
+        self.status = "queued"
+        self.bases = 0
+        self.summary = None
+        self.error = None
+        self.output_dir = None
+        self.submitted = time.time()
+        self.started = self.finished = None
+
+    @property
+    def running(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def fraction(self):
+        """Share of the upload scanned, 0.0 to 1.0"""
+        total = self.upload["bases"]
+        return 1.0 if self.status == "done" or not total else min(self.bases / total, 1.0)
+
+    def result_path(self):
+        return os.path.join(self.output_dir, f"{RESULT_STEM}.motifs{FORMATS[self.format][0]}")
+
+    def hotspots_path(self):
+        return os.path.join(self.output_dir, f"{RESULT_STEM}.hotspots.tsv")
+
+    def as_dict(self):
+        summary = self.summary or {}
+        regions = summary.get("hotspots") if self.hotspots is not None else None
+        return {"job": self.id, "upload": self.upload["upload"], "client": self.client, "format": self.format,
+                "hotspots": self.hotspots, "motif_keys": self.motif_keys, "status": self.status, "bases": self.bases,
+                "total_bases": self.upload["bases"], "progress": self.fraction, "motifs": summary.get("motifs"),
+                "hotspot_regions": regions, "seconds": summary.get("seconds"), "error": self.error,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished}
+
+
+_progress = None
+
+
+def _init_worker(queue):
+    global _progress
+    _progress = queue
+
+
+def _run_job(job_id, path, output_dir, fmt, hotspots, cache_dir, chunk_size, motifs=None):
+    """Worker process: analyze_file on one upload, reporting (job_id, bases scanned) to the service"""
+    return analyze_file(path, output_dir, RESULT_STEM, chunk_size, hotspots, cache_dir, fmt=fmt,
+                        progress=lambda bases: _progress.put((job_id, bases)), motifs=motifs)
+
+
+class JobQueue:
+    """Jobs run on a pool of `workers` processes, handed out one free worker at a time.
+
+    Waiting jobs are queued per client and clients are served in turn.
+    `changed` is notified whenever a job advances or ends.
+    """
+
+    def __init__(self, directory, workers=None, cache_dir=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.jobs = {}
+        self.changed = threading.Condition(threading.RLock())
+        self._waiting = OrderedDict()
+        self._running = 0
+        self._reports = multiprocessing.Queue()
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self._reports,))
+        self._reader = threading.Thread(target=self._read_reports, name="nbd-progress", daemon=True)
+        self._reader.start()
+
+    def submit(self, upload, client, fmt="tsv", hotspots=None, motifs=None):
+        """Queue a job on an upload description; returns the ServiceJob"""
+        job = ServiceJob(upload, client, fmt, hotspots, motifs)
+        with self.changed:
+            self.jobs[job.id] = job
+            self._waiting.setdefault(client, deque()).append(job)
+            self._dispatch()
+        return job
+
+    def cancel(self, job):
+        """Cancel a job that has not started; returns whether it was"""
+        with self.changed:
+            if job.status != "queued":
+                return False
+            waiting = self._waiting[job.client]
+            waiting.remove(job)
+            if not waiting:
+                del self._waiting[job.client]
+            job.status, job.finished = "cancelled", time.time()
+            self.changed.notify_all()
+            return True
+
+    def _dispatch(self):
+        while self._running < self.workers and self._waiting:
+            client, waiting = self._waiting.popitem(last=False)
+            job = waiting.popleft()
+            # The client goes to the back of the line with its remaining jobs
+            if waiting:
+                self._waiting[client] = waiting
+            job.status, job.started = "running", time.time()
+            job.output_dir = os.path.join(self.directory, job.id)
+            os.makedirs(job.output_dir, exist_ok=True)
+            self._running += 1
+            future = self._pool.submit(_run_job, job.id, job.upload["path"], job.output_dir, job.format,
+                                       job.hotspots, self.cache_dir, self.chunk_size, job.motif_keys)
+            future.add_done_callback(lambda future, job=job: self._finished(job, future))
+
+    def _finished(self, job, future):
+        with self.changed:
+            self._running -= 1
+            try:
+                job.summary = future.result()
+                job.status, job.bases = "done", job.upload["bases"]
+            except Exception as e:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+            job.finished = time.time()
+            self._dispatch()
+            self.changed.notify_all()
+
+    def _read_reports(self):
+        while True:
+            report = self._reports.get()
+            if report is None:
+                return
+            job_id, bases = report
+            with self.changed:
+                job = self.jobs.get(job_id)
+                if job is not None and job.status == "running":
+                    job.bases = bases
+                    self.changed.notify_all()
+
+    def close(self):
+        """Cancel waiting jobs and stop the workers once running jobs end"""
+        with self.changed:
+            for waiting in list(self._waiting.values()):
+                for job in list(waiting):
+                    self.cancel(job)
+        self._pool.shutdown()
+        self._reports.put(None)
+        self._reader.join()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Routes requests to the AnalysisService of its server"""
+
+    server_version = "nbdfinder-service"
+    ROUTES = [
+        ("POST", re.compile(r"^/uploads$"), "post_upload"),
+        ("GET", re.compile(r"^/uploads/([^/]+)$"), "get_upload"),
+        ("POST", re.compile(r"^/jobs$"), "post_job"),
+        ("GET", re.compile(r"^/jobs$"), "list_jobs"),
+        ("GET", re.compile(r"^/jobs/([^/]+)$"), "get_job"),
+        ("DELETE", re.compile(r"^/jobs/([^/]+)$"), "delete_job"),
+        ("GET", re.compile(r"^/jobs/([^/]+)/progress$"), "job_progress"),
+        ("GET", re.compile(r"^/jobs/([^/]+)/result$"), "job_result"),
+        ("GET", re.compile(r"^/jobs/([^/]+)/hotspots$"), "job_hotspots"),
+    ]
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _route(self, method):
+        path = urlsplit(self.path).path.rstrip("/") or "/"
+        allowed = False
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                try:
+                    return getattr(self, name)(*match.groups())
+                except ValueError as e:
+                    return self._error(HTTPStatus.BAD_REQUEST, str(e))
+                except NotFound as e:
+                    return self._error(HTTPStatus.NOT_FOUND, str(e))
+                except ConnectionError:
+                    # The client went away mid-response
+                    self.close_connection = True
+                    return
+            allowed = allowed or match is not None
+        self._error(HTTPStatus.METHOD_NOT_ALLOWED if allowed else HTTPStatus.NOT_FOUND, f"no route {method} {path}")
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def _json(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message):
+        self._json(status, {"error": message})
+
+    def _body_size(self):
+        size = self.headers.get("Content-Length")
+        if size is None or not size.isdigit():
+            raise ValueError("a Content-Length is required")
+        return int(size)
+
+    def _job(self, job_id):
+        job = self.service.queue.jobs.get(job_id)
+        if job is None:
+            raise NotFound(f"no job {job_id}")
+        return job
+
+    def _send_file(self, path, content_type, filename):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.end_headers()
+        with open(path, "rb") as fh:
+            shutil.copyfileobj(fh, self.wfile, UPLOAD_BLOCK)
+
+    def _finished_job(self, job_id):
+        job = self._job(job_id)
+        if job.status != "done":
+            self._error(HTTPStatus.CONFLICT, f"job {job_id} is {job.status}")
+            return None
+        return job
+
+    def post_upload(self):
+        description, new = self.service.uploads.add(self.rfile, self._body_size())
+        self._json(HTTPStatus.CREATED if new else HTTPStatus.OK, dict(description, new=new),
+                   [("Location", f"/uploads/{description['upload']}")])
+
+    def get_upload(self, upload):
+        description = self.service.uploads.get(upload)
+        if description is None:
+            raise NotFound(f"no upload {upload}")
+        self._json(HTTPStatus.OK, description)
+
+    def post_job(self):
+        try:
+            request = json.loads(self.rfile.read(self._body_size()) or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e}") from None
+        if not isinstance(request, dict):
+            raise ValueError("a job is a JSON object")
+        upload = self.service.uploads.get(str(request.get("upload", "")))
+        if upload is None:
+            raise NotFound(f"no upload {request.get('upload')}")
+        fmt = request.get("format", "tsv")
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+        hotspots = _hotspot_params(request.get("hotspots", {}))
+        motifs = _motif_keys(request.get("motifs"))
+        client = str(request.get("client") or self.client_address[0])
+        job = self.service.queue.submit(upload, client, fmt, hotspots, motifs)
+        self._json(HTTPStatus.ACCEPTED, job.as_dict(), [("Location", f"/jobs/{job.id}")])
+
+    def list_jobs(self):
+        with self.service.queue.changed:
+            jobs = [job.as_dict() for job in self.service.queue.jobs.values()]
+        self._json(HTTPStatus.OK, jobs)
+
+    def get_job(self, job_id):
+        self._json(HTTPStatus.OK, self._job(job_id).as_dict())
+
+    def delete_job(self, job_id):
+        job = self._job(job_id)
+        if not self.service.queue.cancel(job):
+            return self._error(HTTPStatus.CONFLICT, f"job {job_id} is {job.status}")
+        self._json(HTTPStatus.OK, job.as_dict())
+
+    def job_progress(self, job_id):
+        job, queue = self._job(job_id), self.service.queue
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        # No Content-Length: the stream ends when the connection closes
+        self.close_connection = True
+        last = None
+        while True:
+            with queue.changed:
+                state = job.as_dict()
+                if state == last:
+                    queue.changed.wait(PROGRESS_SECONDS)
+                    state = job.as_dict()
+            self.wfile.write(json.dumps(state).encode() + b"\n")
+            self.wfile.flush()
+            last = state
+            if not job.running:
+                return
+
+    def job_result(self, job_id):
+        job = self._finished_job(job_id)
+        if job is not None:
+            filename = os.path.basename(job.result_path()).replace(RESULT_STEM, job.id, 1)
+            self._send_file(job.result_path(), CONTENT_TYPES.get(job.format, "application/octet-stream"), filename)
+
+    def job_hotspots(self, job_id):
+        job = self._finished_job(job_id)
+        if job is None:
+            return
+        if job.hotspots is None:
+            return self._error(HTTPStatus.NOT_FOUND, f"job {job_id} was run without hotspots")
+        self._send_file(job.hotspots_path(), CONTENT_TYPES["tsv"], f"{job.id}.hotspots.tsv")
+
+
+def _hotspot_params(value):
+    """find_hotspots keyword arguments of a job request (None or false for no hotspots)"""
+    if value is None or value is False:
+        return None
+    if value is True:
+        return {}
+    if not isinstance(value, dict) or set(value) - set(HOTSPOT_PARAMS):
+        raise ValueError(f"hotspots takes {', '.join(HOTSPOT_PARAMS)}")
+    for name, kind in HOTSPOT_PARAMS.items():
+        if name in value and type(value[name]) is not kind:
+            raise ValueError(f"hotspots {name} must be {kind.__name__}")
+    if value.get("window", 1) < 1 or value.get("min_count", 1) < 1:
+        raise ValueError("hotspots window and min_count must be positive")
+    return dict(value)
+
+
+def _motif_keys(value):
+    """Motif keys of a job request, checked against the registry (None for every motif)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not value or not all(isinstance(key, str) for key in value):
+        raise ValueError("motifs is a list of motif names, families or classes")
+    select_motifs(*value)
+    return value
+
+
+class AnalysisService:
+    """The upload store and job queue behind a server, kept under one data directory"""
+
+    def __init__(self, data_dir, workers=None, cache_dir=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.uploads = UploadStore(os.path.join(data_dir, "uploads"))
+        self.queue = JobQueue(os.path.join(data_dir, "jobs"), workers, cache_dir, chunk_size)
+
+    def close(self):
+        self.queue.close()
+
+
+def make_server(data_dir, host="127.0.0.1", port=DEFAULT_PORT, workers=None, cache_dir=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, verbose=False):
+    """HTTP server of a new AnalysisService (port 0 picks a free port; see server.server_address).
+
+    Run it with serve_forever(); afterwards call shutdown(), service.close() and server_close().
+    """
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.service = AnalysisService(data_dir, workers, cache_dir, chunk_size)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--workers", type=int, default=0,
+                        help="worker processes shared by all jobs (0 for one per CPU)")
+    parser.add_argument("--data-dir", default="nbdfinder_service", help="directory for uploads and job results")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="bases read per streaming step")
+    parser.add_argument("--cache-dir", default=None,
+                        help="result cache directory (default NBD_CACHE_DIR or ~/.cache/nbdfinder)")
+    parser.add_argument("--no-cache", action="store_true", help="always rescan, without reading or writing the cache")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.data_dir, args.host, args.port, args.workers or None,
+                         False if args.no_cache else args.cache_dir, args.chunk_size, args.verbose)
+    host, port = server.server_address[:2]
+    print(f"serving on http://{host}:{port} with {server.service.queue.workers} workers", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.service.close()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Binned genome-wide tracks: motif coverage, motif density, GC and G4Hunter.
+
+Hit tracks come from difference arrays over the bins of a HitTable. Motifs
+are merged per class so coverage counts every base once, and density counts
+the motifs overlapping each bin. Sequence tracks (GC fraction and the
+G4Hunter score of each bin on its own) are built by SequenceTracks while
+the sequence streams past, one window of whole bins at a time, so a genome
+is read once and never held as per-base arrays. Tracks are written as
+bedGraph or kept as binned arrays in an npz file.
+"""
+import numpy as np
+
+from scoring import C, G, ScoreTrack, encode
+
+DEFAULT_BIN = 1000
+# Bins of sequence scored per SequenceTracks window
+WINDOW_BINS = 4096
+
+
+def merged_intervals(starts, ends):
+    """Union of 0-based half-open [start, end) intervals as sorted, disjoint (starts, ends)"""
+    starts, ends = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, reach = starts[order], np.maximum.accumulate(ends[order])
+    first = np.flatnonzero(np.concatenate(([True], starts[1:] > reach[:-1])))
+    return starts[first], reach[np.concatenate((first[1:], [len(starts)])) - 1]
+
+
+def covered_bases(hits, column="Class"):
+    """Unique bases covered by the hits of each label of `column`, plus "All" for any hit"""
+    covered = {}
+    codes = hits.codes[column]
+    for code, label in enumerate(hits.categories[column]):
+        starts, ends = merged_intervals(hits.start[codes == code] - 1, hits.end[codes == code])
+        if len(starts):
+            covered[label] = int((ends - starts).sum())
+    starts, ends = merged_intervals(hits.start - 1, hits.end)
+    covered["All"] = int((ends - starts).sum())
+    return covered
+
+
+def bin_coverage(starts, ends, length, bin_size):
+    """Bases of each bin covered by disjoint [start, end) intervals, via a difference array"""
+    bins = -(-length // bin_size)
+    first, last = starts // bin_size, (ends - 1) // bin_size
+    steps = np.zeros(bins + 1, dtype=np.int64)
+    # Whole bins strictly inside an interval add bin_size each ...
+    inner = last > first
+    np.add.at(steps, first[inner] + 1, bin_size)
+    np.add.at(steps, last[inner], -bin_size)
+    covered = np.cumsum(steps[:-1])
+    # ... and the bins holding its ends add the clipped part
+    np.add.at(covered, first, np.minimum(ends, (first + 1) * bin_size) - starts)
+    np.add.at(covered, last[inner], ends[inner] - last[inner] * bin_size)
+    return covered
+
+
+def bin_density(starts, ends, length, bin_size):
+    """Number of [start, end) intervals overlapping each bin, via a difference array"""
+    bins = -(-length // bin_size)
+    steps = np.zeros(bins + 1, dtype=np.int64)
+    np.add.at(steps, starts // bin_size, 1)
+    np.add.at(steps, (ends - 1) // bin_size + 1, -1)
+    return np.cumsum(steps[:-1])
+
+
+def hit_tracks(hits, length, bin_size=DEFAULT_BIN):
+    """{"coverage", "density", "coverage.<Class>", "density.<Class>": per-bin arrays} of a HitTable.
+
+    Coverage is the covered fraction of each bin, counting overlapping
+    motifs once; density is the number of motifs overlapping the bin.
+    """
+    sizes = np.minimum(bin_size, length - np.arange(0, length, bin_size))
+    groups = [("", np.ones(len(hits), dtype=bool))]
+    groups += [(f".{label}", hits.codes["Class"] == code) for code, label in enumerate(hits.categories["Class"])]
+    tracks = {}
+    for suffix, mask in groups:
+        if suffix and not mask.any():
+            continue
+        starts, ends = hits.start[mask] - 1, hits.end[mask]
+        tracks[f"coverage{suffix}"] = bin_coverage(*merged_intervals(starts, ends), length, bin_size) / sizes
+        tracks[f"density{suffix}"] = bin_density(starts, ends, length, bin_size)
+    return tracks
+
+
+class SequenceTracks:
+    """GC fraction and G4Hunter score per bin, fed the sequence piece by piece.
+
+    Each bin is scored on its own, as utils.g4hunter_score(bin text) would:
+    G/C runs are cut at the bin boundaries.
+    """
+
+    def __init__(self, bin_size=DEFAULT_BIN):
+        self.bin_size = bin_size
+        self.length = 0
+        self._pending = []
+        self._pending_length = 0
+        self._gc, self._g4 = [], []
+
+    def feed(self, piece):
+        self._pending.append(encode(piece))
+        self._pending_length += len(piece)
+        self.length += len(piece)
+        window = self.bin_size * WINDOW_BINS
+        if self._pending_length >= window:
+            codes = np.concatenate(self._pending)
+            whole = len(codes) - len(codes) % self.bin_size
+            self._score(codes[:whole])
+            self._pending = [codes[whole:]]
+            self._pending_length = len(codes) - whole
+
+    def _score(self, codes):
+        if not len(codes):
+            return
+        edges = np.arange(0, len(codes), self.bin_size)
+        ends = np.minimum(edges + self.bin_size, len(codes))
+        gc = np.add.reduceat(((codes == G) | (codes == C)).astype(np.int64), edges)
+        self._gc.append(gc / (ends - edges))
+        self._g4.append(ScoreTrack(codes).g4hunter(edges, ends))
+
+    def tracks(self):
+        """{"gc", "g4hunter": per-bin arrays} of everything fed so far (the last bin may be partial)"""
+        if self._pending_length:
+            self._score(np.concatenate(self._pending))
+            self._pending, self._pending_length = [], 0
+        empty = np.zeros(0)
+        return {"gc": np.concatenate(self._gc) if self._gc else empty,
+                "g4hunter": np.concatenate(self._g4) if self._g4 else empty}
+
+
+def sequence_tracks(seq, bin_size=DEFAULT_BIN):
+    """SequenceTracks of a whole sequence (str, bytes or RecordView), window by window"""
+    builder = SequenceTracks(bin_size)
+    window = bin_size * WINDOW_BINS
+    codes = seq.array() if hasattr(seq, "array") else encode(seq)
+    for start in range(0, len(codes), window):
+        builder.feed(codes[start:start + window])
+    return builder.tracks()
+
+
+def compute_tracks(seq, hits, bin_size=DEFAULT_BIN):
+    """Hit and sequence tracks of one sequence"""
+    tracks = hit_tracks(hits, len(seq), bin_size)
+    tracks.update(sequence_tracks(seq, bin_size))
+    return tracks
+
+
+def write_bedgraph(fh, record, values, bin_size, name=None, length=None):
+    """Write one binned track of a record as bedGraph lines, merging runs of equal values.
+
+    A "track" header line is written first when `name` is given; the last
+    bin ends at `length` when it is known.
+    """
+    values = np.asarray(values)
+    if name is not None:
+        fh.write(f"track type=bedGraph name={name}\n")
+    if not len(values):
+        return
+    change = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    starts = change * bin_size
+    ends = np.append(change[1:] * bin_size, len(values) * bin_size)
+    if length is not None:
+        ends[-1] = min(ends[-1], length)
+    text = [f"{value:.4g}" for value in values[change].tolist()]
+    fh.writelines(f"{record}\t{start}\t{end}\t{value}\n"
+                  for start, end, value in zip(starts.tolist(), ends.tolist(), text))
+
+
+def save_tracks(path, tracks, bin_size, length):
+    """Keep binned tracks as arrays in an npz file (see load_tracks)"""
+    np.savez_compressed(path, bin_size=np.int64(bin_size), length=np.int64(length),
+                        **{f"track:{name}": values for name, values in tracks.items()})
+
+
+def load_tracks(path):
+    """(tracks, bin_size, length) from save_tracks"""
+    with np.load(path) as data:
+        tracks = {key[len("track:"):]: data[key] for key in data.files if key.startswith("track:")}
+        return tracks, int(data["bin_size"]), int(data["length"])
@@ -1,4 +1,11 @@
+import gzip
+import hashlib
+import io
+import json
+import mmap
+import os
 import re
+import tempfile
 import numpy as np
 
 def parse_fasta(fasta_str: str) -> str:
@@ -6,6 +13,208 @@ def parse_fasta(fasta_str: str) -> str:
     seq = [line.strip() for line in lines if not line.startswith(">")]
     return "".join(seq).upper().replace(" ", "").replace("U", "T")
 
+def _clean_sequence_line(line: str) -> str:
+    return line.strip().upper().replace(" ", "").replace("U", "T")
+
+def _open_text(source):
+    if isinstance(source, (str, os.PathLike)):
+        opener = gzip.open if os.fspath(source).endswith(".gz") else open
+        return opener(source, "rt")
+    return source
+
+def _record_name(header: str) -> str:
+    """Record ID of a FASTA header line: its first word, as samtools faidx names records"""
+    words = header[1:].split(maxsplit=1)
+    return words[0] if words else ""
+
+def stream_fasta(source):
+    """Yield (name, pieces) for each FASTA record without loading whole records.
+
+    `source` is a path (optionally .gz), an open file or any iterable of lines.
+    `pieces` lazily yields the record's cleaned sequence line by line and must
+    be consumed before moving on to the next record; unread pieces are skipped.
+    Records are named by the first word of their header, so ">chr1 assembled"
+    is "chr1". Sequence lines before the first header form a record with an
+    empty name.
+    """
+    handle = _open_text(source)
+    lines = (line.decode() if isinstance(line, bytes) else line for line in handle)
+    next_name = [None]
+
+    def record_pieces(first_piece=None):
+        if first_piece:
+            yield first_piece
+        for line in lines:
+            if line.startswith(">"):
+                next_name[0] = _record_name(line)
+                return
+            piece = _clean_sequence_line(line)
+            if piece:
+                yield piece
+        next_name[0] = None
+
+    try:
+        for line in lines:
+            if line.startswith(">"):
+                next_name[0] = _record_name(line)
+                break
+            piece = _clean_sequence_line(line)
+            if piece:
+                pieces = record_pieces(piece)
+                yield "", pieces
+                for _ in pieces:
+                    pass
+                break
+        while next_name[0] is not None:
+            name, next_name[0] = next_name[0], None
+            pieces = record_pieces()
+            yield name, pieces
+            for _ in pieces:
+                pass
+    finally:
+        if handle is not source:
+            handle.close()
+
+def read_fasta(source):
+    """Yield (name, sequence) for each FASTA record, one record in memory at a time"""
+    for name, pieces in stream_fasta(source):
+        yield name, "".join(pieces)
+
+class RecordView:
+    """Zero-copy view of one record in a SequenceStore.
+
+    Scanners use `buffer` with `offset`/`len()` bounds directly and `array()`
+    gives a read-only uint8 NumPy view; slicing decodes only the requested bases.
+    """
+
+    def __init__(self, buffer, name, offset, length, path=None):
+        self.buffer = buffer
+        self.name = name
+        self.offset = offset
+        self.length = length
+        self.path = path
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step != 1:
+                raise ValueError("RecordView slices do not support a step")
+            return self.buffer[self.offset + start:self.offset + max(start, stop)].decode("ascii")
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError("RecordView index out of range")
+        return chr(self.buffer[self.offset + key])
+
+    def __str__(self):
+        return self[:]
+
+    def window(self, start, end) -> "RecordView":
+        """Zero-copy view of bases start..end-1 of this record"""
+        start, end, _ = slice(start, end).indices(self.length)
+        return RecordView(self.buffer, self.name, self.offset + start, max(end - start, 0), self.path)
+
+    def array(self) -> np.ndarray:
+        return np.frombuffer(self.buffer, dtype=np.uint8, count=self.length, offset=self.offset)
+
+    def is_dna(self) -> bool:
+        """True if the record only contains A, T, G and C"""
+        return bool(np.isin(self.array(), np.frombuffer(b"ATGC", dtype=np.uint8)).all())
+
+class SequenceStore:
+    """Read-only, memory-mapped store of FASTA records at one byte per base.
+
+    The store is a flat file of cleaned upper-case ASCII bases plus a JSON index
+    of (name, offset, length) per record. Bases stay one byte each rather than
+    2-bit packed so the regex engine and NumPy scorers can read the mapped pages
+    in place, and every process mapping the same file shares those pages.
+    """
+
+    INDEX_SUFFIX = ".index.json"
+    # Bumped when records are named differently, so older stores are rebuilt
+    FORMAT = 2
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path + self.INDEX_SUFFIX) as fh:
+            index = json.load(fh)
+        self.index = index["records"]
+        self.format = index.get("format", 1)
+        with open(self.path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            self.buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._positions = {}
+        for i, record in enumerate(self.index):
+            self._positions.setdefault(record["name"], i)
+
+    @classmethod
+    def build(cls, source, path):
+        """Write the records of a FASTA source (see stream_fasta) to a new store and open it"""
+        path = os.fspath(path)
+        # A temp name of its own: threads of one process may build the same store
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", prefix=os.path.basename(path) + ".",
+                                   dir=os.path.dirname(path) or ".")
+        records, offset = [], 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for name, pieces in stream_fasta(source):
+                    length = 0
+                    for piece in pieces:
+                        data = piece.encode("ascii", "replace")
+                        out.write(data)
+                        length += len(data)
+                    records.append({"name": name, "offset": offset, "length": length})
+                    offset += length
+            with open(tmp + cls.INDEX_SUFFIX, "w") as fh:
+                json.dump({"format": cls.FORMAT, "records": records}, fh)
+            # Data first, then index: a store is only opened once its index exists
+            os.replace(tmp, path)
+            os.replace(tmp + cls.INDEX_SUFFIX, path + cls.INDEX_SUFFIX)
+        finally:
+            for leftover in (tmp, tmp + cls.INDEX_SUFFIX):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        return cls(path)
+
+    @property
+    def names(self):
+        return [record["name"] for record in self.index]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.index)))
+
+    def __getitem__(self, key) -> RecordView:
+        """Return a record by position or by name"""
+        record = self.index[key if isinstance(key, int) else self._positions[key]]
+        return RecordView(self.buffer, record["name"], record["offset"], record["length"], self.path)
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+def open_shared_store(data: bytes, directory=None) -> SequenceStore:
+    """Open the SequenceStore for raw FASTA bytes, building it on first use.
+
+    Stores are named by content hash inside `directory` (NBD_STORE_DIR or a
+    temp folder by default), so every worker given the same upload maps the
+    same file instead of holding its own copy.
+    """
+    directory = directory or os.environ.get("NBD_STORE_DIR") or os.path.join(tempfile.gettempdir(), "nbdfinder-store")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, hashlib.sha256(data).hexdigest() + ".seq")
+    if os.path.exists(path) and os.path.exists(path + SequenceStore.INDEX_SUFFIX):
+        store = SequenceStore(path)
+        if store.format == SequenceStore.FORMAT:
+            return store
+        store.close()
+    return SequenceStore.build(io.BytesIO(data), path)
+
 def wrap(seq: str, width=60) -> str:
     return "\n".join([seq[i:i+width] for i in range(0, len(seq), width)])
 
@@ -44,6 +253,9 @@ def g4hunter_score(seq: str) -> float:
             i += 1
     return np.mean(np.array(vals)) if vals else 0.0
 
+def imotif_score(seq: str) -> float:
+    return -g4hunter_score(seq.replace('C', 'G'))
+
 def zseeker_score(seq: str) -> float:
     dinucs = re.findall(r"(GC|CG|GT|TG|AC|CA)", seq)
     return len(dinucs) / (len(seq)/2) if len(seq) >= 2 else 0.0